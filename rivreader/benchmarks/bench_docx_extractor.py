@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import random
+import resource
+import struct
+import subprocess
+import tempfile
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+WORDS = "the of and to in a was he that it his her with as had for she on you but not".split()
+
+
+def make_png(size, seed=0):
+    # Noise compresses badly, so the image part stays roughly size*size*3 bytes
+    rng = random.Random(seed)
+    rows = b''.join(b'\x00' + bytes(rng.getrandbits(8) for _ in range(size * 3)) for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows, 1)) + chunk(b'IEND', b''))
+
+
+def make_docx(path, paragraphs, images, seed=0):
+    from docx import Document
+    rng = random.Random(seed)
+    doc = Document()
+    image_path = path + ".png"
+    with open(image_path, 'wb') as f:
+        f.write(make_png(600, seed))
+    for i in range(paragraphs):
+        if i % 200 == 0:
+            doc.add_heading(f"Chapter {i // 200 + 1}", 1)
+        if i % 500 == 250:
+            table = doc.add_table(rows=4, cols=4)
+            for cell in table._cells:
+                cell.text = rng.choice(WORDS)
+        if images and i % (paragraphs // images or 1) == 0:
+            doc.add_picture(image_path)
+        doc.add_paragraph(' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))))
+    doc.save(path)
+    os.remove(image_path)
+
+
+def extract_python_docx(path):
+    from docx import Document
+    return (para.text for para in Document(path).paragraphs)
+
+
+def extract_iterparse(path):
+    from src.docx_extractor import iter_docx_paragraphs
+    return (text for text, _ in iter_docx_paragraphs(path))
+
+
+def peak_rss_kib():
+    # VmHWM belongs to this process image; ru_maxrss on Linux also carries the
+    # parent's peak across fork, which would hide the difference
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_child(label, path):
+    # Each path runs in a fresh interpreter so peak RSS is its own
+    func = {"python-docx": extract_python_docx, "iterparse": extract_iterparse}[label]
+    start = time.perf_counter()
+    words = sum(len(text.split()) for text in func(path))
+    elapsed = time.perf_counter() - start
+    peak_kib = peak_rss_kib()
+    print(f"{label:<16} {elapsed * 1000:9.1f} ms  {peak_kib / 1024:8.1f} MiB peak RSS  {words:>8} words")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], sys.argv[3])
+        return
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    images = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "manuscript.docx")
+        make_docx(path, paragraphs, images)
+        print(f"{os.path.getsize(path) / 1024 / 1024:.1f} MiB docx, {paragraphs} paragraphs, {images} images")
+        for label in ("python-docx", "iterparse"):
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--child", label, path], check=True)
+
+if __name__ == "__main__":
+    main()
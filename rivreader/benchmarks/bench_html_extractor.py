@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup
+import html2text
+from src.html_extractor import extract_blocks, blocks_to_text
+
+WORDS = "the of and to in a was he that it his her with as had for she on you but not".split()
+
+
+def make_chapter(paragraphs, seed=0):
+    rng = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="utf-8"?><html><head><title>Chapter</title>',
+             '<style>p { text-indent: 1em; }</style><script>var tracking = 1;</script></head><body>',
+             '<nav><ol><li><a href="#c1">Contents</a></li></ol></nav><h1>Chapter</h1>']
+    for _ in range(paragraphs):
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+        parts.append(f'<p class="body">{sentence} <em>{rng.choice(WORDS)}</em> &amp; more.</p>')
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def bench(label, func, markup, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = func(markup)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {best * 1000:9.2f} ms  {len(text.split()):>8} words")
+
+
+def main():
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    markup = make_chapter(paragraphs)
+    print(f"{len(markup) / 1024:.0f} KiB of markup, best of {repeat}")
+    bench("BeautifulSoup get_text", lambda m: BeautifulSoup(m, 'html.parser').get_text(), markup, repeat)
+    bench("html2text", html2text.html2text, markup, repeat)
+    bench("html_extractor", lambda m: blocks_to_text(extract_blocks(m)), markup, repeat)
+
+if __name__ == "__main__":
+    main()
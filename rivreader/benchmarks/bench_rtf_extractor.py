@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from striprtf.striprtf import rtf_to_text as striprtf_to_text
+from src.rtf_extractor import rtf_to_text
+
+WORDS = "the of and to in a was he that it his her with as had for she on you but not".split()
+
+
+def make_rtf(paragraphs, pictures, picture_kib=256, seed=0):
+    rng = random.Random(seed)
+    parts = [rb"{\rtf1\ansi\ansicpg1252\deff0{\fonttbl{\f0\froman Times New Roman;}}",
+             rb"{\colortbl;\red0\green0\blue0;}{\*\generator Msftedit 5.41;}\uc1"]
+    picture = b''.join(b'%02x' % rng.getrandbits(8) for _ in range(picture_kib * 1024))
+    every = paragraphs // pictures if pictures else 0
+    for i in range(paragraphs):
+        if i % 200 == 0:
+            parts.append(rb"\pard\outlinelevel0\b Chapter %d\b0\par" % (i // 200 + 1))
+        if every and i % every == 0:
+            parts.append(rb"{\pict\pngblip\picw600\pich600 " + picture + b"}")
+        sentence = b' '.join(rng.choice(WORDS).encode() for _ in range(rng.randint(40, 120)))
+        parts.append(rb"\pard Caf\'e9 \ldblquote " + sentence + rb"\rdblquote  na\u239\'efve.\par" + b"\r\n")
+    parts.append(b"}")
+    return b''.join(parts)
+
+
+def bench(label, func, data, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = func(data)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {best * 1000:9.2f} ms  {len(text.split()):>8} words")
+
+
+def main():
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    pictures = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    data = make_rtf(paragraphs, pictures)
+    print(f"{len(data) / 1024 / 1024:.1f} MiB of RTF, {pictures} pictures, best of {repeat}")
+    # striprtf needs text; latin-1 maps bytes one to one like the old strict read would have
+    bench("striprtf", lambda d: striprtf_to_text(d.decode('latin-1')), data, repeat)
+    bench("rtf_extractor", rtf_to_text, data, repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+WORDS = "the of and to in a was he that it his her with as had for she on you but not".split()
+
+
+def make_book(path, chapters=20, words_per_chapter=3000, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for chapter in range(chapters):
+            f.write(f"Chapter {chapter + 1}\n\n")
+            f.write(' '.join(rng.choice(WORDS) for _ in range(words_per_chapter)) + "\n\n")
+
+
+class Connection:
+    # Minimal keep-alive HTTP/1.1 client; reads Content-Length and chunked bodies
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, on_chunk=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+        await self.writer.drain()
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode('latin-1')
+        status = int(head.split(" ", 2)[1])
+        headers = dict(line.lower().split(": ", 1) for line in head.split("\r\n")[1:] if ": " in line)
+        if headers.get("transfer-encoding") == "chunked":
+            parts = []
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).strip(), 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                if on_chunk is not None:
+                    on_chunk(chunk[:-2])
+                parts.append(chunk[:-2])
+            data = b''.join(parts)
+        else:
+            data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def run_session(host, port, book, steps, chat_every, think_time, stats, rng):
+    conn = Connection(host, port)
+    try:
+        start = time.perf_counter()
+        status, data = await conn.request("POST", "/sessions", {"book": book})
+        stats["open"].append(time.perf_counter() - start)
+        if status != 201:
+            stats["errors"] += 1
+            return
+        session = json.loads(data)
+        sid, total = session["session"], session["total_words"]
+        word = rng.randrange(total // 2)
+        for step in range(steps):
+            await asyncio.sleep(rng.uniform(0, 2 * think_time))
+            word = min(word + rng.randint(100, 400), total - 1)
+            start = time.perf_counter()
+            status, _ = await conn.request("POST", f"/sessions/{sid}/progress", {"word": word})
+            stats["progress"].append(time.perf_counter() - start)
+            stats["errors"] += status != 200
+            if chat_every and step % chat_every == chat_every - 1:
+                start = time.perf_counter()
+                first = []
+
+                def on_chunk(_):
+                    if not first:
+                        first.append(time.perf_counter() - start)
+                status, _ = await conn.request("POST", f"/sessions/{sid}/chat",
+                                               {"message": "What just happened?"}, on_chunk)
+                stats["chat"].append(time.perf_counter() - start)
+                stats["first_chunk"].extend(first)
+                stats["errors"] += status != 200
+        await conn.request("DELETE", f"/sessions/{sid}")
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        stats["errors"] += 1
+    finally:
+        conn.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+async def load(host, port, book, sessions, steps, chat_every, think_time, ramp):
+    stats = {"open": [], "progress": [], "chat": [], "first_chunk": [], "errors": 0}
+    rng = random.Random(0)
+    tasks = []
+    start = time.perf_counter()
+    for i in range(sessions):
+        tasks.append(asyncio.create_task(run_session(host, port, book, steps, chat_every, think_time, stats,
+                                                     random.Random(rng.random()))))
+        await asyncio.sleep(ramp / sessions)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    requests = sum(len(stats[k]) for k in ("open", "progress", "chat"))
+    print(f"{sessions} sessions, {requests} requests in {elapsed:.1f} s "
+          f"({requests / elapsed:.0f} req/s), {stats['errors']} errors")
+    for label in ("open", "progress", "first_chunk", "chat"):
+        values = stats[label]
+        print(f"{label:<12} n={len(values):<6} p50 {percentile(values, 0.5) * 1000:8.1f} ms  "
+              f"p95 {percentile(values, 0.95) * 1000:8.1f} ms  p99 {percentile(values, 0.99) * 1000:8.1f} ms")
+
+
+def start_server(library, latency, workers):
+    # The server runs in its own process so the client's event loop does not
+    # compete with it
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py"), library, "--port", "0", "--fake-model",
+         "--fake-latency", str(latency), "--workers", str(workers), "--max-concurrency", str(workers),
+         "--requests-per-minute", "0"],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    match = re.search(r"http://([\d.]+):(\d+)", process.stdout.readline())
+    return process, match.group(1), int(match.group(2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the companion server against the fake model.")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--steps", type=int, default=10, help="progress updates per session")
+    parser.add_argument("--chat-every", type=int, default=5, help="chat after every N progress updates")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds between updates")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions start")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency in seconds")
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--url", help="host:port of a running server whose library holds --book")
+    parser.add_argument("--book", default="load_test.txt")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as library:
+        process = None
+        if args.url:
+            host, port = args.url.rsplit(":", 1)
+            port = int(port)
+        else:
+            make_book(os.path.join(library, args.book))
+            process, host, port = start_server(library, args.latency, args.workers)
+        try:
+            asyncio.run(load(host, port, args.book, args.sessions, args.steps, args.chat_every,
+                             args.think_time, args.ramp))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+if __name__ == "__main__":
+    main()
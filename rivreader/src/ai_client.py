@@ -0,0 +1,70 @@
+import importlib
+from contextlib import contextmanager
+from typing import Hashable, Optional
+from .single_flight import SingleFlight, request_key
+from .request_scheduler import RequestScheduler, INTERACTIVE, ANALYSIS, BACKGROUND
+from .usage_meter import UsageMeter, SITE_CHAT, SITE_SUMMARY, SITE_DIGEST, SITE_CHARACTER, SITE_LITERARY, SITE_CATCH_UP
+
+SITE_PRIORITIES = {
+    SITE_CHAT: INTERACTIVE,
+    SITE_CHARACTER: ANALYSIS,
+    SITE_LITERARY: ANALYSIS,
+    SITE_CATCH_UP: ANALYSIS,
+    SITE_SUMMARY: BACKGROUND,
+    SITE_DIGEST: BACKGROUND,
+}
+
+
+class AIClient:
+    # Every model call goes through here so usage is metered per call site and
+    # book, budget refusals happen before a request is sent, and requests are
+    # admitted by the shared scheduler in priority order of their call site.
+    # Identical requests made while one is in flight share its response.
+    def __init__(self, api_key: str, meter: Optional[UsageMeter] = None,
+                 scheduler: Optional[RequestScheduler] = None, client=None):
+        # client replaces the Anthropic client, e.g. with fake_model.FakeAnthropic
+        self.api_key = api_key
+        self.meter = meter if meter is not None else UsageMeter()
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.single_flight = SingleFlight()
+        self.anthropic_module = None
+        self.client = client
+        self._init_client()
+
+    def _init_client(self):
+        if self.client is None:
+            try:
+                if self.anthropic_module is None:
+                    self.anthropic_module = importlib.import_module('anthropic')
+                self.client = self.anthropic_module.Anthropic(api_key=self.api_key)
+            except ImportError:
+                print("Error: Unable to import anthropic module. Please ensure it's installed.")
+            except Exception as e:
+                print(f"Error initializing Anthropic client: {str(e)}")
+
+    def budget_level(self) -> int:
+        return self.meter.level()
+
+    def create(self, site: str, book: Optional[str] = None, timeout: Optional[float] = None,
+               supersede_key: Optional[Hashable] = None, **kwargs):
+        self.meter.check(site)
+        client = self.client.with_options(timeout=timeout) if timeout else self.client
+
+        def call():
+            with self.scheduler.slot(SITE_PRIORITIES.get(site, BACKGROUND), supersede_key):
+                return client.messages.create(**kwargs)
+
+        response, shared = self.single_flight.do(request_key(**kwargs), call)
+        if shared:
+            self.meter.record_shared(site, book)
+        else:
+            self.meter.record_response(site, book, response)
+        return response
+
+    @contextmanager
+    def stream(self, site: str, book: Optional[str] = None, **kwargs):
+        self.meter.check(site)
+        with self.scheduler.slot(SITE_PRIORITIES.get(site, BACKGROUND)):
+            with self.client.messages.stream(**kwargs) as stream:
+                yield stream
+                self.meter.record_response(site, book, stream.get_final_message())
@@ -0,0 +1,133 @@
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Tuple
+from .document_reader import DocumentReader, compute_book_hash
+from .single_flight import SingleFlight
+from .memory_budget import chapters_size
+from .entity_index import EntityIndex
+
+BOOK_CACHE = "books"
+
+
+def freeze_chapters(chapters) -> Tuple:
+    # Read-only views over the parsed chapters; word lists become tuples so a
+    # session cannot modify text other sessions are reading
+    frozen = []
+    for chapter in chapters:
+        chapter = dict(chapter)
+        chapter['words'] = tuple(chapter['words'])
+        if 'blocks' in chapter:
+            chapter['blocks'] = tuple(chapter['blocks'])
+        frozen.append(MappingProxyType(chapter))
+    return tuple(frozen)
+
+
+class ParsedBook:
+    __slots__ = ("book_hash", "file_type", "chapters", "chapters_size", "parse_seconds", "entity_index")
+
+    def __init__(self, book_hash: str, file_type: str, chapters: Tuple, parse_seconds: float = 0.0):
+        self.book_hash = book_hash
+        self.file_type = file_type
+        self.chapters = chapters
+        self.chapters_size = chapters_size(chapters)
+        self.parse_seconds = parse_seconds
+        # Shared by every session on the book; filled in as chapters are read
+        self.entity_index = EntityIndex(chapters)
+
+    @property
+    def size(self) -> int:
+        # Grows as the entity index fills in
+        return self.chapters_size + self.entity_index.size
+
+    @classmethod
+    def parse(cls, file_path: str, book_hash: str) -> "ParsedBook":
+        start = time.perf_counter()
+        reader = DocumentReader(file_path)
+        chapters = freeze_chapters(reader.chapters)
+        return cls(book_hash, reader.file_type, chapters, time.perf_counter() - start)
+
+    def reader(self, file_path: str) -> DocumentReader:
+        # A fresh position over the shared chapters; moving it touches nothing shared
+        return DocumentReader(file_path, chapters=self.chapters)
+
+
+class BookStore:
+    # One parsed copy of each book for the whole process, keyed by content hash
+    # so renamed or duplicated files share it too. acquire() hands out the
+    # shared ParsedBook and counts a reference; the book is dropped when the
+    # last reference is released. Concurrent first opens of a book parse it
+    # once. With a MemoryAccountant, released books stay cached and are only
+    # evicted under memory pressure; books with readers are pinned. Their
+    # rebuild cost is the time it took to parse them. A book is charged again
+    # each time its entity index takes in another chapter.
+    def __init__(self, accountant=None):
+        self._books: Dict[str, ParsedBook] = {}
+        self._refs: Dict[str, int] = {}
+        # Reentrant: accountant calls made under it may evict from this store
+        self._lock = threading.RLock()
+        self._parsing = SingleFlight()
+        self.accountant = accountant
+        if accountant is not None:
+            accountant.register(BOOK_CACHE, self._evict)
+
+    def acquire(self, file_path: str) -> ParsedBook:
+        book_hash = compute_book_hash(file_path)
+        with self._lock:
+            book = self._books.get(book_hash)
+            if book is not None:
+                self._refs[book_hash] = self._refs.get(book_hash, 0) + 1
+                if self.accountant is not None:
+                    self.accountant.pin(BOOK_CACHE, book_hash)
+                return book
+        book, _ = self._parsing.do(book_hash, lambda: ParsedBook.parse(file_path, book_hash))
+        with self._lock:
+            # Another caller may have parsed, stored and released it meanwhile
+            stored = self._books.setdefault(book_hash, book)
+            self._refs[book_hash] = self._refs.get(book_hash, 0) + 1
+            if self.accountant is not None:
+                if stored is book:
+                    self.accountant.charge(BOOK_CACHE, book_hash, book.size, book.parse_seconds, pins=1)
+                    book.entity_index.on_indexed = lambda: self._recharge(book_hash)
+                else:
+                    self.accountant.pin(BOOK_CACHE, book_hash)
+            return stored
+
+    def release(self, book: ParsedBook):
+        with self._lock:
+            refs = self._refs.get(book.book_hash, 0) - 1
+            if refs > 0:
+                self._refs[book.book_hash] = refs
+            else:
+                self._refs.pop(book.book_hash, None)
+                if self.accountant is None:
+                    self._books.pop(book.book_hash, None)
+            if self.accountant is not None:
+                self.accountant.unpin(BOOK_CACHE, book.book_hash)
+
+    def _evict(self, book_hash: str):
+        with self._lock:
+            book = self._books.get(book_hash)
+            if book is None:
+                return
+            refs = self._refs.get(book_hash, 0)
+            if not refs:
+                del self._books[book_hash]
+                return
+            # Opened again between being chosen for eviction and now: keep it
+            self.accountant.charge(BOOK_CACHE, book_hash, book.size, book.parse_seconds, pins=refs)
+
+    def _recharge(self, book_hash: str):
+        with self._lock:
+            book = self._books.get(book_hash)
+            if book is not None:
+                self.accountant.charge(BOOK_CACHE, book_hash, book.size, book.parse_seconds,
+                                       pins=self._refs.get(book_hash, 0))
+
+    def refcount(self, book_hash: str) -> int:
+        with self._lock:
+            return self._refs.get(book_hash, 0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._books)
@@ -0,0 +1,51 @@
+from typing import Callable, List, Optional
+from .fan_out import fan_out, DEFAULT_MAX_CONCURRENCY
+
+MERGE_FAN_IN = 2
+
+
+def merge_calls(leaves: int, fan_in: int = MERGE_FAN_IN) -> int:
+    # Number of merge calls needed to reduce this many summaries to one
+    calls = 0
+    while leaves > 1:
+        groups = -(-leaves // fan_in)
+        calls += leaves // fan_in + (1 if leaves % fan_in > 1 else 0)
+        leaves = groups
+    return calls
+
+
+def map_reduce_summaries(sections: List[str], summarize: Callable[[str], str], merge: Callable[[List[str]], str],
+                         prefix: Optional[str] = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                         timeout: Optional[float] = None,
+                         on_progress: Optional[Callable[[int, int], None]] = None) -> str:
+    # Summarizes every section concurrently, then merges neighbouring summaries
+    # fan_in at a time, level by level, until one is left. prefix (the summary so
+    # far) goes in front as an already-summarized leaf. Order is preserved
+    # throughout; the first failed call raises. on_progress(done, total) is called
+    # on this thread after every model call.
+    leaves = 1 if prefix else 0
+    total = len(sections) + merge_calls(len(sections) + leaves)
+    done = 0
+
+    def run_level(func, items):
+        nonlocal done
+        results = [None] * len(items)
+        for (index, _), result, error in fan_out(lambda indexed: func(indexed[1]), list(enumerate(items)),
+                                                 max_concurrency, timeout):
+            if error is not None:
+                raise error
+            results[index] = result
+            done += 1
+            if on_progress is not None:
+                on_progress(done, total)
+        return results
+
+    summaries = run_level(summarize, sections)
+    if prefix:
+        summaries.insert(0, prefix)
+    while len(summaries) > 1:
+        groups = [summaries[i:i + MERGE_FAN_IN] for i in range(0, len(summaries), MERGE_FAN_IN)]
+        merged = run_level(merge, [g for g in groups if len(g) > 1])
+        merged.reverse()
+        summaries = [merged.pop() if len(g) > 1 else g[0] for g in groups]
+    return summaries[0] if summaries else (prefix or "")
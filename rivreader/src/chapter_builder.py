@@ -0,0 +1,133 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MAX_CHAPTER_WORDS = 5000
+PARAGRAPH_SEPARATOR = "\n\n"
+
+_NUMBER_WORDS = (
+    r'one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|fifteen|'
+    r'sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|first|second|third|fourth|fifth|'
+    r'sixth|seventh|eighth|ninth|tenth|last'
+)
+# A well-formed roman numeral; standing alone it must be upper case, or words
+# such as "Did." or "Vivid." would read as headings
+_ROMAN = r'(?=[MDCLXVI])M{0,4}(?:CM|CD|D?C{0,3})(?:XC|XL|L?X{0,3})(?:IX|IV|V?I{0,3})'
+CHAPTER_HEADING_PATTERN = re.compile(
+    r'^(?:(?:chapter|book|part|section)\s+(?:\d+|[ivxlcdm]+|(?:' + _NUMBER_WORDS + r')(?:[\s-](?:' + _NUMBER_WORDS + r'))?)\b'
+    r'|(?-i:' + _ROMAN + r')\.?$|\d{1,3}\.?$'
+    r'|(?:prologue|epilogue|preface|introduction|afterword)\b)',
+    re.IGNORECASE
+)
+_MAX_HEADING_WORDS = 12
+_BLANK_LINE = re.compile(r'\n\s*\n')
+
+
+def is_chapter_heading(text: str) -> bool:
+    text = text.strip()
+    return bool(text) and len(text.split()) <= _MAX_HEADING_WORDS and CHAPTER_HEADING_PATTERN.match(text) is not None
+
+
+def split_text_paragraphs(content: str) -> List[str]:
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+    chunks = _BLANK_LINE.split(content)
+    # Files without blank lines between paragraphs use one line per paragraph
+    if len(chunks) == 1:
+        chunks = content.split('\n')
+    paragraphs = []
+    for chunk in chunks:
+        lines = [line.strip() for line in chunk.split('\n') if line.strip()]
+        if not lines:
+            continue
+        if len(lines) > 1 and is_chapter_heading(lines[0]):
+            paragraphs.append(lines.pop(0))
+        paragraphs.append(' '.join(lines))
+    return paragraphs
+
+
+class ChapterBuilder:
+    # Collects paragraphs in reading order and closes a chapter at each heading
+    # (explicit heading level from the source format, or a "Chapter N" style line).
+    # Sections longer than max_words are cut at paragraph boundaries.
+    def __init__(self, max_words: int = DEFAULT_MAX_CHAPTER_WORDS, heading_levels: int = 3):
+        if max_words <= 0:
+            raise ValueError("max_words must be positive")
+        self.max_words = max_words
+        self.heading_levels = heading_levels
+        self.chapters: List[Dict] = []
+        self._paragraphs: List[Tuple[str, Optional[int]]] = []
+        self._word_count = 0
+        self._has_body = False
+        self._title = None
+        self._part = 1
+
+    def add_paragraph(self, text: str, heading_level: Optional[int] = None):
+        text = text.strip()
+        if not text:
+            return
+        if heading_level is None and is_chapter_heading(text):
+            heading_level = 1
+        is_heading = heading_level is not None and heading_level <= self.heading_levels
+        if is_heading:
+            if self._has_body:
+                self._close()
+            if not self._paragraphs:
+                self._title = text
+                self._part = 1
+        else:
+            heading_level = None
+
+        words = len(text.split())
+        if not is_heading and self._has_body and self._word_count + words > self.max_words:
+            self._close()
+            self._part += 1
+        if words > self.max_words:
+            self._add_oversized(text)
+            return
+        self._paragraphs.append((text, heading_level))
+        self._word_count += words
+        self._has_body = self._has_body or not is_heading
+
+    def add_text(self, content: str):
+        for paragraph in split_text_paragraphs(content):
+            self.add_paragraph(paragraph)
+
+    def finish(self) -> List[Dict]:
+        self._close()
+        return self.chapters
+
+    def _add_oversized(self, text: str):
+        words = text.split()
+        for i in range(0, len(words), self.max_words):
+            if self._has_body:
+                self._close()
+                self._part += 1
+            piece = words[i:i + self.max_words]
+            self._paragraphs.append((' '.join(piece), None))
+            self._word_count += len(piece)
+            self._has_body = True
+
+    def _close(self):
+        if not self._paragraphs:
+            return
+        blocks = []
+        offset = 0
+        for text, heading in self._paragraphs:
+            if blocks:
+                offset += len(PARAGRAPH_SEPARATOR)
+            blocks.append({'text': text, 'start': offset, 'end': offset + len(text), 'heading': heading})
+            offset += len(text)
+        chapter_text = PARAGRAPH_SEPARATOR.join(text for text, _ in self._paragraphs)
+        words = chapter_text.split()
+        title = self._title
+        if title and self._part > 1:
+            title = f"{title} ({self._part})"
+        self.chapters.append({
+            'text': chapter_text,
+            'words': words,
+            'word_count': len(words),
+            'blocks': blocks,
+            'title': title
+        })
+        self._paragraphs = []
+        self._word_count = 0
+        self._has_body = False
@@ -0,0 +1,186 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from .entity_index import DEFAULT_CONTEXT_TOKENS
+from .fan_out import fan_out
+from .single_flight import SingleFlight
+from .prompts import CHARACTER_ANALYSIS_PROMPT, CHARACTER_UPDATE_PROMPT, prepend_copyright_disclaimer
+from .usage_meter import BUDGET_TRIM, SITE_CHARACTER
+
+# Characters kept up to date in the background, most mentioned first
+DEFAULT_TRACKED = 6
+# New mentions since the last sheet before a background update is worth it
+MIN_NEW_MENTIONS = 3
+UPDATE_TOKENS = 800
+IDLE_DELAY = 5.0
+BACKGROUND_CONCURRENCY = 2
+UPDATE_TIMEOUT = 60.0
+
+
+class CharacterTracker:
+    # Character sheets that follow the reader. Each sheet records the position
+    # it was written up to (exclusive) and how many times the name had been
+    # mentioned by then, counted as names() counts it; an update sends the
+    # previous sheet with only the passages read since then, so its cost grows
+    # with what was read, not with the book. Sheets are kept in the workspace,
+    # so cast() answers from stored sheets without a model call. Once the
+    # reader has entered a new chapter and then been idle for idle_delay, the
+    # most mentioned characters with enough new mentions are updated in the
+    # background.
+    # Makes the idle timers; threading.Timer's signature
+    timer_factory = threading.Timer
+
+    def __init__(self, entity_index, ai, book_name: str, state, idle_delay: float = IDLE_DELAY,
+                 tracked: int = DEFAULT_TRACKED):
+        self.entity_index = entity_index
+        self.ai = ai
+        self.book_name = book_name
+        self.state = state
+        self.idle_delay = idle_delay
+        self.tracked = tracked
+        self.workspace = None
+        self.book_hash = None
+        self._sheets: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._timer = None
+        self._chapter = None
+        # The reader entered a chapter since the last background refresh
+        self._moved = False
+
+    def attach_workspace(self, workspace, book_hash: str):
+        sheets = {entry["name"]: entry for entry in workspace.load_character_sheets(book_hash)}
+        with self._lock:
+            self.workspace = workspace
+            self.book_hash = book_hash
+            self._sheets = sheets
+
+    def _read_up_to(self) -> Tuple[int, int]:
+        position = self.state.snapshot()
+        return position.chapter, position.word + 1
+
+    def _usable(self, entry: Optional[Dict], up_to: Tuple[int, int]) -> Optional[Dict]:
+        # A sheet written further on than the reader is now (they went back)
+        # would give away what comes next
+        if entry is None or (entry["chapter"], entry["word"]) > up_to:
+            return None
+        return entry
+
+    def sheet(self, name: str) -> Optional[str]:
+        with self._lock:
+            entry = self._usable(self._sheets.get(name), self._read_up_to())
+        return entry["sheet"] if entry else None
+
+    def cast(self, limit: Optional[int] = None) -> List[Dict]:
+        # The characters read so far with their stored sheets, most mentioned
+        # first. Never calls the model.
+        up_to = self._read_up_to()
+        names = self.entity_index.names(up_to)
+        with self._lock:
+            sheets = dict(self._sheets)
+        cast = []
+        for name, mentions in names[:limit]:
+            entry = self._usable(sheets.get(name), up_to)
+            cast.append({
+                "name": name,
+                "mentions": mentions,
+                "sheet": entry["sheet"] if entry else None,
+                "as_of": (entry["chapter"], entry["word"]) if entry else None,
+                "new_mentions": mentions - entry["mentions"] if entry else mentions
+            })
+        return cast
+
+    def update(self, name: str, aliases: Iterable[str] = (), timeout: Optional[float] = None) -> Optional[str]:
+        # Brings name's sheet up to the reader's position and returns it, or None
+        # if they have not appeared yet. Blocking; concurrent updates of the same
+        # character share one request. Model errors propagate.
+        aliases = tuple(aliases)
+        sheet, _ = self._flight.do(name, lambda: self._update(name, aliases, timeout))
+        return sheet
+
+    def _update(self, name: str, aliases: Tuple[str, ...], timeout: Optional[float]) -> Optional[str]:
+        up_to = self._read_up_to()
+        with self._lock:
+            previous = self._usable(self._sheets.get(name), up_to)
+        if previous is not None and not self.entity_index.mentions(
+                name, up_to, aliases, since=(previous["chapter"], previous["word"])):
+            return previous["sheet"]
+        mentions = len(self.entity_index.mentions(name, up_to))
+        token_budget = UPDATE_TOKENS if previous is not None else DEFAULT_CONTEXT_TOKENS
+        if self.ai.budget_level() >= BUDGET_TRIM:
+            token_budget //= 2
+        if previous is None:
+            context = self.entity_index.context_for(name, up_to, aliases, token_budget)
+            if not context:
+                return None
+            prompt = CHARACTER_ANALYSIS_PROMPT.format(character_name=name, character_context=context)
+        else:
+            since = (previous["chapter"], previous["word"])
+            passages = self.entity_index.context_for(name, up_to, aliases, token_budget, since=since)
+            prompt = CHARACTER_UPDATE_PROMPT.format(character_name=name, previous_sheet=previous["sheet"],
+                                                    new_passages=passages)
+        response = self.ai.create(
+            SITE_CHARACTER, self.book_name, timeout,
+            model="claude-3-sonnet-20240229",
+            max_tokens=300,
+            temperature=0.7,
+            system=prepend_copyright_disclaimer("You are an expert on character analysis."),
+            messages=[{"role": "user", "content": prompt}]
+        )
+        sheet = response.content[0].text.strip()
+        entry = {"name": name, "sheet": sheet, "chapter": up_to[0], "word": up_to[1], "mentions": mentions}
+        with self._lock:
+            current = self._sheets.get(name)
+            # Keep whichever sheet has seen more of the book
+            if current is not None and (current["chapter"], current["word"]) > up_to:
+                return sheet
+            self._sheets[name] = entry
+            workspace, book_hash = self.workspace, self.book_hash
+        if workspace is not None:
+            workspace.save_character_sheet(book_hash, name, sheet, up_to[0], up_to[1], mentions)
+        return sheet
+
+    def due(self) -> List[str]:
+        # The most mentioned characters whose sheets are missing or behind
+        return [entry["name"] for entry in self.cast(self.tracked) if entry["new_mentions"] >= MIN_NEW_MENTIONS]
+
+    def refresh(self, max_concurrency: int = BACKGROUND_CONCURRENCY, timeout: float = UPDATE_TIMEOUT) -> int:
+        # Updates the due characters; returns how many sheets were written.
+        # Skipped once the token budget is being trimmed.
+        if self.ai.budget_level() >= BUDGET_TRIM:
+            return 0
+        updated = 0
+        for name, sheet, error in fan_out(lambda name: self.update(name, timeout=timeout), self.due(),
+                                          max_concurrency, timeout):
+            if error is not None:
+                print(f"Error updating character sheet for {name}: {str(error)}")
+            elif sheet is not None:
+                updated += 1
+        return updated
+
+    def on_position(self, chapter: int):
+        # Every position update restarts the idle timer
+        with self._lock:
+            if chapter != self._chapter:
+                self._chapter = chapter
+                self._moved = True
+            if not self._moved:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = self.timer_factory(self.idle_delay, self._refresh_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            self._moved = False
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error updating character sheets: {str(e)}")
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
@@ -1,64 +1,211 @@
-import importlib
-from .prompts import DYNAMIC_SUMMARY_PROMPT
+from .ai_client import AIClient
+from .catch_up import map_reduce_summaries
+from .fan_out import DEFAULT_MAX_CONCURRENCY
+from .prompts import DYNAMIC_SUMMARY_PROMPT, CATCH_UP_SECTION_PROMPT, SUMMARY_MERGE_PROMPT
+from .readahead import ReadAheadScheduler
+from .reader_state import ReaderState
+from .usage_meter import BUDGET_TRIM, SITE_SUMMARY, SITE_CATCH_UP
+
+# Chapter text sent when the token budget is running low (most recent part kept)
+TRIMMED_CHAPTER_CHARS = 6000
 
 class ContextManager:
-    def __init__(self, document_reader, api_key):
+    def __init__(self, document_reader, api_key, ai_client=None, book_name=None, state=None):
         self.document_reader = document_reader
+        # Everything below that derives from the position changes under state.lock
+        self.state = state if state is not None else ReaderState()
         self.dynamic_summary = ""
+        # Bumped whenever dynamic_summary or summary_position is replaced, so
+        # background results computed against an older summary can be dropped
+        self.summary_version = 0
         self.current_context = ""
         self.last_update_word = 0
+        # The summary can trail the reader: current_context already carries the
+        # chapter verbatim up to the reading position.
+        self.context_chapter = 0
+        # (chapter, word) the summary reaches; nothing before it is summarized
+        # or queued again, though skipped sections before it may still be
+        # waiting on pending_catch_up
+        self.summary_position = (0, 0)
+        # The summary as it stood at the start of each chapter it covered
+        # without gaps, to fall back to when the reader goes back
+        self.summary_checkpoints = {0: ""}
+        self.catch_up_active = False
+        # (chapter, start_word) sections moved past without being summarized,
+        # waiting for catch_up()
+        self.pending_catch_up = []
         self.additional_context = ["", "", ""]
-        self.anthropic_module = None
-        self.client = None
         self.api_key = api_key
-        self._init_client()
-
-    def _init_client(self):
-        if self.client is None:
-            try:
-                if self.anthropic_module is None:
-                    self.anthropic_module = importlib.import_module('anthropic')
-                self.client = self.anthropic_module.Anthropic(api_key=self.api_key)
-            except ImportError:
-                print("Error: Unable to import anthropic module. Please ensure it's installed.")
-            except Exception as e:
-                print(f"Error initializing Anthropic client: {str(e)}")
+        self.ai = ai_client if ai_client is not None else AIClient(api_key)
+        self.book_name = book_name
+        self.read_ahead = ReadAheadScheduler(self)
 
     def update_context(self, new_word_index):
-        current_chapter = self.document_reader.get_current_chapter_number() - 1
-        
-        if new_word_index > self.last_update_word:
-            new_content = ' '.join(self.document_reader.chapters[current_chapter]['words'][self.last_update_word:new_word_index])
-            self.current_context += new_content
-            self._update_dynamic_summary(new_content)
-        else:
-            self.current_context = self.document_reader.get_current_chapter_content_up_to_word()
+        with self.state.lock:
+            current_chapter = self.document_reader.get_current_chapter_number() - 1
+
+            # Read-ahead work keyed on the old chapter drops itself
+            if current_chapter > self.context_chapter:
+                self._fast_forward(current_chapter)
+                # Whatever of the chapters moved past is not in the summary yet
+                # (at least the unsummarized tail of the one being left) waits
+                # for catch_up() rather than being dropped
+                self.pending_catch_up.extend(self.catch_up_sections(current_chapter))
+                self.context_chapter = current_chapter
+            elif current_chapter < self.context_chapter:
+                self._roll_back(current_chapter)
+                self.context_chapter = current_chapter
+            if new_word_index > self.last_update_word:
+                new_content = ' '.join(self.document_reader.chapters[current_chapter]['words'][self.last_update_word:new_word_index])
+                self.current_context += (' ' if self.current_context and new_content else '') + new_content
+            else:
+                self.current_context = self.document_reader.get_current_chapter_content_up_to_word()
+
+            self.last_update_word = new_word_index
+            # Summarization happens off the reading path; a pre-computed section is
+            # merged here once the reader has passed its end.
+            self.read_ahead.on_position(current_chapter, new_word_index)
+
+    @property
+    def summarized_word(self):
+        # How far into the reader's chapter the summary reaches
+        chapter, word = self.summary_position
+        if chapter < self.context_chapter:
+            return 0
+        if chapter > self.context_chapter:
+            return self.document_reader.chapters[self.context_chapter]['word_count']
+        return word
+
+    def replace_summary(self, summary, summarized_word, chapter=None):
+        # The summary now reaches summarized_word of chapter (the reader's by default)
+        with self.state.lock:
+            if chapter is None:
+                chapter = self.context_chapter
+            chapters = self.document_reader.chapters
+            if chapter + 1 < len(chapters) and summarized_word >= chapters[chapter]['word_count']:
+                chapter, summarized_word = chapter + 1, 0
+            self.dynamic_summary = summary
+            self.summary_position = (chapter, summarized_word)
+            self.summary_version += 1
+            if (summarized_word == 0 and not self.catch_up_active
+                    and all(section[0] >= chapter for section in self.pending_catch_up)):
+                self.summary_checkpoints[chapter] = summary
+
+    def _roll_back(self, chapter):
+        # A summary reaching past the start of the chapter the reader went back
+        # to would give away what comes next: the latest checkpoint before it
+        # takes its place and the text in between waits for catch_up()
+        if self.summary_position <= (chapter, 0):
+            self.pending_catch_up[:] = [section for section in self.pending_catch_up if section[0] < chapter]
+            return
+        checkpoint = max(c for c in self.summary_checkpoints if c <= chapter)
+        self.pending_catch_up[:] = []
+        self.replace_summary(self.summary_checkpoints[checkpoint], 0, checkpoint)
+        self.pending_catch_up[:] = self.sections_between(checkpoint, 0, chapter)
 
-        self.last_update_word = new_word_index
+    def _fast_forward(self, chapter):
+        # Coming forward again past a checkpoint recorded before going back:
+        # the summary picks up from there instead of summarizing it again
+        ahead = [c for c in self.summary_checkpoints if self.summary_position < (c, 0) and c <= chapter]
+        if not ahead:
+            return
+        checkpoint = max(ahead)
+        self.pending_catch_up[:] = [section for section in self.pending_catch_up if section[0] >= checkpoint]
+        self.replace_summary(self.summary_checkpoints[checkpoint], 0, checkpoint)
 
-    def _update_dynamic_summary(self, new_content):
+    def summarize_section(self, previous_summary, new_content, supersede_key=None):
+        response = self.ai.create(
+            SITE_SUMMARY, self.book_name, supersede_key=supersede_key,
+            model="claude-3-sonnet-20240229",
+            max_tokens=400,
+            temperature=0.7,
+            system="You are a helpful assistant that provides dynamic book summaries.",
+            messages=[
+                {"role": "user", "content": DYNAMIC_SUMMARY_PROMPT.format(
+                    previous_summary=previous_summary,
+                    new_content=new_content
+                )}
+            ]
+        )
+        return response.content[0].text.strip()
+
+    def catch_up_sections(self, new_chapter):
+        # The (chapter, start_word) sections between the summarized position (or
+        # the start of the reader's chapter, before which everything is already
+        # summarized or queued) and the start of new_chapter; empty unless the
+        # reader is moving forward
+        chapter, word = max(self.summary_position, (self.context_chapter, 0))
+        return self.sections_between(chapter, word, new_chapter)
+
+    def sections_between(self, chapter, word, new_chapter):
+        chapters = self.document_reader.chapters
+        if new_chapter <= chapter:
+            return []
+        sections = []
+        if word < chapters[chapter]['word_count']:
+            sections.append((chapter, word))
+        sections.extend((skipped, 0) for skipped in range(chapter + 1, new_chapter))
+        return sections
+
+    def catch_up(self, sections, on_progress=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=None):
+        # Folds the given sections into the running summary with one concurrent
+        # summary per section and a pairwise merge tree. Read-ahead is paused
+        # meanwhile. The result is dropped (returns False) if the summary was
+        # replaced in the meantime or the reader went back before its end; the
+        # sections the reader is still past go back on pending_catch_up.
+        chapters = self.document_reader.chapters
+        texts = [' '.join(chapters[chapter]['words'][start:]) for chapter, start in sections]
+        with self.state.lock:
+            base_summary, version = self.dynamic_summary, self.summary_version
+            self.catch_up_active = True
         try:
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=400,
-                temperature=0.7,
-                system="You are a helpful assistant that provides dynamic book summaries.",
-                messages=[
-                    {"role": "user", "content": DYNAMIC_SUMMARY_PROMPT.format(
-                        previous_summary=self.dynamic_summary,
-                        new_content=new_content
-                    )}
-                ]
+            summary = map_reduce_summaries(
+                texts,
+                lambda text: self._catch_up_call(CATCH_UP_SECTION_PROMPT.format(section=text), timeout),
+                lambda parts: self._catch_up_call(SUMMARY_MERGE_PROMPT.format(summaries="\n\n".join(
+                    f"Part {i}:\n{part}" for i, part in enumerate(parts, 1))), timeout),
+                prefix=base_summary, max_concurrency=max_concurrency, timeout=timeout, on_progress=on_progress
             )
-            self.dynamic_summary = response.content[0].text.strip()
-        except Exception as e:
-            print(f"Error updating dynamic summary: {str(e)}")
+        finally:
+            with self.state.lock:
+                self.catch_up_active = False
+        with self.state.lock:
+            chapter = self.state.snapshot().chapter
+            if self.summary_version != version or chapter <= sections[-1][0]:
+                # Sections from the reader's chapter on are queued again when
+                # the reader next moves forward past them; so are those the
+                # summary already reaches or that went back on the queue
+                mark = self.summary_position
+                queued = {section[0] for section in self.pending_catch_up}
+                self.pending_catch_up[:0] = [max(section, mark) for section in sections
+                                             if mark[0] <= section[0] < chapter and section[0] not in queued]
+                self.read_ahead.wake()
+                return False
+            chapter, word = max(self.summary_position, (sections[-1][0] + 1, 0))
+            self.replace_summary(summary, word, chapter)
+            self.read_ahead.wake()
+            return True
+
+    def _catch_up_call(self, prompt, timeout=None):
+        response = self.ai.create(
+            SITE_CATCH_UP, self.book_name, timeout,
+            model="claude-3-sonnet-20240229",
+            max_tokens=500,
+            temperature=0.5,
+            system="You are a helpful assistant that provides dynamic book summaries.",
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.content[0].text.strip()
 
     def get_full_context(self):
+        with self.state.lock:
+            self.read_ahead.merge_if_passed()
+            summary = self.dynamic_summary
+            chapter_content = self.current_context
         context = ""
         
         # Add dynamic summary
-        context += f"Book Summary:\n{self.dynamic_summary}\n\n"
+        context += f"Book Summary:\n{summary}\n\n"
         
         # Add additional context
         for i, add_context in enumerate(self.additional_context, 1):
@@ -66,15 +213,11 @@ class ContextManager:
                 context += f"Additional Context {i}:\n{add_context}\n\n"
         
         # Add current chapter context
-        context += f"Current chapter content:\n{self.current_context}"
+        if self.ai.budget_level() >= BUDGET_TRIM and len(chapter_content) > TRIMMED_CHAPTER_CHARS:
+            chapter_content = "... " + chapter_content[-TRIMMED_CHAPTER_CHARS:].split(' ', 1)[-1]
+        context += f"Current chapter content:\n{chapter_content}"
         return context
 
-    def _init_client(self):
-        if self.client is None:
-            if self.anthropic_module is None:
-                self.anthropic_module = importlib.import_module('anthropic')
-            self.client = self.anthropic_module.Anthropic(api_key=self.api_key)
-
     def get_current_chapter_summary(self):
         # This method now returns the dynamic summary instead of a chapter-specific summary
         return self.get_dynamic_summary()
@@ -82,9 +225,25 @@ class ContextManager:
     def get_dynamic_summary(self):
         return self.dynamic_summary
 
+    def restore_summary(self, summary, position=None):
+        # position is the (chapter, word) the saved summary covers up to
+        with self.state.lock:
+            self.read_ahead.cancel()
+            self.current_context = self.document_reader.get_current_chapter_content_up_to_word()
+            self.last_update_word = self.document_reader.get_current_word_index()
+            self.context_chapter = self.document_reader.current_chapter
+            if position is not None and position[0] == self.context_chapter:
+                self.replace_summary(summary, min(position[1], self.last_update_word))
+            elif position is not None and position[0] < self.context_chapter:
+                self.replace_summary(summary, position[1], position[0])
+            else:
+                self.replace_summary(summary, 0)
+
     def reset_context_for_new_chapter(self):
-        self.current_context = ""
-        self.last_update_word = 0
+        with self.state.lock:
+            self.read_ahead.cancel()
+            self.current_context = ""
+            self.last_update_word = 0
 
     def set_additional_context(self, index, content):
         if 0 <= index < 3:
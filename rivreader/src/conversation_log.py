@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+CONVERSATION_PAGE_SIZE = 50
+_READ_BLOCK_SIZE = 1 << 16
+
+
+class ConversationLog:
+    # Exchanges are appended one JSON object per line and fsynced as they complete,
+    # so a crash loses at most the exchange being written. Settings (prompt, persona,
+    # additional context) are small and are replaced atomically in a side file.
+    def __init__(self, directory: str, book_name: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{book_name}_conversation.jsonl")
+        self.settings_path = os.path.join(directory, f"{book_name}_conversation_settings.json")
+        self.legacy_path = os.path.join(directory, f"{book_name}_conversation.json")
+        self._file = None
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.legacy_path) and not os.path.exists(self.path):
+            self._migrate_legacy()
+        self._file = open(self.path, 'ab')
+        # A crash mid-write can leave a partial last line; never append onto it
+        if self._file.tell() > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write(b'\n')
+                    self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) or os.path.exists(self.legacy_path)
+
+    def append_exchange(self, user: str, ai: str):
+        self.append_exchanges([{"user": user, "ai": ai}])
+
+    def append_exchanges(self, exchanges: List[Dict[str, str]]):
+        if self._file is None:
+            self.open()
+        now = time.time()
+        data = b''.join(
+            json.dumps({"user": e["user"], "ai": e["ai"], "time": e.get("time", now)}).encode('utf-8') + b'\n'
+            for e in exchanges
+        )
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def write_settings(self, settings: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.settings_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(settings, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.settings_path)
+
+    def read_settings(self) -> Optional[Dict]:
+        if not os.path.exists(self.settings_path):
+            return None
+        try:
+            with open(self.settings_path, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"Error reading conversation settings: {str(e)}")
+            return None
+
+    def read_recent(self, limit: int = CONVERSATION_PAGE_SIZE) -> Tuple[List[Dict[str, str]], int]:
+        if not os.path.exists(self.path):
+            return [], 0
+        return self.read_before(os.path.getsize(self.path), limit)
+
+    def read_before(self, cursor: int, limit: int = CONVERSATION_PAGE_SIZE) -> Tuple[List[Dict[str, str]], int]:
+        # Walks the file backwards from cursor (a byte offset) and returns up to
+        # limit exchanges in chronological order plus the cursor for the page before.
+        exchanges = []
+        if cursor <= 0 or not os.path.exists(self.path):
+            return exchanges, 0
+        with open(self.path, 'rb') as f:
+            pos = cursor
+            tail = b''
+            while pos > 0 and len(exchanges) < limit:
+                read_size = min(_READ_BLOCK_SIZE, pos)
+                pos -= read_size
+                f.seek(pos)
+                buffer = f.read(read_size) + tail
+                lines = buffer.split(b'\n')
+                tail = lines.pop(0) if pos > 0 else b''
+                line_end = pos + len(buffer)
+                for line in reversed(lines):
+                    line_start = line_end - len(line)
+                    line_end = line_start - 1
+                    exchange = self._parse_line(line)
+                    if exchange is None:
+                        continue
+                    exchanges.append(exchange)
+                    cursor = line_start
+                    if len(exchanges) >= limit:
+                        break
+                else:
+                    if pos == 0:
+                        cursor = 0
+        exchanges.reverse()
+        return exchanges, cursor
+
+    def read_all(self) -> List[Dict[str, str]]:
+        exchanges = []
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    exchange = self._parse_line(line)
+                    if exchange is not None:
+                        exchanges.append(exchange)
+        return exchanges
+
+    @staticmethod
+    def _parse_line(line: bytes) -> Optional[Dict[str, str]]:
+        if not line.strip():
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # Torn write from a crash
+            return None
+        if not isinstance(record, dict) or "user" not in record or "ai" not in record:
+            return None
+        return record
+
+    def _migrate_legacy(self):
+        try:
+            with open(self.legacy_path, 'r') as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"Error migrating conversation file: {str(e)}")
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            for entry in data.get("conversation_history", []):
+                f.write(json.dumps({"user": entry.get("user", ""), "ai": entry.get("ai", ""), "time": 0}).encode('utf-8') + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.write_settings({
+            "system_prompt": data.get("system_prompt"),
+            "additional_context": data.get("additional_context", ["", "", ""]),
+            "ai_name": data.get("ai_name", "Assistant")
+        })
+        os.replace(tmp_path, self.path)
+        os.replace(self.legacy_path, self.legacy_path + ".migrated")
@@ -0,0 +1,123 @@
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from .prompts import CONVERSATION_DIGEST_PROMPT
+
+RECENT_TURNS_TOKEN_CAP = 1200
+DIGEST_TOKEN_CAP = 400
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English prose
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(' ', 1)[0] + " ..."
+
+
+class ConversationMemory:
+    # Two tiers: recent exchanges kept verbatim under a token cap, and a digest that
+    # older exchanges are folded into by a background worker. Building the context
+    # never waits on the model.
+    def __init__(self, fold: Callable[[str], str], recent_token_cap: int = RECENT_TURNS_TOKEN_CAP,
+                 on_digest_updated: Optional[Callable[[], None]] = None):
+        self.fold = fold
+        self.recent_token_cap = recent_token_cap
+        self.on_digest_updated = on_digest_updated
+        self.digest = ""
+        self.digest_through = None
+        self._recent: deque = deque()
+        self._recent_tokens = 0
+        self._pending: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def load(self, history: List[Dict[str, str]], digest: str = "", digest_through: Optional[float] = None):
+        with self._lock:
+            self.digest = digest
+            self.digest_through = digest_through
+            self._recent.clear()
+            self._recent_tokens = 0
+            self._pending = []
+        for exchange in history:
+            if digest_through is None or exchange.get("time", 0) > digest_through:
+                self.add_exchange(exchange)
+
+    def add_exchange(self, exchange: Dict[str, str]):
+        with self._lock:
+            self._recent.append(exchange)
+            self._recent_tokens += self._exchange_tokens(exchange)
+            while self._recent_tokens > self.recent_token_cap and len(self._recent) > 1:
+                evicted = self._recent.popleft()
+                self._recent_tokens -= self._exchange_tokens(evicted)
+                self._pending.append(evicted)
+            if self._pending and self._worker is None:
+                self._worker = threading.Thread(target=self._fold_pending, daemon=True)
+                self._worker.start()
+
+    def build_context(self, ai_name: str, recent_token_cap: Optional[int] = None) -> str:
+        # recent_token_cap below the memory's own cap sends fewer recent turns
+        cap = min(recent_token_cap or self.recent_token_cap, self.recent_token_cap)
+        with self._lock:
+            digest = self.digest
+            recent = list(self._recent)
+        if cap < self.recent_token_cap:
+            kept, tokens = [], 0
+            for exchange in reversed(recent):
+                tokens += self._exchange_tokens(exchange)
+                if kept and tokens > cap:
+                    break
+                kept.append(exchange)
+            recent = kept[::-1]
+        context = ""
+        if digest:
+            context += f"Earlier conversation (digest):\n{digest}\n\n"
+        context += "Recent conversation:\n"
+        for exchange in recent:
+            ai_text = self._strip_name(exchange["ai"], ai_name)
+            # A single oversized exchange is the only thing that can exceed the cap
+            ai_text = truncate_to_tokens(ai_text, cap)
+            context += f"User: {exchange['user']}\n{ai_name}: {ai_text}\n\n"
+        return context
+
+    def wait_idle(self, timeout: Optional[float] = None):
+        with self._lock:
+            worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def _fold_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    return
+                batch = list(self._pending)
+                previous_digest = self.digest
+            exchanges = "\n\n".join(f"Reader: {e['user']}\nCompanion: {e['ai']}" for e in batch)
+            try:
+                digest = self.fold(CONVERSATION_DIGEST_PROMPT.format(previous_digest=previous_digest, exchanges=exchanges))
+            except Exception as e:
+                print(f"Error updating conversation digest: {str(e)}")
+                with self._lock:
+                    self._worker = None
+                return
+            with self._lock:
+                self.digest = truncate_to_tokens(digest.strip(), DIGEST_TOKEN_CAP)
+                self.digest_through = batch[-1].get("time", self.digest_through)
+                del self._pending[:len(batch)]
+            if self.on_digest_updated is not None:
+                self.on_digest_updated()
+
+    @staticmethod
+    def _strip_name(text: str, ai_name: str) -> str:
+        prefix = f"{ai_name}: "
+        return text[len(prefix):] if text.startswith(prefix) else text
+
+    @staticmethod
+    def _exchange_tokens(exchange: Dict[str, str]) -> int:
+        return estimate_tokens(exchange["user"]) + estimate_tokens(exchange["ai"])
@@ -1,22 +1,35 @@
 import os
+import hashlib
 import ebooklib
 from ebooklib import epub
-from bs4 import BeautifulSoup
-from docx import Document
-from striprtf.striprtf import rtf_to_text
-import html2text
 import PyPDF2
+from .html_extractor import extract_blocks, extract_file_blocks, blocks_to_text
+from .docx_extractor import iter_docx_paragraphs
+from .rtf_extractor import iter_rtf_file_paragraphs
+from .chapter_builder import ChapterBuilder, DEFAULT_MAX_CHAPTER_WORDS
+
+def compute_book_hash(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
 
 class DocumentReader:
-    def __init__(self, file_path):
+    def __init__(self, file_path, max_chapter_words=DEFAULT_MAX_CHAPTER_WORDS, chapters=None):
+        # chapters, when given, are already parsed (e.g. shared by BookStore) and
+        # are read but never modified
         self.file_path = file_path
         self.file_type = self._get_file_type()
-        self.chapters = []
+        self.max_chapter_words = max_chapter_words
+        self.chapters = chapters if chapters is not None else []
         self.current_chapter = 0
         self.current_word = 0
         self.pdf_reader = None
         self.is_pdf = self.file_type == '.pdf'
-        self._process_file()
+        if chapters is None:
+            self._process_file()
 
     def _get_file_type(self):
         _, ext = os.path.splitext(self.file_path)
@@ -88,13 +101,14 @@ class DocumentReader:
         try:
             book = epub.read_epub(self.file_path)
             for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
-                soup = BeautifulSoup(item.get_content(), 'html.parser')
-                chapter_text = soup.get_text()
+                blocks = extract_blocks(item.get_content())
+                chapter_text = blocks_to_text(blocks)
                 words = chapter_text.split()
                 self.chapters.append({
                     'text': chapter_text,
                     'words': words,
-                    'word_count': len(words)
+                    'word_count': len(words),
+                    'blocks': blocks
                 })
         except ebooklib.epub.EpubException as e:
             print(f"Error processing EPUB file: {str(e)}")
@@ -120,9 +134,10 @@ class DocumentReader:
 
     def _process_docx(self):
         try:
-            doc = Document(self.file_path)
-            content = '\n'.join([para.text for para in doc.paragraphs])
-            self._split_into_chapters(content)
+            builder = ChapterBuilder(self.max_chapter_words)
+            for text, heading_level in iter_docx_paragraphs(self.file_path):
+                builder.add_paragraph(text, heading_level)
+            self.chapters.extend(builder.finish())
         except IOError as e:
             print(f"Error reading DOCX file: {str(e)}")
             raise
@@ -132,12 +147,10 @@ class DocumentReader:
 
     def _process_rtf(self):
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as file:
-                content = rtf_to_text(file.read())
-            self._split_into_chapters(content)
-        except UnicodeDecodeError:
-            print("Error: Unable to decode the RTF file. It might be encoded in a different format.")
-            raise
+            builder = ChapterBuilder(self.max_chapter_words)
+            for text, heading_level in iter_rtf_file_paragraphs(self.file_path):
+                builder.add_paragraph(text, heading_level)
+            self.chapters.extend(builder.finish())
         except IOError as e:
             print(f"Error reading RTF file: {str(e)}")
             raise
@@ -147,12 +160,10 @@ class DocumentReader:
 
     def _process_html(self):
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as file:
-                content = html2text.html2text(file.read())
-            self._split_into_chapters(content)
-        except UnicodeDecodeError:
-            print("Error: Unable to decode the HTML file. It might be encoded in a different format.")
-            raise
+            builder = ChapterBuilder(self.max_chapter_words)
+            for block in extract_file_blocks(self.file_path):
+                builder.add_paragraph(block['text'], block['heading'])
+            self.chapters.extend(builder.finish())
         except IOError as e:
             print(f"Error reading HTML file: {str(e)}")
             raise
@@ -162,16 +173,9 @@ class DocumentReader:
 
     def _split_into_chapters(self, content):
         try:
-            words = content.split()
-            chapter_size = 1000
-            for i in range(0, len(words), chapter_size):
-                chapter_words = words[i:i+chapter_size]
-                chapter_text = ' '.join(chapter_words)
-                self.chapters.append({
-                    'text': chapter_text,
-                    'words': chapter_words,
-                    'word_count': len(chapter_words)
-                })
+            builder = ChapterBuilder(self.max_chapter_words)
+            builder.add_text(content)
+            self.chapters.extend(builder.finish())
         except Exception as e:
             print(f"Error splitting content into chapters: {str(e)}")
             raise
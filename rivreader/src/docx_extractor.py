@@ -0,0 +1,90 @@
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, Optional, Tuple
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCUMENT_PART = 'word/document.xml'
+STYLES_PART = 'word/styles.xml'
+
+_RUN_CONTENT = {W + 't': None, W + 'tab': '\t', W + 'br': '\n', W + 'cr': '\n'}
+
+
+def style_heading_level(name: str) -> Optional[int]:
+    # Word stores built-in names in lower case ("heading 1"); python-docx shows them capitalized
+    name = name.strip().lower()
+    if name == "title":
+        return 1
+    if name.startswith("heading"):
+        level = name[len("heading"):].strip()
+        return int(level) if level.isdigit() else 1
+    return None
+
+
+def read_heading_styles(archive: zipfile.ZipFile) -> Dict[str, int]:
+    # styleId -> heading level for paragraph styles that are headings, by name or
+    # by outline level (which also covers localized heading style names)
+    try:
+        root = ET.fromstring(archive.read(STYLES_PART))
+    except KeyError:
+        return {}
+    levels = {}
+    for style in root.iter(W + 'style'):
+        if style.get(W + 'type') != 'paragraph':
+            continue
+        style_id = style.get(W + 'styleId')
+        name = style.find(W + 'name')
+        level = style_heading_level(name.get(W + 'val', '') if name is not None else style_id or '')
+        if level is None:
+            outline = style.find(f'{W}pPr/{W}outlineLvl')
+            if outline is not None and outline.get(W + 'val', '').isdigit() and int(outline.get(W + 'val')) < 9:
+                level = int(outline.get(W + 'val')) + 1
+        if style_id and level is not None:
+            levels[style_id] = level
+    return levels
+
+
+def iter_docx_paragraphs(path: str) -> Iterator[Tuple[str, Optional[int]]]:
+    # Streams word/document.xml straight out of the zip and yields (text, heading
+    # level) for each top-level body paragraph, as python-docx's doc.paragraphs
+    # would. Finished elements are dropped as soon as they are read, so memory
+    # stays flat however long the document is, and images and other parts are
+    # never loaded. Runs inside hyperlinks and tracked insertions count as
+    # paragraph text; text boxes and tables are skipped.
+    with zipfile.ZipFile(path) as archive:
+        heading_styles = read_heading_styles(archive)
+        with archive.open(DOCUMENT_PART) as document:
+            stack = []
+            body = None
+            paragraph_depth = None
+            parts = []
+            style = None
+            textbox_depth = 0
+            for event, elem in ET.iterparse(document, events=('start', 'end')):
+                tag = elem.tag
+                if event == 'start':
+                    stack.append(tag)
+                    if tag == W + 'body':
+                        body = elem
+                    elif tag == W + 'p' and body is not None and len(stack) == 3:
+                        # document/body/p
+                        paragraph_depth = len(stack)
+                        parts = []
+                        style = None
+                    elif tag == W + 'txbxContent' and paragraph_depth is not None:
+                        textbox_depth += 1
+                    continue
+                depth = len(stack)
+                stack.pop()
+                if paragraph_depth is not None and not textbox_depth:
+                    if tag in _RUN_CONTENT and stack[-1] == W + 'r':
+                        text = _RUN_CONTENT[tag]
+                        parts.append(text if text is not None else elem.text or '')
+                    elif tag == W + 'pStyle' and depth == paragraph_depth + 2:
+                        style = elem.get(W + 'val')
+                if tag == W + 'txbxContent' and paragraph_depth is not None:
+                    textbox_depth -= 1
+                if depth == 3 and body is not None:
+                    if tag == W + 'p':
+                        yield ''.join(parts), heading_styles.get(style)
+                        paragraph_depth = None
+                    body.clear()
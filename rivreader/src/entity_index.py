@@ -0,0 +1,162 @@
+import bisect
+import sys
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from .conversation_memory import estimate_tokens
+
+DEFAULT_CONTEXT_TOKENS = 1500
+DEFAULT_WINDOW_WORDS = 40
+_STRIP = ".,;:!?\"'()[]{}<>“”‘’—–-_*"
+# Honorifics are part of how a character is named but match too many people
+TITLES = {"Mr", "Mrs", "Ms", "Miss", "Dr", "Sir", "Lady", "Lord", "Madam", "Madame", "Captain", "Colonel",
+          "Professor", "Aunt", "Uncle", "Saint", "St", "King", "Queen", "Prince", "Princess"}
+
+
+def name_token(word: str) -> str:
+    token = word.strip(_STRIP)
+    if token.endswith(("'s", "’s")):
+        token = token[:-2]
+    return token
+
+
+def _ends_sentence(word: str) -> bool:
+    return word.rstrip("\"'”’)").endswith(('.', '!', '?')) and name_token(word) not in TITLES
+
+
+class _ChapterPostings:
+    __slots__ = ("postings", "lowercase", "mid_sentence", "size")
+
+    def __init__(self, words: Sequence[str]):
+        # postings: capitalized token -> sorted word offsets; lowercase: how often
+        # each of those tokens also appears in lower case (ordinary words do);
+        # mid_sentence: how often it is capitalized away from a sentence start
+        postings: Dict[str, List[int]] = {}
+        lowercase = Counter()
+        mid_sentence = Counter()
+        for offset, word in enumerate(words):
+            first = word[:1]
+            if first.isupper() or (first in _STRIP and word[1:2].isupper()):
+                token = name_token(word)
+                if len(token) > 1 and token[0].isupper():
+                    postings.setdefault(token, []).append(offset)
+                    if offset and not _ends_sentence(words[offset - 1]):
+                        mid_sentence[token] += 1
+            elif first.islower():
+                lowercase[name_token(word)] += 1
+        self.postings = postings
+        self.mid_sentence = mid_sentence
+        self.lowercase = {token.lower(): lowercase[token.lower()] for token in postings
+                          if token.lower() in lowercase}
+        # Approximate bytes held: the token strings and their offset lists
+        size = sys.getsizeof(postings) + sys.getsizeof(mid_sentence) + sys.getsizeof(self.lowercase)
+        for token, offsets in postings.items():
+            size += sys.getsizeof(token) + sys.getsizeof(offsets) + len(offsets) * sys.getsizeof(len(words))
+        self.size = size
+
+
+class EntityIndex:
+    # Occurrences of capitalized names, as (chapter, word offset) postings, used
+    # to assemble grounded context for character questions. Chapters are indexed
+    # the first time a query reaches them, so only what the reader has read is
+    # ever indexed, and queries never look past the reader's position. A token
+    # counts as a name when it is mostly capitalized wherever it appears and is
+    # capitalized at least once mid-sentence, which drops ordinary words that
+    # merely start sentences. on_indexed, if given, is called after a chapter
+    # is added so its owner can account for the index growing.
+    def __init__(self, chapters, on_indexed: Optional[Callable[[], None]] = None):
+        self.chapters = chapters
+        self.on_indexed = on_indexed
+        self.size = 0
+        self._chapters: Dict[int, _ChapterPostings] = {}
+        self._lock = threading.Lock()
+
+    def _postings(self, chapter: int) -> _ChapterPostings:
+        postings = self._chapters.get(chapter)
+        if postings is None:
+            built = _ChapterPostings(self.chapters[chapter]['words'])
+            with self._lock:
+                postings = self._chapters.setdefault(chapter, built)
+                if postings is built:
+                    self.size += built.size
+            if postings is built and self.on_indexed is not None:
+                self.on_indexed()
+        return postings
+
+    def _read_chapters(self, up_to: Tuple[int, int], since: Tuple[int, int] = (0, 0)):
+        # (chapter, postings, first word, word limit) for the read text from since
+        last_chapter, last_word = up_to
+        for chapter in range(since[0], min(last_chapter + 1, len(self.chapters))):
+            start = since[1] if chapter == since[0] else 0
+            limit = last_word if chapter == last_chapter else None
+            yield chapter, self._postings(chapter), start, limit
+
+    def names(self, up_to: Tuple[int, int], min_mentions: int = 2) -> List[Tuple[str, int]]:
+        # Likely names read so far, most mentioned first
+        capitalized, lowercase, mid_sentence = Counter(), Counter(), Counter()
+        for _, postings, _, limit in self._read_chapters(up_to):
+            for token, offsets in postings.postings.items():
+                capitalized[token] += len(offsets) if limit is None else bisect.bisect_left(offsets, limit)
+            lowercase.update(postings.lowercase)
+            mid_sentence.update(postings.mid_sentence)
+        return [(token, count) for token, count in capitalized.most_common()
+                if count >= min_mentions and token not in TITLES and mid_sentence[token]
+                and lowercase[token.lower()] * 4 < count]
+
+    def mentions(self, name: str, up_to: Tuple[int, int], aliases: Iterable[str] = (),
+                 since: Optional[Tuple[int, int]] = None) -> List[Tuple[int, int]]:
+        # (chapter, word) of each mention before up_to, and at or after since if given
+        tokens = {name_token(word) for alias in (name, *aliases) for word in alias.split()}
+        tokens = {token for token in tokens if token and token[0].isupper() and token not in TITLES}
+        found = []
+        for chapter, postings, start, limit in self._read_chapters(up_to, since or (0, 0)):
+            offsets = set()
+            for token in tokens:
+                hits = postings.postings.get(token, ())
+                end = len(hits) if limit is None else bisect.bisect_left(hits, limit)
+                offsets.update(hits[bisect.bisect_left(hits, start):end])
+            found.extend((chapter, offset) for offset in sorted(offsets))
+        return found
+
+    def context_for(self, name: str, up_to: Tuple[int, int], aliases: Iterable[str] = (),
+                    token_budget: int = DEFAULT_CONTEXT_TOKENS, window: int = DEFAULT_WINDOW_WORDS,
+                    top_k: Optional[int] = None, since: Optional[Tuple[int, int]] = None) -> str:
+        # The most informative passages mentioning name, in reading order, within
+        # token_budget. Windows around nearby mentions are merged; a passage
+        # scores for the mentions it holds and for the other names it brings in,
+        # and the earliest passage (the first appearance, without since) is favoured.
+        mentions = self.mentions(name, up_to, aliases, since)
+        if not mentions:
+            return ""
+        passages = []
+        for chapter, offset in mentions:
+            start = max(offset - window, 0)
+            end = offset + window + 1
+            if chapter == up_to[0]:
+                end = min(end, up_to[1])
+            if passages and passages[-1][0] == chapter and start <= passages[-1][2]:
+                passages[-1][2] = max(passages[-1][2], end)
+                passages[-1][3] += 1
+            else:
+                passages.append([chapter, start, end, 1])
+
+        name_tokens = {name_token(word) for alias in (name, *aliases) for word in alias.split()}
+        scored = []
+        for rank, (chapter, start, end, hits) in enumerate(passages):
+            words = self.chapters[chapter]['words'][start:end]
+            others = {name_token(w) for w in words if w[:1].isupper()} - name_tokens - TITLES
+            score = hits + 0.5 * len(others) + (3 if rank == 0 else 0) + rank / len(passages)
+            scored.append((score, rank, chapter, start, end, ' '.join(words)))
+        scored.sort(reverse=True)
+
+        chosen, used = [], 0
+        for score, rank, chapter, start, end, text in scored:
+            cost = estimate_tokens(text) + 4
+            if used + cost > token_budget:
+                continue
+            chosen.append((chapter, start, text))
+            used += cost
+            if top_k is not None and len(chosen) >= top_k:
+                break
+        chosen.sort()
+        return "\n\n".join(f"[Chapter {chapter + 1}] ...{text}..." for chapter, _, text in chosen)
@@ -0,0 +1,80 @@
+import random
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Iterator, Optional
+
+WORDS = "the reader turns a page and the story moves on while the companion keeps track of it all".split()
+DEFAULT_LATENCY = 0.2
+DEFAULT_TOKENS_PER_SECOND = 200.0
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _FakeStream:
+    def __init__(self, pieces, message, delay):
+        self._pieces = pieces
+        self._message = message
+        self._delay = delay
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        for piece in self._pieces:
+            if self._delay:
+                time.sleep(self._delay)
+            yield piece
+
+    def get_final_message(self):
+        return self._message
+
+
+class _FakeMessages:
+    def __init__(self, model):
+        self._model = model
+
+    def create(self, **kwargs):
+        message, _ = self._model.respond(kwargs)
+        if self._model.latency:
+            time.sleep(self._model.latency + len(message.content[0].text) / 4 / self._model.tokens_per_second)
+        return message
+
+    @contextmanager
+    def stream(self, **kwargs):
+        message, pieces = self._model.respond(kwargs)
+        if self._model.latency:
+            time.sleep(self._model.latency)
+        delay = 1.0 / self._model.tokens_per_second if self._model.latency else 0.0
+        yield _FakeStream(pieces, message, delay)
+
+
+class FakeAnthropic:
+    # Stands in for anthropic.Anthropic where no API key or network is wanted:
+    # load tests, the server's --fake-model mode and tests. Responses are
+    # deterministic per request, arrive after a fixed latency plus a
+    # per-token delay, and report token usage like the real client does.
+    def __init__(self, latency: float = DEFAULT_LATENCY, tokens_per_second: float = DEFAULT_TOKENS_PER_SECOND,
+                 response_words: int = 60, timeout: Optional[float] = None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_words = response_words
+        self.timeout = timeout
+        self.messages = _FakeMessages(self)
+
+    def with_options(self, timeout: Optional[float] = None):
+        return FakeAnthropic(self.latency, self.tokens_per_second, self.response_words, timeout)
+
+    def respond(self, request):
+        prompt = request.get("system", "") + "".join(
+            m["content"] if isinstance(m["content"], str) else str(m["content"]) for m in request.get("messages", []))
+        rng = random.Random(prompt)
+        count = min(self.response_words, request.get("max_tokens", self.response_words))
+        pieces = [("" if i == 0 else " ") + rng.choice(WORDS) for i in range(count)]
+        text = "".join(pieces)
+        message = SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=text)],
+            usage=SimpleNamespace(input_tokens=estimate_tokens(prompt), output_tokens=len(pieces)),
+            stop_reason="end_turn",
+        )
+        return message, pieces
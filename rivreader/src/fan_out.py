@@ -0,0 +1,52 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_MAX_CONCURRENCY = 4
+_POLL_INTERVAL = 0.1
+
+
+def fan_out(func: Callable[[Any], Any], items: Iterable[Any], max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+            timeout: Optional[float] = None,
+            on_result: Optional[Callable[[Any, Any, Optional[BaseException]], None]] = None
+            ) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+    # Runs func over items with at most max_concurrency calls in flight and yields
+    # (item, result, error) in completion order. timeout is measured per item from
+    # the moment its call starts; an item that overruns is reported as TimeoutError
+    # and its late result is dropped. on_result runs on the iterating thread.
+    items = list(items)
+    if not items:
+        return
+    started = {}
+    started_lock = threading.Lock()
+
+    def run(index):
+        with started_lock:
+            started[index] = time.monotonic()
+        return func(items[index])
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(items))))
+    pending = {executor.submit(run, index): index for index in range(len(items))}
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=_POLL_INTERVAL if timeout is not None else None,
+                           return_when=FIRST_COMPLETED)
+            outcomes = []
+            for future in done:
+                index = pending.pop(future)
+                error = future.exception()
+                outcomes.append((items[index], None if error else future.result(), error))
+            if timeout is not None:
+                now = time.monotonic()
+                with started_lock:
+                    expired = [f for f, index in pending.items() if index in started and now - started[index] > timeout]
+                for future in expired:
+                    index = pending.pop(future)
+                    outcomes.append((items[index], None, TimeoutError(f"timed out after {timeout:g}s")))
+            for item, result, error in outcomes:
+                if on_result is not None:
+                    on_result(item, result, error)
+                yield item, result, error
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -4,9 +4,18 @@ from tkinter import ttk, filedialog, scrolledtext, simpledialog
 import os
 import json
 import re
+import bisect
+import threading
+import queue
+import time
 from ttkthemes import ThemedStyle
 from .reading_companion import ReadingCompanion
 from .theme_manager import ThemeManager
+from .workspace import Workspace, WORKSPACE_FILE
+from .usage_meter import UsageMeter
+from .request_scheduler import RequestScheduler
+from .ui_watchdog import StallWatchdog
+from .text_layout import TextLayout
 from .prompts import (
     DEFAULT_READING_COMPANION_PROMPT,
     CHARACTER_ANALYSIS_PROMPT,
@@ -45,10 +54,52 @@ class ModernReadingCompanionGUI:
             "Neon Pink": "#FF69B4",
             "Neon Green": "#39FF14"}
         self.highlights = []
+        self.text_layout = TextLayout("")
+        self.render_word_offsets = self.text_layout.word_starts
+        self.notes_save_job = None
+        self.book_load_token = 0
+        self.catch_up_active = False
+        self.catch_up_status = ""
+
+        self.workspace = Workspace(WORKSPACE_FILE)
+        self.workspace_flush_interval = 2000
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.master.after(self.workspace_flush_interval, self.flush_workspace)
+        session_budget, daily_budget = self.load_token_budgets()
+        self.usage_meter = UsageMeter(session_budget, daily_budget, workspace=self.workspace)
+        # Shared across books so chat, analyses and summaries draw on one rate limit
+        self.request_scheduler = RequestScheduler()
+        # Records event-loop stalls; F12 shows the overlay, Shift+F12 saves a report
+        self.watchdog = StallWatchdog(self.master, in_flight=self.request_scheduler.running)
+        self.watchdog.start()
+        self.perf_overlay_visible = False
+        self.perf_overlay_interval = 500
+        self.perf_overlay_job = None
 
         self.theme_manager = ThemeManager()
+        self.applied_styles = None
         self.configure_styles()
         self.create_widgets()
+        self.apply_resolved_styles()
+
+    def flush_workspace(self):
+        try:
+            self.workspace.flush()
+        except Exception as e:
+            print(f"Error saving workspace: {str(e)}")
+        self.master.after(self.workspace_flush_interval, self.flush_workspace)
+
+    def on_close(self):
+        self.watchdog.stop()
+        try:
+            if self.companion:
+                self.companion.save_notes(self.notepad_text.get(1.0, tk.END).rstrip("\n"))
+                self.companion.close()
+            self.workspace.close()
+        except Exception as e:
+            print(f"Error saving workspace: {str(e)}")
+        finally:
+            self.master.destroy()
 
     def load_or_prompt_api_key(self):
         if os.path.exists(self.config_file):
@@ -64,62 +115,55 @@ class ModernReadingCompanionGUI:
             else:
                 self.master.quit()  # Exit if no API key is provided
 
+    def load_token_budgets(self):
+        # Optional "session_token_budget" / "daily_token_budget" entries in config.json
+        if not os.path.exists(self.config_file):
+            return None, None
+        with open(self.config_file, 'r') as f:
+            config = json.load(f)
+        return config.get('session_token_budget'), config.get('daily_token_budget')
+
+    def show_usage_report(self):
+        messagebox.showinfo("Token Usage", self.usage_meter.format_report())
+
     def configure_styles(self):
-        theme = self.theme_manager.get_current_theme()
-        self.style.configure("TFrame", background=theme["bg"])
-        self.style.configure("TButton", 
-                            padding=theme["button_padding"], 
-                            font=(theme["font_main"], theme["font_size_main"]), 
-                            borderwidth=theme["button_borderwidth"], 
-                            relief=theme["button_relief"],
-                            background=theme["button_bg"], 
-                            foreground=theme["button_fg"])
-        self.style.map("TButton", background=[('active', theme["button_active_bg"])])
-        self.style.configure("TLabel", background=theme["label_bg"], foreground=theme["label_fg"], 
-                            font=(theme["font_main"], theme["font_size_main"]))
-        self.style.configure("TEntry", fieldbackground=theme["entry_bg"], foreground=theme["entry_fg"], 
-                            font=(theme["font_main"], theme["font_size_main"]))
-        self.style.configure("Horizontal.TProgressbar", background=theme["progress_bar_fg"], 
-                            troughcolor=theme["progress_bar_bg"])
-        self.style.configure("Custom.TButton", background=theme["button_bg"], foreground=theme["button_fg"], 
-                            borderwidth=theme["button_borderwidth"], relief=theme["button_relief"], 
-                            padding=theme["button_padding"], font=(theme["font_main"], theme["font_size_main"]))
-        self.style.map("Custom.TButton", background=[('active', theme["button_active_bg"])])
-        self.style.configure("TNotebook", background=theme["bg"], borderwidth=0)
-        self.style.configure("TNotebook.Tab", background=theme["notebook_tab_bg"], 
-                            foreground=theme["notebook_tab_fg"], padding=[10, 5], 
-                            font=(theme["font_main"], theme["font_size_main"]))
-        self.style.map("TNotebook.Tab", background=[("selected", theme["notebook_tab_selected_bg"])])
-        
-        # Update Combobox styles
-        self.style.configure("TCombobox", 
-                            fieldbackground=theme["dropdown_bg"], 
-                            background=theme["dropdown_bg"],
-                            foreground=theme["dropdown_fg"],
-                            selectbackground=theme["dropdown_highlight_bg"],
-                            selectforeground=theme["dropdown_fg"])
-        self.style.map("TCombobox", 
-                    fieldbackground=[("readonly", theme["dropdown_bg"])],
-                    selectbackground=[("readonly", theme["dropdown_highlight_bg"])])
-        
-        # Configure Scrollbar style
-        self.style.configure("Custom.Vertical.TScrollbar", 
-                            background=theme["scrollbar_bg"], 
-                            troughcolor=theme["bg"], 
-                            bordercolor=theme["bg"],
-                            arrowcolor=theme["scrollbar_fg"])
-        self.style.map("Custom.Vertical.TScrollbar", 
-                    background=[("active", theme["scrollbar_fg"])])
-
-        # Configure Menu colors
-        self.master.option_add('*Menu.background', theme["menu_bg"])
-        self.style.configure('Custom.TMenubutton', 
-                            background=theme["menu_bg"],
-                            foreground=theme["menu_fg"],
-                            padding=theme["button_padding"])
-        self.style.map('Custom.TMenubutton',
-                    background=[('active', theme["menu_active_bg"])],
-                    foreground=[('active', theme["menu_active_fg"])])
+        # ttk styles and the option database must be set before the widgets are
+        # created; only those sections are recorded as applied, so the widget
+        # options and tags follow in apply_resolved_styles() once widgets exist
+        resolved = self.theme_manager.get_resolved_styles()
+        applied = {section: resolved[section] for section in ("styles", "maps", "options")}
+        self.apply_style_changes(applied)
+        self.applied_styles = applied
+
+    def apply_resolved_styles(self):
+        # Applies only the options that differ from what is already on screen, in one pass
+        resolved = self.theme_manager.get_resolved_styles()
+        self.apply_style_changes(self.theme_manager.diff_styles(self.applied_styles, resolved))
+        self.applied_styles = resolved
+
+    def apply_style_changes(self, changes):
+        for style_name, options in changes.get("styles", {}).items():
+            self.style.configure(style_name, **options)
+        for style_name, options in changes.get("maps", {}).items():
+            self.style.map(style_name, **options)
+        for pattern, options in changes.get("options", {}).items():
+            for name, value in options.items():
+                self.master.option_add(f"{pattern}.{name}", value)
+        for key, options in changes.get("widgets", {}).items():
+            for widget in self.themed_widgets(key):
+                widget.config(**options)
+        for (key, tag), options in changes.get("tags", {}).items():
+            for widget in self.themed_widgets(key):
+                widget.tag_configure(tag, **options)
+
+    def themed_widgets(self, key):
+        if key == "text_panels":
+            panels = [getattr(self, name, None) for name in
+                      ("system_prompt_text", "prompt_preview", "highlights_text", "notepad_text", "summary_text")]
+            panels += getattr(self, "additional_context_texts", [])
+            return [panel for panel in panels if panel is not None]
+        widget = getattr(self, key, None)
+        return [widget] if widget is not None else []
 
     def create_widgets(self):
         main_frame = ttk.Frame(self.master, padding="20")
@@ -169,6 +213,7 @@ class ModernReadingCompanionGUI:
 
         ttk.Button(button_frame, text="Select Book", command=self.select_file, style="Custom.TButton").pack(side=tk.LEFT, padx=(0, 10))
         ttk.Button(button_frame, text="Custom Instructions", command=self.set_ai_persona, style="Custom.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Usage", command=self.show_usage_report, style="Custom.TButton").pack(side=tk.LEFT, padx=(0, 10))
         
         # Save/Load dropdown
         save_load_var = tk.StringVar()
@@ -228,6 +273,12 @@ class ModernReadingCompanionGUI:
         self.book_content.bind("<Button-1>", self.on_content_click)
         self.book_content.bind("<ButtonRelease-1>", self.on_content_release)
 
+        # Developer performance overlay, placed over the top right of the reader
+        self.perf_overlay = tk.Label(middle_frame, justify=tk.LEFT, anchor=tk.NW, font=("Courier", 9),
+                                     bg="#000000", fg="#39FF14", padx=6, pady=4)
+        self.master.bind("<F12>", lambda event: self.toggle_perf_overlay())
+        self.master.bind("<Shift-F12>", lambda event: self.dump_perf_report())
+
         # Right panel (chat interface)
         right_frame = ttk.Frame(self.paned_window)
         self.paned_window.add(right_frame, weight=1)
@@ -241,6 +292,11 @@ class ModernReadingCompanionGUI:
         )
         self.chat_history.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
         self.chat_history.config(state=tk.DISABLED)
+        self.loading_older_messages = False
+        self.chat_page_size = 20
+        self.chat_backlog = []
+        self.chat_stream_active = False
+        self.chat_history.configure(yscrollcommand=self.on_chat_scroll)
 
         self.chat_history.tag_configure("system", foreground=self.theme_manager.get_current_theme()["system_msg"])
         self.chat_history.tag_configure("assistant", foreground=self.theme_manager.get_current_theme()["assistant_msg"])
@@ -408,17 +464,92 @@ class ModernReadingCompanionGUI:
         ]
         file_path = filedialog.askopenfilename(filetypes=file_types)
         if file_path:
+            self.open_book(file_path)
+
+    def open_book(self, file_path):
+        # Show the saved chapter straight from the workspace, then parse the whole
+        # book off the Tk thread; totals and the progress bar fill in when it lands.
+        self.book_load_token += 1
+        token = self.book_load_token
+        if self.companion:
+            # Stops its background summaries and character updates
+            self.companion.close()
+        self.companion = None
+        self.chat_backlog = []
+        self.book_name = os.path.basename(file_path)
+        snapshot = self.workspace.load_resume_snapshot(file_path)
+        if snapshot:
+            self.show_resume_snapshot(file_path, snapshot)
+        self.add_to_chat_history(f"Opening {self.book_name}...\n", "system")
+
+        result = {}
+        def load():
             try:
-                self.companion = ReadingCompanion(file_path, self.api_key)
-                self.book_name = os.path.basename(file_path)
-                self.add_to_chat_history(f"File loaded: {self.book_name}\n", "system")
-                self.load_conversation()
-                self.update_book_content()
-                self.update_chapter_info()
-                self.update_system_prompt_display()
-                self.load_additional_context()
-            except ValueError as e:
-                self.add_to_chat_history(f"Error loading file: {str(e)}\n", "system")
+                companion = ReadingCompanion(file_path, self.api_key, self.usage_meter, self.request_scheduler)
+                companion.attach_workspace(self.workspace)
+                result["companion"] = companion
+            except Exception as e:
+                result["error"] = e
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        self.master.after(50, self.poll_book_load, thread, result, token, snapshot)
+
+    def show_resume_snapshot(self, file_path, snapshot):
+        chapter = snapshot["chapter"]
+        self.display_chapter_text(snapshot["chapters"][chapter], file_path.lower().endswith('.pdf'))
+        self.book_content.see(self.word_to_text_index(snapshot["word"]))
+        total_chapters = snapshot["total_chapters"] or "?"
+        self.chapter_info.config(text=f"Chapter: {chapter + 1}/{total_chapters}")
+        if snapshot["total_words"]:
+            self.progress_bar["value"] = snapshot["absolute_word"] / snapshot["total_words"] * 100
+
+    def poll_book_load(self, thread, result, token, snapshot):
+        if token != self.book_load_token:
+            # A newer book was selected meanwhile; close this one once it has loaded
+            if thread.is_alive():
+                self.master.after(50, self.poll_book_load, thread, result, token, snapshot)
+            elif "companion" in result:
+                result["companion"].close()
+            return
+        if thread.is_alive():
+            self.master.after(50, self.poll_book_load, thread, result, token, snapshot)
+            return
+        if "error" in result:
+            self.add_to_chat_history(f"Error loading file: {str(result['error'])}\n", "system")
+            return
+        self.companion = result["companion"]
+        self.add_to_chat_history(f"File loaded: {self.book_name}\n", "system")
+        self.load_conversation()
+        self.restore_book_state()
+        chapter = self.companion.document_reader.current_chapter
+        if snapshot and snapshot["chapter"] == chapter and snapshot["chapters"][chapter] == self.companion.get_current_chapter_text():
+            # Already on screen; keep the reader's scroll position
+            self.apply_chapter_highlights()
+            self.update_progress_bar()
+        else:
+            self.update_book_content()
+            self.book_content.see(self.word_to_text_index(self.companion.get_current_word_index()))
+        self.update_chapter_info()
+        self.update_system_prompt_display()
+        self.load_additional_context()
+        self.companion.save_state()
+
+    def restore_book_state(self):
+        state = self.companion.restore_state()
+        self.highlights = state["highlights"] if state else []
+        self.notepad_text.delete(1.0, tk.END)
+        if state:
+            self.notepad_text.insert(tk.END, state["notepad"])
+            self.add_to_chat_history(f"Resumed at {self.companion.get_navigation_unit()} {self.companion.get_current_chapter()}, "
+                                     f"Word Index: {self.companion.get_current_word_index()}\n", "system")
+        report = self.companion.reingest_report
+        if report and report["first_change"] is not None:
+            dropped = f", {report['highlights_dropped']} highlights could not be placed" if report["highlights_dropped"] else ""
+            self.add_to_chat_history(f"The file changed since it was last opened: {len(report['changed_chapters'])} "
+                                     f"chapters differ from chapter {report['first_change'] + 1} on{dropped}.\n", "system")
+        self.update_notes_tab()
+        self.refresh_summary()
+        self.start_catch_up()
 
     def set_ai_persona(self):
         if self.companion:
@@ -453,9 +584,8 @@ class ModernReadingCompanionGUI:
             self.add_to_chat_history("Please select a book first.\n", "system")
 
     def change_font_size(self, new_size):
-        current_theme = self.theme_manager.get_current_theme()
         self.theme_manager.update_theme_property(self.theme_manager.current_theme, "font_size_reader", new_size)
-        self.book_content.config(font=(current_theme["font_reader"], new_size))
+        self.apply_resolved_styles()
 
     def on_progress_bar_click(self, event):
         if self.companion:
@@ -476,20 +606,44 @@ class ModernReadingCompanionGUI:
             
     def update_book_content(self):
         if self.companion:
-            self.book_content.config(state=tk.NORMAL)
-            self.book_content.delete(1.0, tk.END)
-            
+            started = time.perf_counter()
             raw_text = self.companion.get_current_chapter_text()
-            
-            # Check if the current file is an EPUB
-            if self.companion.book_path.lower().endswith('.epub'):
-                formatted_text = raw_text  # No additional formatting for EPUBs
-            else:
-                formatted_text = self.format_text(raw_text)
-            
-            self.book_content.insert(tk.END, formatted_text)
-            self.book_content.config(state=tk.NORMAL)  # Keep it normal for click functionality
+            self.display_chapter_text(raw_text, self.companion.document_reader.is_pdf)
+            self.apply_chapter_highlights()
             self.update_progress_bar()
+            self.watchdog.record_render(time.perf_counter() - started)
+
+    def display_chapter_text(self, raw_text, is_pdf):
+        self.book_content.config(state=tk.NORMAL)
+        self.book_content.delete(1.0, tk.END)
+
+        # Only PDF pages lack paragraph structure; other formats keep their own
+        if is_pdf:
+            formatted_text = self.format_text(raw_text)
+        else:
+            formatted_text = raw_text
+
+        self.book_content.insert(tk.END, formatted_text)
+        self.book_content.config(state=tk.NORMAL)  # Keep it normal for click functionality
+        self.text_layout = TextLayout(formatted_text)
+        self.render_word_offsets = self.text_layout.word_starts
+
+    def text_index_to_word(self, index):
+        offset = self.book_content.count("1.0", index, "chars")
+        offset = offset[0] if offset else 0
+        return max(bisect.bisect_right(self.render_word_offsets, offset) - 1, 0)
+
+    def word_to_text_index(self, word_index):
+        return self.text_layout.word_index(word_index)
+
+    def apply_chapter_highlights(self):
+        # Word anchors become Text indices in Python from the render layout;
+        # Tk then gets one tag_add per color however many highlights there are
+        chapter = self.companion.document_reader.current_chapter
+        for color, indices in self.text_layout.highlight_ranges(self.highlights, chapter).items():
+            tag = f"highlight_{color}"
+            self.book_content.tag_config(tag, background=color)
+            self.book_content.tag_add(tag, *indices)
 
     def format_text(self, text):
         # Remove extra whitespace
@@ -512,7 +666,52 @@ class ModernReadingCompanionGUI:
             current_chapter = self.companion.get_current_chapter()
             total_chapters = self.companion.get_total_chapters()
             navigation_unit = self.companion.get_navigation_unit()
-            self.chapter_info.config(text=f"{navigation_unit}: {current_chapter}/{total_chapters}")
+            status = f"  ({self.catch_up_status})" if self.catch_up_status else ""
+            self.chapter_info.config(text=f"{navigation_unit}: {current_chapter}/{total_chapters}{status}")
+
+    def start_catch_up(self):
+        # Summarizes chapters the reader moved past on a worker; progress shows
+        # next to the chapter counter
+        companion = self.companion
+        if not companion or self.catch_up_active or not companion.pending_catch_up:
+            return
+        self.catch_up_active = True
+        progress = {"done": 0, "total": 0}
+        result = {}
+
+        def on_progress(done, total):
+            progress["done"], progress["total"] = done, total
+
+        def run():
+            try:
+                result["updated"] = companion.catch_up(on_progress)
+            except Exception as e:
+                result["error"] = e
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.poll_catch_up(thread, companion, progress, result)
+
+    def poll_catch_up(self, thread, companion, progress, result):
+        if companion is not self.companion:
+            self.catch_up_active = False
+            self.catch_up_status = ""
+            return
+        if thread.is_alive():
+            if progress["total"]:
+                self.catch_up_status = f"catching up {progress['done']}/{progress['total']}"
+                self.update_chapter_info()
+            self.master.after(100, self.poll_catch_up, thread, companion, progress, result)
+            return
+        self.catch_up_active = False
+        self.catch_up_status = ""
+        self.update_chapter_info()
+        if "error" in result:
+            self.add_to_chat_history(f"Could not summarize the skipped chapters: {str(result['error'])}\n", "system")
+        elif result.get("updated"):
+            companion.save_state()
+            self.refresh_summary()
+        # The reader may have moved on again while this ran
+        self.start_catch_up()
 
     def update_progress_bar(self):
         if self.companion:
@@ -531,9 +730,8 @@ class ModernReadingCompanionGUI:
     def on_content_click(self, event):
         if self.selection_mode and self.companion:
             index = self.book_content.index(f"@{event.x},{event.y}")
-            line, char = map(int, index.split("."))
-            
-            word_index = self.companion.document_reader.get_word_index_from_coordinates(line, char)
+            chapter_start = self.companion.current_word - self.companion.get_current_word_index()
+            word_index = chapter_start + self.text_index_to_word(index)
             
             if self.companion.update_progress(word_index):
                 current_chapter = self.companion.get_current_chapter()
@@ -558,14 +756,14 @@ class ModernReadingCompanionGUI:
     def on_content_click(self, event):
         if self.selection_mode and self.companion:
             index = self.book_content.index(f"@{event.x},{event.y}")
-            line, char = map(int, index.split("."))
-            
-            word_index = self.companion.document_reader.get_word_index_from_coordinates(line, char)
+            chapter_start = self.companion.current_word - self.companion.get_current_word_index()
+            word_index = chapter_start + self.text_index_to_word(index)
             
             if self.companion.update_progress(word_index):
                 current_chapter = self.companion.get_current_chapter()
                 current_word = self.companion.get_current_word_index()
                 self.add_to_chat_history(f"Assistant context updated to Chapter {current_chapter}, Word Index: {current_word}\n", "system")
+                self.start_catch_up()
                 
                 # Highlight the selected word (keep existing code)
                 
@@ -584,6 +782,7 @@ class ModernReadingCompanionGUI:
             self.update_progress_bar()
             navigation_unit = self.companion.get_navigation_unit()
             self.add_to_chat_history(f"Moved to {navigation_unit} {self.companion.get_current_chapter()}\n", "system")
+            self.start_catch_up()
 
     def previous_chapter(self):
         if self.companion and self.companion.move_to_previous_chapter():
@@ -606,6 +805,7 @@ class ModernReadingCompanionGUI:
                         self.update_chapter_info()
                         self.update_progress_bar()
                         self.add_to_chat_history(f"Moved to Chapter {self.companion.get_current_chapter()}\n", "system")
+                        self.start_catch_up()
                     else:
                         self.add_to_chat_history("Failed to move to the selected chapter.\n", "system")
         else:
@@ -614,13 +814,54 @@ class ModernReadingCompanionGUI:
     def send_message(self):
         if self.companion:
             message = self.chat_entry.get()
-            self.add_to_chat_history(f"You: {message}\n", "user")
-            response = self.companion.chat(message)
-            self.add_to_chat_history(f"{response}\n", "assistant")
+            if not message.strip() or self.chat_stream_active:
+                return
             self.chat_entry.delete(0, tk.END)
+            self.add_to_chat_history(f"You: {message}\n", "user")
+            self.chat_stream_active = True
+            self.chat_button.config(state=tk.DISABLED)
+            # The model call runs on a worker; its text arrives through the queue
+            chunks = queue.Queue()
+            companion = self.companion
+            def run():
+                companion.stream_chat(message, chunks.put)
+                chunks.put(None)
+            threading.Thread(target=run, daemon=True).start()
+            self.master.after(30, self.drain_chat_stream, chunks)
         else:
             self.add_to_chat_history("Please select a book first.\n", "system")
 
+    def drain_chat_stream(self, chunks):
+        parts = []
+        done = False
+        try:
+            while True:
+                item = chunks.get_nowait()
+                if item is None:
+                    done = True
+                    break
+                parts.append(item)
+        except queue.Empty:
+            pass
+        if done:
+            parts.append("\n")
+        if parts:
+            self.append_chat_text("".join(parts), "assistant")
+        if done:
+            self.chat_stream_active = False
+            self.chat_button.config(state=tk.NORMAL)
+        else:
+            self.master.after(30, self.drain_chat_stream, chunks)
+
+    def append_chat_text(self, text, message_type):
+        # Appends at the end only; follows the output unless the user scrolled up
+        at_bottom = self.chat_history.yview()[1] >= 1.0
+        self.chat_history.config(state=tk.NORMAL)
+        self.chat_history.insert(tk.END, text, message_type)
+        self.chat_history.config(state=tk.DISABLED)
+        if at_bottom:
+            self.chat_history.see(tk.END)
+
     def add_to_chat_history(self, message, message_type):
         self.chat_history.config(state=tk.NORMAL)
         self.chat_history.insert(tk.END, message, message_type)
@@ -638,47 +879,55 @@ class ModernReadingCompanionGUI:
         if self.companion:
             if self.companion.load_conversation(self.conversation_directory):
                 self.add_to_chat_history("Previous conversation loaded.\n", "system")
-                for message in self.companion.conversation_history:
-                    self.add_to_chat_history(f"You: {message['user']}\n", "user")
-                    self.add_to_chat_history(f"{message['ai']}\n", "assistant")
+                history = self.companion.conversation_history
+                # Only the latest page is rendered; the rest waits for a scroll to the top
+                self.chat_backlog = history[:-self.chat_page_size]
+                self.render_chat_messages(history[-self.chat_page_size:])
             else:
                 self.add_to_chat_history("No previous conversation found for this book.\n", "system")
         else:
             self.add_to_chat_history("Please select a book first.\n", "system")
 
+    def render_chat_messages(self, messages, at_start=False):
+        segments = []
+        for message in messages:
+            segments += [f"You: {message['user']}\n", "user", f"{message['ai']}\n", "assistant"]
+        if not segments:
+            return 0
+        # One insert call for the whole page instead of one round-trip per message
+        self.chat_history.config(state=tk.NORMAL)
+        self.chat_history.insert("1.0" if at_start else tk.END, *segments)
+        self.chat_history.config(state=tk.DISABLED)
+        if not at_start:
+            self.chat_history.see(tk.END)
+        return sum(len(text) for text in segments[::2])
+
+    def has_older_chat(self):
+        return bool(self.chat_backlog) or (self.companion is not None and self.companion.has_older_messages())
+
+    def on_chat_scroll(self, first, last):
+        self.chat_history.vbar.set(first, last)
+        if float(first) <= 0.0 and not self.loading_older_messages and self.has_older_chat():
+            self.loading_older_messages = True
+            self.master.after_idle(self.load_older_messages)
+
+    def load_older_messages(self):
+        try:
+            if not self.chat_backlog and self.companion:
+                self.chat_backlog = self.companion.load_older_messages()
+            page = self.chat_backlog[-self.chat_page_size:]
+            del self.chat_backlog[-self.chat_page_size:]
+            inserted = self.render_chat_messages(page, at_start=True)
+            if inserted:
+                # Keep the message that was at the top in view
+                self.chat_history.yview(f"1.0 + {inserted} chars")
+        finally:
+            self.loading_older_messages = False
+
     def apply_theme(self, theme_name):
         self.theme_manager.set_current_theme(theme_name)
-        self.configure_styles()
-        self.update_widgets_theme()
+        self.apply_resolved_styles()
 
-    def update_widgets_theme(self):
-        theme = self.theme_manager.get_current_theme()
-        self.master.configure(bg=theme["bg"])
-        self.book_content.config(bg=theme["reader_bg"], fg=theme["reader_fg"], 
-                                 font=(theme["font_reader"], theme["font_size_reader"]))
-        self.chat_history.config(bg=theme["chat_bg"], fg=theme["chat_fg"], 
-                                 font=(theme["font_main"], theme["font_size_main"]))
-        self.chat_history.tag_configure("system", foreground=theme["system_msg"])
-        self.chat_history.tag_configure("assistant", foreground=theme["assistant_msg"])
-        self.chat_history.tag_configure("user", foreground=theme["user_msg"])
-        self.chat_entry.config(font=(theme["font_main"], theme["font_size_main"]))
-        self.chapter_info.config(font=(theme["font_main"], theme["font_size_main"]))
-        self.system_prompt_text.config(bg=theme["bg"], fg=theme["fg"], 
-                                       font=(theme["font_main"], theme["font_size_main"]))
-        for context_text in self.additional_context_texts:
-            context_text.config(bg=theme["bg"], fg=theme["fg"], 
-                                font=(theme["font_main"], theme["font_size_main"]))
-        self.configure_menu_colors()
-        self.configure_styles()
-    
-    def configure_menu_colors(self):
-        theme = self.theme_manager.get_current_theme()
-        self.master.option_add('*Menu.background', theme["menu_bg"])
-        self.master.option_add('*Menu.foreground', theme["menu_fg"])
-        self.master.option_add('*Menu.selectColor', theme["menu_active_bg"])
-        self.master.option_add('*Menu.activeBackground', theme["menu_active_bg"])
-        self.master.option_add('*Menu.activeForeground', theme["menu_active_fg"])
-    
     def set_highlight_color(self, color):
         self.current_highlight_color = color
 
@@ -690,9 +939,12 @@ class ModernReadingCompanionGUI:
                 self.book_content.tag_add(f"highlight_{self.current_highlight_color}", start, end)
                 self.book_content.tag_config(f"highlight_{self.current_highlight_color}", background=self.current_highlight_color)
                 
-                # Store the highlight
+                # Store the highlight against word anchors so it survives re-rendering
                 highlighted_text = self.book_content.get(start, end)
-                self.highlights.append((start, end, self.current_highlight_color, highlighted_text))
+                if self.companion:
+                    self.highlights.append(self.companion.add_highlight(
+                        self.text_index_to_word(start), self.text_index_to_word(f"{end} - 1 chars"),
+                        self.current_highlight_color, highlighted_text))
                 
                 # Update the Notes tab
                 self.update_notes_tab()
@@ -734,15 +986,27 @@ class ModernReadingCompanionGUI:
                   self.theme_manager.get_current_theme()["font_size_main"])
         )
         self.notepad_text.pack(fill=tk.BOTH, expand=True)
+        self.notepad_text.bind("<KeyRelease>", self.on_notepad_changed)
 
         # Export button
         export_button = ttk.Button(notes_frame, text="Export Notes", command=self.export_notes, style="Custom.TButton")
         export_button.pack(pady=10)
 
+    def on_notepad_changed(self, event):
+        if self.notes_save_job is not None:
+            self.master.after_cancel(self.notes_save_job)
+        self.notes_save_job = self.master.after(1000, self.save_notes)
+
+    def save_notes(self):
+        self.notes_save_job = None
+        if self.companion:
+            self.companion.save_notes(self.notepad_text.get(1.0, tk.END).rstrip("\n"))
+
     def update_notes_tab(self):
         self.highlights_text.config(state=tk.NORMAL)
         self.highlights_text.delete(1.0, tk.END)
-        for start, end, color, text in self.highlights:
+        for highlight in self.highlights:
+            color, text = highlight["color"], highlight["text"]
             self.highlights_text.insert(tk.END, f"[{color}] {text}\n\n")
             last_insert = self.highlights_text.index(tk.INSERT)
             self.highlights_text.tag_add(f"highlight_{color}", f"{last_insert} linestart", f"{last_insert} lineend")
@@ -754,8 +1018,8 @@ class ModernReadingCompanionGUI:
         if file_path:
             with open(file_path, "w") as file:
                 file.write("Highlights:\n\n")
-                for _, _, color, text in self.highlights:
-                    file.write(f"[{color}] {text}\n\n")
+                for highlight in self.highlights:
+                    file.write(f"[{highlight['color']}] {highlight['text']}\n\n")
                 file.write("\nNotes:\n\n")
                 file.write(self.notepad_text.get(1.0, tk.END))
             self.add_to_chat_history(f"Notes exported to {file_path}\n", "system")
@@ -804,6 +1068,32 @@ class ModernReadingCompanionGUI:
         else:
             self.add_to_chat_history("Please select a book first.\n", "system")
 
+    def toggle_perf_overlay(self):
+        self.perf_overlay_visible = not self.perf_overlay_visible
+        if self.perf_overlay_visible:
+            self.perf_overlay.place(in_=self.book_content, relx=1.0, rely=0.0, anchor=tk.NE, x=-20, y=5)
+            self.refresh_perf_overlay()
+        else:
+            if self.perf_overlay_job is not None:
+                self.master.after_cancel(self.perf_overlay_job)
+                self.perf_overlay_job = None
+            self.perf_overlay.place_forget()
+
+    def refresh_perf_overlay(self):
+        self.perf_overlay_job = None
+        if not self.perf_overlay_visible:
+            return
+        self.perf_overlay.config(text="\n".join(self.watchdog.summary_lines()))
+        self.perf_overlay_job = self.master.after(self.perf_overlay_interval, self.refresh_perf_overlay)
+
+    def dump_perf_report(self):
+        path = f"ui_stalls_{time.strftime('%Y%m%d-%H%M%S')}.json"
+        try:
+            self.watchdog.dump(path)
+            self.add_to_chat_history(f"Performance report saved to {os.path.abspath(path)}\n", "system")
+        except OSError as e:
+            self.add_to_chat_history(f"Could not save performance report: {str(e)}\n", "system")
+
     def on_save_load_select(self, event):
         selection = event.widget.get()
         if selection == "Save Conversation":
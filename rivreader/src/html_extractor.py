@@ -0,0 +1,135 @@
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Tuple, Union
+
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'body', 'caption', 'dd', 'div', 'dl', 'dt',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header',
+    'hr', 'html', 'li', 'main', 'ol', 'p', 'pre', 'section', 'table', 'tbody', 'td', 'tfoot',
+    'th', 'thead', 'tr', 'ul'
+}
+SKIP_TAGS = {'script', 'style', 'nav', 'noscript', 'template', 'svg', 'math'}
+# Elements that belong in <head>; any other start tag ends it even if </head> is missing
+HEAD_TAGS = {'head', 'title', 'base', 'link', 'meta', 'style', 'script', 'noscript', 'template', 'html'}
+HEADING_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+PARAGRAPH_SEPARATOR = "\n\n"
+
+_WHITESPACE = re.compile(r'\s+')
+_CHARSET = re.compile(rb'''(?:encoding|charset)\s*=\s*["']?([A-Za-z0-9_.:-]+)''', re.IGNORECASE)
+
+
+class HTMLTextExtractor(HTMLParser):
+    # Single pass over the markup. Each block element closes the paragraph being
+    # collected, so paragraph boundaries and offsets come straight from the tags
+    # instead of being guessed back from the flattened text.
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Dict[str, Union[str, int, None]]] = []
+        self._lines: List[List[str]] = [[]]
+        self._skip_depth = 0
+        self._in_head = False
+        self._heading = None
+        self._offset = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'head':
+            self._in_head = True
+        elif tag not in HEAD_TAGS:
+            self._in_head = False
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        if tag == 'br':
+            self._lines.append([])
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            if tag in HEADING_TAGS:
+                self._heading = HEADING_TAGS[tag]
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            return
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == 'head':
+            self._in_head = False
+        if tag in SKIP_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+            return
+        if self._skip_depth:
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth and not self._in_head:
+            self._lines[-1].append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def _flush(self):
+        lines = (_WHITESPACE.sub(' ', ''.join(parts)).strip() for parts in self._lines)
+        text = '\n'.join(line for line in lines if line)
+        self._lines = [[]]
+        heading = self._heading
+        self._heading = None
+        if not text:
+            return
+        if self.blocks:
+            self._offset += len(PARAGRAPH_SEPARATOR)
+        start = self._offset
+        self._offset += len(text)
+        self.blocks.append({'text': text, 'start': start, 'end': self._offset, 'heading': heading})
+
+
+def _sniff_encoding(head: bytes) -> str:
+    match = _CHARSET.search(head[:1024])
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode('ascii')).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+def decode_markup(markup: bytes) -> str:
+    return markup.decode(_sniff_encoding(markup), errors='replace')
+
+
+def extract_blocks(markup: Union[str, bytes]) -> List[Dict[str, Union[str, int, None]]]:
+    if isinstance(markup, bytes):
+        markup = decode_markup(markup)
+    parser = HTMLTextExtractor()
+    parser.feed(markup)
+    parser.close()
+    return parser.blocks
+
+
+def extract_file_blocks(file_path: str, chunk_size: int = 1 << 16) -> List[Dict[str, Union[str, int, None]]]:
+    with open(file_path, 'rb') as file:
+        head = file.read(chunk_size)
+        decoder = codecs.getincrementaldecoder(_sniff_encoding(head))(errors='replace')
+        parser = HTMLTextExtractor()
+        chunk = head
+        while chunk:
+            parser.feed(decoder.decode(chunk))
+            chunk = file.read(chunk_size)
+        parser.feed(decoder.decode(b'', final=True))
+        parser.close()
+    return parser.blocks
+
+
+def blocks_to_text(blocks) -> str:
+    return PARAGRAPH_SEPARATOR.join(block['text'] for block in blocks)
+
+
+def extract_text(markup: Union[str, bytes]) -> Tuple[str, List[Dict[str, Union[str, int, None]]]]:
+    blocks = extract_blocks(markup)
+    return blocks_to_text(blocks), blocks
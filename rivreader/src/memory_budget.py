@@ -0,0 +1,170 @@
+import heapq
+import itertools
+import sys
+import threading
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+# Default cap for everything the accountant tracks; leaves most of an 8 GB
+# host to the interpreter, sessions and the OS
+DEFAULT_MEMORY_CAP = 2 * 1024 ** 3
+
+
+def chapters_size(chapters) -> int:
+    # Approximate bytes held by parsed chapters: the text, the word sequence
+    # and the word strings themselves
+    size = sys.getsizeof(chapters)
+    for chapter in chapters:
+        words = chapter['words']
+        size += sys.getsizeof(chapter) + sys.getsizeof(chapter['text']) + sys.getsizeof(words)
+        size += sum(map(sys.getsizeof, words))
+    return size
+
+
+class _Entry:
+    __slots__ = ("size", "cost", "priority", "pinned", "seq")
+
+    def __init__(self, size: int, cost: float, seq: int):
+        self.size = size
+        self.cost = cost
+        self.priority = 0.0
+        self.pinned = 0
+        self.seq = seq
+
+
+class _Cache:
+    __slots__ = ("evict", "weight", "bytes", "entries", "hits", "evictions")
+
+    def __init__(self, evict: Callable[[Hashable], None], weight: float):
+        self.evict = evict
+        self.weight = weight
+        self.bytes = 0
+        self.entries = 0
+        self.hits = 0
+        self.evictions = 0
+
+
+class MemoryAccountant:
+    # One byte budget shared by every registered cache. Caches charge() each
+    # entry with its approximate size and the cost of rebuilding it, touch() it
+    # on a hit and pin() it while it is in use. When the total goes over
+    # cap_bytes, unpinned entries are evicted in GreedyDual-Size order: an
+    # entry's priority is the clock at its last use plus weight * cost / size,
+    # and each eviction advances the clock to the victim's priority. Cheap,
+    # large and long-unused entries go first. The cache's evict callback runs
+    # outside the accountant's lock.
+    def __init__(self, cap_bytes: int = DEFAULT_MEMORY_CAP):
+        self.cap_bytes = cap_bytes
+        self._caches: Dict[str, _Cache] = {}
+        self._entries: Dict[Tuple[str, Hashable], _Entry] = {}
+        self._heap = []
+        self._clock = 0.0
+        self._used = 0
+        self._pinned_bytes = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, evict: Callable[[Hashable], None], weight: float = 1.0):
+        with self._lock:
+            self._caches[name] = _Cache(evict, weight)
+
+    def charge(self, name: str, key: Hashable, size: int, cost: float = 1.0, pins: int = 0):
+        with self._lock:
+            self._remove((name, key))
+            entry = _Entry(max(size, 1), cost, next(self._seq))
+            self._entries[(name, key)] = entry
+            cache = self._caches[name]
+            cache.bytes += entry.size
+            cache.entries += 1
+            self._used += entry.size
+            if pins:
+                entry.pinned = pins
+                self._pinned_bytes += entry.size
+            else:
+                self._push(name, key, entry)
+            victims = self._select_victims()
+        self._evict(victims)
+
+    def touch(self, name: str, key: Hashable):
+        with self._lock:
+            entry = self._entries.get((name, key))
+            if entry is None:
+                return
+            self._caches[name].hits += 1
+            if not entry.pinned:
+                entry.seq = next(self._seq)
+                self._push(name, key, entry)
+
+    def pin(self, name: str, key: Hashable):
+        with self._lock:
+            entry = self._entries.get((name, key))
+            if entry is None:
+                return
+            self._caches[name].hits += 1
+            if not entry.pinned:
+                self._pinned_bytes += entry.size
+                entry.seq = next(self._seq)
+            entry.pinned += 1
+
+    def unpin(self, name: str, key: Hashable):
+        with self._lock:
+            entry = self._entries.get((name, key))
+            if entry is None or not entry.pinned:
+                return
+            entry.pinned -= 1
+            if not entry.pinned:
+                self._pinned_bytes -= entry.size
+                self._push(name, key, entry)
+            victims = self._select_victims()
+        self._evict(victims)
+
+    def discard(self, name: str, key: Hashable):
+        # The cache dropped the entry itself
+        with self._lock:
+            self._remove((name, key))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "cap_bytes": self.cap_bytes,
+                "used_bytes": self._used,
+                "pinned_bytes": self._pinned_bytes,
+                "caches": {name: {"entries": c.entries, "bytes": c.bytes, "weight": c.weight,
+                                  "hits": c.hits, "evictions": c.evictions}
+                           for name, c in self._caches.items()},
+            }
+
+    def _push(self, name: str, key: Hashable, entry: _Entry):
+        entry.priority = self._clock + self._caches[name].weight * entry.cost / entry.size
+        heapq.heappush(self._heap, (entry.priority, entry.seq, name, key))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(e.priority, e.seq, n, k) for (n, k), e in self._entries.items() if not e.pinned]
+            heapq.heapify(self._heap)
+
+    def _remove(self, entry_key) -> Optional[_Entry]:
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            cache = self._caches[entry_key[0]]
+            cache.bytes -= entry.size
+            cache.entries -= 1
+            self._used -= entry.size
+            if entry.pinned:
+                self._pinned_bytes -= entry.size
+        return entry
+
+    def _select_victims(self):
+        victims = []
+        while self._used > self.cap_bytes and self._heap:
+            priority, seq, name, key = heapq.heappop(self._heap)
+            entry = self._entries.get((name, key))
+            # Heap items left behind by touch, pin or removal are skipped
+            if entry is None or entry.pinned or entry.seq != seq:
+                continue
+            self._clock = priority
+            self._remove((name, key))
+            self._caches[name].evictions += 1
+            victims.append((self._caches[name].evict, key))
+        return victims
+
+    def _evict(self, victims):
+        for evict, key in victims:
+            evict(key)
@@ -50,6 +50,17 @@ Character Name: {character_name}
 Context: {character_context}
 """
 
+# Character Sheet Update Prompt (folding newly read passages into an existing sheet)
+CHARACTER_UPDATE_PROMPT = """
+You are an expert on character analysis. Below is the character sheet for {character_name} as it stood earlier in the book, followed by the passages mentioning them that the reader has read since. Update the sheet: keep what still holds, revise what the new passages change, and add new traits, relationships and developments. Use only what the sheet and the passages say; do not speculate about what comes later. Return only the updated sheet.
+
+Current Sheet:
+{previous_sheet}
+
+New Passages:
+{new_passages}
+"""
+
 # Literary Analysis Prompt
 LITERARY_ANALYSIS_PROMPT = """
 You are a literary critic. Analyze the following text, focusing on themes, symbolism, narrative structure, and writing style. Provide in-depth insights into the author's techniques and the work's literary significance:
@@ -58,6 +69,35 @@ Text to Analyze:
 {text_to_analyze}
 """
 
+# Conversation Digest Prompt
+CONVERSATION_DIGEST_PROMPT = """
+You maintain a compact running digest of a conversation between a reader and their reading companion about a book. Fold the new exchanges into the existing digest.
+
+Keep: questions the reader asked, their interests and opinions, conclusions reached, and anything the companion promised or the reader asked to remember. Drop: pleasantries, repetition, and long quotations. Write in third person, at most 200 words.
+
+Existing Digest:
+{previous_digest}
+
+New Exchanges:
+{exchanges}
+
+Return only the updated digest.
+"""
+
+# Catch-up Prompts (summarizing chapters the reader skipped past, then merging)
+CATCH_UP_SECTION_PROMPT = """
+You are an expert literary analyst. Summarize the following section of a book in at most 200 words. Cover the events, the characters involved and how they change, and any themes that emerge. Summarize only what the text says; do not speculate about what comes later.
+
+Section:
+{section}
+"""
+
+SUMMARY_MERGE_PROMPT = """
+You are an expert literary analyst. The summaries below cover consecutive parts of a book, in reading order. Merge them into one coherent summary of about 250-300 words that keeps the major characters, pivotal plot points and themes, and makes clear how the later parts follow from the earlier ones. Do not add anything that is not in the summaries.
+
+{summaries}
+"""
+
 # Add any other prompts you use in your application here
 
 # Helper function to prepend instructions to a prompt
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import deque
+from typing import Optional
+from .request_scheduler import Superseded
+from .usage_meter import BUDGET_STRETCH
+
+READ_AHEAD_SECONDS = 90
+DEFAULT_SECTION_WORDS = 500
+MIN_SECTION_WORDS = 200
+MAX_SECTION_WORDS = 2000
+IDLE_DELAY = 2.0
+# Sections grow by this factor once the token budget starts running low
+BUDGET_STRETCH_FACTOR = 3
+
+
+class ReadAheadScheduler:
+    # Pre-computes the summary for the section after the summarized position while the
+    # reader is idle. The result is sealed: it is only merged into the running summary
+    # once the reader's position has passed the end of that section, so nothing the
+    # reader has not reached can leak into the context.
+    def __init__(self, context_manager, idle_delay: float = IDLE_DELAY):
+        self.context_manager = context_manager
+        self.idle_delay = idle_delay
+        self._samples = deque(maxlen=8)
+        self._sealed = None
+        self._timer = None
+        self._in_flight = None
+        # Shares the reader state lock: merging writes the summary that position
+        # transitions also touch, and one lock rules out lock-order deadlocks
+        self._lock = context_manager.state.lock
+
+    def words_per_second(self) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < 2:
+            return None
+        # Only the run of samples in the current chapter is comparable
+        chapter = samples[-1][1]
+        samples = [s for s in samples if s[1] == chapter]
+        if len(samples) < 2:
+            return None
+        elapsed = samples[-1][0] - samples[0][0]
+        advanced = samples[-1][2] - samples[0][2]
+        if elapsed <= 0 or advanced <= 0:
+            return None
+        return advanced / elapsed
+
+    def section_words(self) -> int:
+        speed = self.words_per_second()
+        if speed is None:
+            words = DEFAULT_SECTION_WORDS
+        else:
+            words = int(min(max(speed * READ_AHEAD_SECONDS, MIN_SECTION_WORDS), MAX_SECTION_WORDS))
+        if self.context_manager.ai.budget_level() >= BUDGET_STRETCH:
+            words *= BUDGET_STRETCH_FACTOR
+        return words
+
+    def on_position(self, chapter: int, word: int):
+        with self._lock:
+            self._samples.append((time.monotonic(), chapter, word))
+            self.merge_if_passed()
+            self._schedule()
+
+    def merge_if_passed(self) -> bool:
+        cm = self.context_manager
+        with self._lock:
+            sealed = self._sealed
+            if sealed is None:
+                return False
+            if not self._is_current(sealed):
+                self._sealed = None
+                return False
+            if cm.last_update_word < sealed["end_word"]:
+                return False
+            cm.replace_summary(sealed["summary"], sealed["end_word"])
+            self._sealed = None
+            self._schedule()
+            return True
+
+    def wake(self):
+        with self._lock:
+            self._schedule()
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._sealed = None
+
+    def _is_current(self, sealed) -> bool:
+        cm = self.context_manager
+        return (sealed["chapter"] == cm.context_chapter
+                and sealed["start_word"] == cm.summarized_word
+                and sealed["summary_version"] == cm.summary_version)
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.idle_delay, self._prefetch)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _prefetch(self):
+        cm = self.context_manager
+        with self._lock:
+            if cm.catch_up_active or (self._sealed is not None and self._is_current(self._sealed)):
+                return
+            chapter = cm.context_chapter
+            start = cm.summarized_word
+            base_summary = cm.dynamic_summary
+            inputs = (chapter, start, cm.summary_version)
+            # The same section is already being summarized; a request for stale
+            # inputs that is still queued gets superseded by this one
+            if self._in_flight == inputs:
+                return
+            words = cm.document_reader.chapters[chapter]['words']
+            end = min(max(start, cm.last_update_word) + self.section_words(), len(words))
+            if end <= start:
+                return
+            self._in_flight = inputs
+        try:
+            summary = cm.summarize_section(base_summary, ' '.join(words[start:end]),
+                                           supersede_key=("read_ahead", id(self)))
+        except Superseded:
+            summary = None
+        except Exception as e:
+            print(f"Error pre-computing summary: {str(e)}")
+            summary = None
+        with self._lock:
+            if self._in_flight == inputs:
+                self._in_flight = None
+            if summary is None:
+                return
+            sealed = {"chapter": chapter, "start_word": start, "end_word": end,
+                      "summary_version": inputs[2], "summary": summary}
+            if self._is_current(sealed):
+                self._sealed = sealed
+                self.merge_if_passed()
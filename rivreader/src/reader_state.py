@@ -0,0 +1,33 @@
+import threading
+from typing import NamedTuple
+
+
+class Position(NamedTuple):
+    # Immutable; version increases with every transition
+    version: int
+    chapter: int
+    word: int
+    absolute_word: int
+
+
+class ReaderState:
+    # The one owner of the reading position. Every transition happens under
+    # lock, which also guards the context fields derived from the position, so
+    # navigation and background work never see them half-updated. Workers take
+    # a snapshot() when they start and check it is still current (or that the
+    # state they depend on has not moved past it) under lock before writing a
+    # result back; stale results are dropped.
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._position = Position(0, 0, 0, 0)
+
+    def snapshot(self) -> Position:
+        return self._position
+
+    def transition(self, chapter: int, word: int, absolute_word: int) -> Position:
+        with self.lock:
+            self._position = Position(self._position.version + 1, chapter, word, absolute_word)
+            return self._position
+
+    def is_current(self, position: Position) -> bool:
+        return self._position.version == position.version
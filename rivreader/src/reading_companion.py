@@ -1,80 +1,165 @@
-import json
 import os
-from typing import List, Dict
-import importlib
-from .document_reader import DocumentReader
+import time
+import bisect
+from typing import List, Dict, Optional, Iterator, Tuple
+from .ai_client import AIClient
+from .document_reader import DocumentReader, compute_book_hash
 from .context_manager import ContextManager
+from .reader_state import ReaderState
+from .reingest import chapter_fingerprints, reingest
+from .entity_index import EntityIndex
+from .character_tracker import CharacterTracker
+from .conversation_log import ConversationLog, CONVERSATION_PAGE_SIZE
+from .workspace import WorkspaceConversationLog
+from .conversation_memory import ConversationMemory, RECENT_TURNS_TOKEN_CAP
+from .fan_out import fan_out, DEFAULT_MAX_CONCURRENCY
 from .prompts import (
     DEFAULT_READING_COMPANION_PROMPT,
     CHARACTER_ANALYSIS_PROMPT,
     LITERARY_ANALYSIS_PROMPT,
     prepend_copyright_disclaimer
 )
+from .usage_meter import BUDGET_TRIM, SITE_CHAT, SITE_DIGEST, SITE_CHARACTER, SITE_LITERARY
+
+ANALYSIS_TIMEOUT = 60.0
+
 
 class ReadingCompanion:
-    def __init__(self, file_path: str, api_key: str):
-        self.document_reader = DocumentReader(file_path)
-        self.context_manager = ContextManager(self.document_reader, api_key)
-        self.api_key = api_key
-        self.book_path = file_path
-        self.conversation_history: List[Dict[str, str]] = []
-        self.anthropic_module = None
-        self.client = None
-        self.ai_name = "Assistant"
-        self.system_prompt = DEFAULT_READING_COMPANION_PROMPT
-        self.total_words = sum(chapter['word_count'] for chapter in self.document_reader.chapters)
-        self.current_word = 0
-        self._init_client()
-    
-    def _init_client(self):
-        if self.client is None:
-            try:
-                if self.anthropic_module is None:
-                    self.anthropic_module = importlib.import_module('anthropic')
-                self.client = self.anthropic_module.Anthropic(api_key=self.api_key)
-            except ImportError:
-                print("Error: Unable to import anthropic module. Please ensure it's installed.")
-            except Exception as e:
-                print(f"Error initializing Anthropic client: {str(e)}")
+    def __init__(self, file_path: str, api_key: str, usage_meter=None, request_scheduler=None, model_client=None,
+                 book_store=None):
+        # With a book_store the parsed chapters are shared with every other
+        # session reading the same book; call close() to release them
+        self.book_store = book_store
+        self.parsed_book = book_store.acquire(file_path) if book_store is not None else None
+        try:
+            if self.parsed_book is not None:
+                self.document_reader = self.parsed_book.reader(file_path)
+                self.entity_index = self.parsed_book.entity_index
+            else:
+                self.document_reader = DocumentReader(file_path)
+                self.entity_index = EntityIndex(self.document_reader.chapters)
+            self.api_key = api_key
+            self.book_path = file_path
+            self.book_name = os.path.basename(file_path)
+            self.ai = AIClient(api_key, usage_meter, request_scheduler, model_client)
+            self.state = ReaderState()
+            self.context_manager = ContextManager(self.document_reader, api_key, self.ai, self.book_name, self.state)
+            self.characters = CharacterTracker(self.entity_index, self.ai, self.book_name, self.state)
+            self.conversation_history: List[Dict[str, str]] = []
+            self.conversation_log = None
+            self.conversation_cursor = 0
+            self.workspace = None
+            self.book_hash = None
+            self.resume_snapshot_chapter = None
+            # Summary checkpoints as last written to the workspace
+            self.saved_checkpoints = {0: ""}
+            # What was carried over from an earlier version of the file, if anything
+            self.reingest_report = None
+            self.conversation_memory = ConversationMemory(self._fold_conversation, on_digest_updated=self._autosave_settings)
+            self.ai_name = "Assistant"
+            self.system_prompt = DEFAULT_READING_COMPANION_PROMPT
+            self.total_words = sum(chapter['word_count'] for chapter in self.document_reader.chapters)
+            # Absolute index of each chapter's first word
+            self.chapter_offsets = []
+            offset = 0
+            for chapter in self.document_reader.chapters:
+                self.chapter_offsets.append(offset)
+                offset += chapter['word_count']
+            self.current_word = 0
+        except Exception:
+            # The caller gets no companion to close(), so give the book back here
+            if self.parsed_book is not None:
+                book_store.release(self.parsed_book)
+            raise
+
+    @property
+    def pending_catch_up(self) -> List[Tuple[int, int]]:
+        # Sections moved past without being summarized, waiting for catch_up()
+        return self.context_manager.pending_catch_up
+
+    @pending_catch_up.setter
+    def pending_catch_up(self, sections: List[Tuple[int, int]]):
+        self.context_manager.pending_catch_up = sections
+
+    def _chat_messages(self, context, message):
+        return [
+            {"role": "user", "content": context},
+            {"role": "assistant", "content": f"As {self.ai_name}, I understand. I'm ready to assist with the book."},
+            {"role": "user", "content": message}
+        ]
 
     def _call_ai_model(self, context, message):
         try:
-            response = self.client.messages.create(
+            response = self.ai.create(
+                SITE_CHAT, self.book_name,
                 model="claude-3-sonnet-20240229",
                 max_tokens=1000,
                 temperature=0.7,
                 system=self.system_prompt,
-                messages=[
-                    {"role": "user", "content": context},
-                    {"role": "assistant", "content": f"As {self.ai_name}, I understand. I'm ready to assist with the book."},
-                    {"role": "user", "content": message}
-                ]
+                messages=self._chat_messages(context, message)
             )
             return f"{self.ai_name}: {response.content[0].text}"
         except Exception as e:
             return f"An error occurred while processing your request: {str(e)}"
 
+    def _stream_ai_model(self, context, message, on_text):
+        prefix = f"{self.ai_name}: "
+        parts = []
+        try:
+            with self.ai.stream(
+                SITE_CHAT, self.book_name,
+                model="claude-3-sonnet-20240229",
+                max_tokens=1000,
+                temperature=0.7,
+                system=self.system_prompt,
+                messages=self._chat_messages(context, message)
+            ) as stream:
+                for text in stream.text_stream:
+                    if not parts:
+                        on_text(prefix)
+                    parts.append(text)
+                    on_text(text)
+            return prefix + ''.join(parts)
+        except Exception as e:
+            error = f"An error occurred while processing your request: {str(e)}"
+            if not parts:
+                on_text(error)
+                return error
+            on_text("\n" + error)
+            return prefix + ''.join(parts) + "\n" + error
+
     def set_additional_context(self, index: int, content: str):
         if 0 <= index < 3:
             self.context_manager.set_additional_context(index, content)
+            self._autosave_settings()
         else:
             raise ValueError("Additional context index must be 0, 1, or 2")
 
     def get_additional_context(self) -> List[str]:
         return self.context_manager.get_additional_context()
 
+    def _transition(self, chapter: int, word: int):
+        # The single way the reading position changes. Reader position, derived
+        # context and the skipped sections queued for catch-up move together
+        # under the state lock (update_context queues the sections moved past),
+        # and the new position gets a fresh version, so a worker holding an
+        # older snapshot can tell its result is stale.
+        with self.state.lock:
+            self.document_reader.current_chapter = chapter
+            self.document_reader.current_word = word
+            self.current_word = self.chapter_offsets[chapter] + word
+            self.context_manager.update_context(word)
+            self.state.transition(chapter, word, self.current_word)
+        self.characters.on_position(chapter)
+        self.save_state()
+
     def update_progress(self, new_word_index: int) -> bool:
         if 0 <= new_word_index < self.total_words:
-            words_count = 0
-            for i, chapter in enumerate(self.document_reader.chapters):
-                if words_count + chapter['word_count'] > new_word_index:
-                    self.document_reader.current_chapter = i
-                    self.document_reader.current_word = new_word_index - words_count
-                    break
-                words_count += chapter['word_count']
-
-            self.current_word = new_word_index
-            self.context_manager.update_context(self.document_reader.current_word)
+            chapter = bisect.bisect_right(self.chapter_offsets, new_word_index) - 1
+            # Empty chapters share an offset with the next one; skip past them
+            while self.document_reader.chapters[chapter]['word_count'] == 0:
+                chapter += 1
+            self._transition(chapter, new_word_index - self.chapter_offsets[chapter])
             return True
         return False
 
@@ -84,9 +169,8 @@ class ReadingCompanion:
         return 0
 
     def move_to_chapter(self, chapter_number: int) -> bool:
-        if self.document_reader.move_to_chapter(chapter_number):
-            self.current_word = sum(self.document_reader.chapters[i]['word_count'] for i in range(chapter_number))
-            self.context_manager.update_context(0)
+        if 0 <= chapter_number < len(self.document_reader.chapters):
+            self._transition(chapter_number, 0)
             return True
         return False
 
@@ -103,54 +187,208 @@ class ReadingCompanion:
         try:
             context = self._get_context()
             response = self._call_ai_model(context, message)
-            self.conversation_history.append({"user": message, "ai": response})
+            self._record_exchange(message, response)
             return response
         except Exception as e:
             return f"An error occurred in the chat method: {str(e)}"
 
+    def stream_chat(self, message: str, on_text) -> str:
+        # on_text receives the response in pieces as they arrive (from this
+        # thread), including the error text if the chat fails
+        sent = []
+
+        def emit(text):
+            sent.append(text)
+            on_text(text)
+        try:
+            context = self._get_context()
+            response = self._stream_ai_model(context, message, emit)
+            self._record_exchange(message, response)
+            return response
+        except Exception as e:
+            error = f"An error occurred in the chat method: {str(e)}"
+            on_text("\n" + error if sent else error)
+            return error
+
+    def _record_exchange(self, message: str, response: str):
+        exchange = {"user": message, "ai": response, "time": time.time()}
+        self.conversation_history.append(exchange)
+        if self.conversation_log is not None:
+            self.conversation_log.append_exchanges([exchange])
+        self.conversation_memory.add_exchange(exchange)
+
     def _get_context(self) -> str:
         context = f"Current chapter: {self.document_reader.get_current_chapter_number()}\n"
         context += f"Word in chapter: {self.document_reader.get_current_word_index()}\n\n"
         context += self.context_manager.get_full_context()
-        context += "\nRecent conversation:\n"
-        for entry in self.conversation_history[-5:]:
-            context += f"User: {entry['user']}\n{entry['ai']}\n\n"
+        recent_cap = RECENT_TURNS_TOKEN_CAP // 2 if self.ai.budget_level() >= BUDGET_TRIM else None
+        context += "\n" + self.conversation_memory.build_context(self.ai_name, recent_cap)
         return context
 
-    def save_conversation(self, directory: str):
-        os.makedirs(directory, exist_ok=True)
-        book_name = os.path.basename(self.book_path)
-        file_name = f"{book_name}_conversation.json"
-        file_path = os.path.join(directory, file_name)
-        with open(file_path, 'w') as f:
-            json.dump({
-                "conversation_history": self.conversation_history,
-                "system_prompt": self.system_prompt,
-                "additional_context": self.get_additional_context(),
-                "ai_name": self.ai_name
-            }, f)
-
-    def load_conversation(self, directory: str) -> bool:
+    def _fold_conversation(self, prompt: str) -> str:
+        response = self.ai.create(
+            SITE_DIGEST, self.book_name,
+            model="claude-3-sonnet-20240229",
+            max_tokens=400,
+            temperature=0.3,
+            system="You are a helpful assistant that keeps concise conversation digests.",
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.content[0].text
+
+    def _new_conversation_log(self, directory: str):
         book_name = os.path.basename(self.book_path)
-        file_name = f"{book_name}_conversation.json"
-        file_path = os.path.join(directory, file_name)
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                self.conversation_history = data.get("conversation_history", [])
-                self.system_prompt = data.get("system_prompt", self.system_prompt)
-                for i, context in enumerate(data.get("additional_context", ["", "", ""])):
-                    self.set_additional_context(i, context)
-                self.ai_name = data.get("ai_name", "Assistant")
-            return True
-        return False
+        if self.workspace is not None:
+            return WorkspaceConversationLog(self.workspace, self.book_hash, directory, book_name)
+        return ConversationLog(directory, book_name)
+
+    def _open_conversation_log(self, directory: str):
+        if self.conversation_log is None or self.conversation_log.directory != directory:
+            if self.conversation_log is not None:
+                self.conversation_log.close()
+            self.conversation_log = self._new_conversation_log(directory)
+            self.conversation_log.open()
+        return self.conversation_log
+
+    def _conversation_settings(self) -> Dict:
+        return {
+            "system_prompt": self.system_prompt,
+            "additional_context": self.get_additional_context(),
+            "ai_name": self.ai_name,
+            "conversation_digest": self.conversation_memory.digest,
+            "digest_through": self.conversation_memory.digest_through
+        }
+
+    def _autosave_settings(self):
+        if self.conversation_log is not None:
+            self.conversation_log.write_settings(self._conversation_settings())
+
+    def save_conversation(self, directory: str):
+        is_new_log = self.conversation_log is None or self.conversation_log.directory != directory
+        log = self._open_conversation_log(directory)
+        # Exchanges made before any log was open have not been written yet
+        if is_new_log and self.conversation_history:
+            log.append_exchanges(self.conversation_history)
+        log.write_settings(self._conversation_settings())
+
+    def load_conversation(self, directory: str, limit: int = CONVERSATION_PAGE_SIZE) -> bool:
+        existed = self._new_conversation_log(directory).exists()
+        log = self._open_conversation_log(directory)
+        if not existed:
+            return False
+        settings = log.read_settings() or {}
+        self.system_prompt = settings.get("system_prompt") or self.system_prompt
+        for i, context in enumerate(settings.get("additional_context", ["", "", ""])):
+            self.context_manager.set_additional_context(i, context)
+        self.ai_name = settings.get("ai_name", "Assistant")
+        self.conversation_history, self.conversation_cursor = log.read_recent(limit)
+        self.conversation_memory.load(self.conversation_history, settings.get("conversation_digest", ""),
+                                      settings.get("digest_through"))
+        return True
+
+    def has_older_messages(self) -> bool:
+        return self.conversation_log is not None and self.conversation_cursor > 0
+
+    def load_older_messages(self, limit: int = CONVERSATION_PAGE_SIZE) -> List[Dict[str, str]]:
+        if not self.has_older_messages():
+            return []
+        older, self.conversation_cursor = self.conversation_log.read_before(self.conversation_cursor, limit)
+        self.conversation_history[:0] = older
+        return older
+
+    def close(self):
+        self.context_manager.read_ahead.cancel()
+        self.characters.cancel()
+        if self.conversation_log is not None:
+            self.conversation_log.close()
+            self.conversation_log = None
+        if self.parsed_book is not None:
+            self.book_store.release(self.parsed_book)
+            self.parsed_book = None
+
+    def attach_workspace(self, workspace):
+        self.workspace = workspace
+        self.book_hash = self.parsed_book.book_hash if self.parsed_book is not None else compute_book_hash(self.book_path)
+        if not workspace.load_fingerprints(self.book_hash):
+            fingerprints = chapter_fingerprints(self.document_reader.chapters)
+            previous = workspace.find_previous_version(self.book_path, self.book_hash)
+            if previous is not None and workspace.load_book_state(self.book_hash) is None:
+                # The file was edited since it was last opened
+                self.reingest_report = reingest(workspace, previous, self.book_hash,
+                                                self.document_reader.chapters, fingerprints)
+            workspace.save_fingerprints(self.book_hash, fingerprints)
+        self.characters.attach_workspace(workspace, self.book_hash)
+        if self.conversation_log is not None:
+            self.conversation_log.close()
+            self.conversation_log = None
+
+    def restore_state(self) -> Optional[Dict]:
+        if self.workspace is None:
+            return None
+        state = self.workspace.load_book_state(self.book_hash)
+        if state is None:
+            return None
+        reader = self.document_reader
+        with self.state.lock:
+            if 0 <= state["chapter"] < len(reader.chapters):
+                reader.current_chapter = state["chapter"]
+                reader.current_word = min(state["word"], max(reader.chapters[state["chapter"]]['word_count'] - 1, 0))
+                self.current_word = self.chapter_offsets[reader.current_chapter] + reader.current_word
+            checkpoints = dict(self.workspace.load_summary_checkpoints(self.book_hash))
+            self.saved_checkpoints.update(checkpoints)
+            self.context_manager.summary_checkpoints.update(checkpoints)
+            self.context_manager.restore_summary(state["summary"], state["summary_position"])
+            if state["summary_position"] is not None:
+                # A summary saved before the reader's chapter (e.g. rolled back to a
+                # checkpoint after an edit) is brought forward by catch_up()
+                self.pending_catch_up = self.context_manager.sections_between(
+                    *state["summary_position"], reader.current_chapter)
+            self.state.transition(reader.current_chapter, reader.current_word, self.current_word)
+        return state
+
+    def save_state(self):
+        if self.workspace is None:
+            return
+        reader = self.document_reader
+        cm = self.context_manager
+        with self.state.lock:
+            position = self.state.snapshot()
+            summary = (cm.get_dynamic_summary(), *cm.summary_position)
+            # Summaries covering exactly the chapters before a chapter; an edit
+            # later in the book, or going back, can fall back to them
+            checkpoints = [(chapter, text) for chapter, text in cm.summary_checkpoints.items()
+                           if self.saved_checkpoints.get(chapter) != text]
+        self.workspace.save_position(self.book_hash, self.book_path, position.chapter,
+                                     position.word, position.absolute_word, self.total_words)
+        self.workspace.save_summary(self.book_hash, *summary)
+        for chapter, text in checkpoints:
+            self.saved_checkpoints[chapter] = text
+            self.workspace.save_summary_checkpoint(self.book_hash, chapter, text)
+        if self.resume_snapshot_chapter != reader.current_chapter:
+            self.resume_snapshot_chapter = reader.current_chapter
+            neighbours = range(max(reader.current_chapter - 1, 0), min(reader.current_chapter + 2, len(reader.chapters)))
+            self.workspace.save_resume_snapshot(self.book_hash, self.book_path, len(reader.chapters),
+                                                {i: reader.chapters[i]['text'] for i in neighbours})
+
+    def save_notes(self, notepad: str):
+        if self.workspace is not None:
+            self.workspace.save_notes(self.book_hash, notepad)
+
+    def add_highlight(self, start_word: int, end_word: int, color: str, text: str) -> Dict:
+        highlight = {"chapter": self.document_reader.current_chapter, "start_word": start_word,
+                     "end_word": end_word, "color": color, "text": text}
+        if self.workspace is not None:
+            self.workspace.add_highlight(self.book_hash, highlight["chapter"], start_word, end_word, color, text)
+        return highlight
 
     def set_ai_persona(self, name: str, role: str):
         self.ai_name = name
         self.system_prompt = prepend_copyright_disclaimer(f"You are {name}, {role}.")
+        self._autosave_settings()
     
     def set_system_prompt(self, new_prompt: str):
         self.system_prompt = prepend_copyright_disclaimer(new_prompt)
+        self._autosave_settings()
 
     def get_current_chapter_content_up_to_word(self):
         return self.document_reader.get_current_chapter_content_up_to_word()
@@ -159,18 +397,10 @@ class ReadingCompanion:
         return self.document_reader.get_current_word_index()
 
     def move_to_next_chapter(self):
-        if self.document_reader.move_to_next_chapter():
-            self.current_word = sum(self.document_reader.chapters[i]['word_count'] for i in range(self.document_reader.current_chapter))
-            self.context_manager.update_context(0)
-            return True
-        return False
+        return self.move_to_chapter(self.document_reader.current_chapter + 1)
 
     def move_to_previous_chapter(self):
-        if self.document_reader.move_to_previous_chapter():
-            self.current_word = sum(self.document_reader.chapters[i]['word_count'] for i in range(self.document_reader.current_chapter))
-            self.context_manager.update_context(0)
-            return True
-        return False
+        return self.move_to_chapter(self.document_reader.current_chapter - 1)
 
     def get_current_chapter(self) -> int:
         return self.document_reader.get_current_chapter_number()
@@ -178,15 +408,36 @@ class ReadingCompanion:
     def get_total_chapters(self) -> int:
         return self.document_reader.get_total_chapters()
 
+    def catch_up(self, on_progress=None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 timeout: float = ANALYSIS_TIMEOUT) -> bool:
+        # Summarizes everything moved past since the last catch-up into the running
+        # summary. Blocking; call from a worker thread.
+        with self.state.lock:
+            sections, self.pending_catch_up = self.pending_catch_up, []
+        if not sections:
+            return False
+        return self.context_manager.catch_up(sections, on_progress, max_concurrency, timeout)
+
     def get_navigation_unit(self) -> str:
         return self.document_reader.get_navigation_unit()
 
     def get_context_summary(self):
         return self.context_manager.get_dynamic_summary()
 
-    def analyze_character(self, character_name, character_context):
+    def analyze_character(self, character_name, character_context=None, timeout=None, aliases=()):
+        # Without character_context, the character's tracked sheet is brought up
+        # to the reader's position from the passages read since it was written
+        if character_context is None:
+            try:
+                sheet = self.characters.update(character_name, aliases, timeout)
+            except Exception as e:
+                return f"Error analyzing character: {str(e)}"
+            if sheet is None:
+                return f"{character_name} has not appeared in the text read so far."
+            return sheet
         try:
-            response = self.client.messages.create(
+            response = self.ai.create(
+                SITE_CHARACTER, self.book_name, timeout,
                 model="claude-3-sonnet-20240229",
                 max_tokens=300,
                 temperature=0.7,
@@ -202,9 +453,10 @@ class ReadingCompanion:
         except Exception as e:
             return f"Error analyzing character: {str(e)}"
 
-    def analyze_literary_elements(self, text):
+    def analyze_literary_elements(self, text, timeout=None):
         try:
-            response = self.client.messages.create(
+            response = self.ai.create(
+                SITE_LITERARY, self.book_name, timeout,
                 model="claude-3-sonnet-20240229",
                 max_tokens=500,
                 temperature=0.7,
@@ -217,4 +469,32 @@ class ReadingCompanion:
             )
             return response.content[0].text.strip()
         except Exception as e:
-            return f"Error analyzing literary elements: {str(e)}"
\ No newline at end of file
+            return f"Error analyzing literary elements: {str(e)}"
+
+    def analyze_characters(self, characters, on_result=None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                           timeout: float = ANALYSIS_TIMEOUT) -> Iterator[Tuple[str, str]]:
+        # characters: {name: context}, (name, context) pairs or bare names, whose
+        # tracked sheets are updated. Yields (name, sheet) as each analysis
+        # finishes; on_result(name, sheet) is called for each too.
+        pairs = list(characters.items()) if isinstance(characters, dict) else [
+            (item, None) if isinstance(item, str) else item for item in characters]
+        results = fan_out(lambda pair: self.analyze_character(pair[0], pair[1], timeout=timeout),
+                          pairs, max_concurrency, timeout)
+        for (name, _), sheet, error in results:
+            if error is not None:
+                sheet = f"Error analyzing character: {str(error)}"
+            if on_result is not None:
+                on_result(name, sheet)
+            yield name, sheet
+
+    def analyze_passages(self, passages: List[str], on_result=None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                         timeout: float = ANALYSIS_TIMEOUT) -> Iterator[Tuple[int, str]]:
+        # Yields (passage index, analysis) as each analysis finishes
+        results = fan_out(lambda indexed: self.analyze_literary_elements(indexed[1], timeout=timeout),
+                          list(enumerate(passages)), max_concurrency, timeout)
+        for (index, _), analysis, error in results:
+            if error is not None:
+                analysis = f"Error analyzing literary elements: {str(error)}"
+            if on_result is not None:
+                on_result(index, analysis)
+            yield index, analysis
@@ -0,0 +1,127 @@
+import hashlib
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def chapter_fingerprint(chapter) -> str:
+    # Whitespace-insensitive, so reflowing a paragraph does not count as an edit
+    return hashlib.sha1(' '.join(chapter['words']).encode('utf-8')).hexdigest()
+
+
+def chapter_fingerprints(chapters) -> List[str]:
+    return [chapter_fingerprint(chapter) for chapter in chapters]
+
+
+class ChapterDiff:
+    # Maps chapters of the previous parse onto the new one. Unchanged chapters
+    # keep their derived data under their new index; first_change is the first
+    # new chapter whose text or index differs, and everything before it is
+    # identical in both versions.
+    def __init__(self, old: Sequence[str], new: Sequence[str]):
+        self.old_count = len(old)
+        self.new_count = len(new)
+        self.unchanged: Dict[int, int] = {}
+        self._opcodes = SequenceMatcher(None, list(old), list(new), autojunk=False).get_opcodes()
+        for tag, i1, i2, j1, _ in self._opcodes:
+            if tag == 'equal':
+                for offset in range(i2 - i1):
+                    self.unchanged[i1 + offset] = j1 + offset
+        prefix = 0
+        while prefix < min(len(old), len(new)) and old[prefix] == new[prefix]:
+            prefix += 1
+        self.first_change = None if list(old) == list(new) else prefix
+
+    @property
+    def changed_chapters(self) -> List[int]:
+        kept = set(self.unchanged.values())
+        return [chapter for chapter in range(self.new_count) if chapter not in kept]
+
+    def map_chapter(self, chapter: int) -> Tuple[int, bool]:
+        # (new index, unchanged) for an old chapter; an edited or deleted one maps
+        # to the new chapter in its place, or the nearest one after it
+        if chapter in self.unchanged:
+            return self.unchanged[chapter], True
+        for tag, i1, i2, j1, j2 in self._opcodes:
+            if i1 <= chapter < i2:
+                target = j1 + min(chapter - i1, max(j2 - j1 - 1, 0))
+                return min(target, max(self.new_count - 1, 0)), False
+        # Nothing to align against (no fingerprints were kept for the old version)
+        return min(chapter, max(self.new_count - 1, 0)), False
+
+
+def find_anchor(words: Sequence[str], needle: Sequence[str], near: int) -> Optional[int]:
+    # Start of the occurrence of needle in words closest to near
+    if not needle:
+        return None
+    best = None
+    first = needle[0]
+    for start, word in enumerate(words):
+        if word == first and tuple(words[start:start + len(needle)]) == tuple(needle):
+            if best is None or abs(start - near) < abs(best - near):
+                best = start
+    return best
+
+
+def remap_highlights(highlights: List[Dict], diff: ChapterDiff, chapters) -> Tuple[List[Dict], int]:
+    # Highlights in unchanged chapters move with their chapter; ones in edited
+    # chapters are re-anchored by their text; the rest are dropped
+    kept, dropped = [], 0
+    for highlight in highlights:
+        chapter, unchanged = diff.map_chapter(highlight["chapter"])
+        if unchanged:
+            kept.append(dict(highlight, chapter=chapter))
+            continue
+        span = highlight["end_word"] - highlight["start_word"]
+        start = None
+        if chapter < len(chapters):
+            start = find_anchor(chapters[chapter]['words'], highlight["text"].split(), highlight["start_word"])
+        if start is None:
+            dropped += 1
+            continue
+        kept.append(dict(highlight, chapter=chapter, start_word=start, end_word=start + span))
+    return kept, dropped
+
+
+def reingest(workspace, old_hash: str, new_hash: str, chapters, fingerprints: List[str]) -> Dict:
+    # Carries a book's workspace data over from the previous version of the
+    # file. Data tied to chapters before the first change is kept as is; the
+    # summary falls back to the last checkpoint at or before the first change,
+    # so catch-up only re-summarizes from there; position and highlights are
+    # remapped. Character sheets written before the first change are kept.
+    # Book-level data (notes, conversation) moves unchanged.
+    diff = ChapterDiff(workspace.load_fingerprints(old_hash), fingerprints)
+    state = workspace.load_book_state(old_hash)
+    report = {"previous_hash": old_hash, "first_change": diff.first_change,
+              "changed_chapters": diff.changed_chapters, "highlights_dropped": 0, "summary_from": None}
+    if state is None:
+        return report
+
+    chapter, _ = diff.map_chapter(state["chapter"])
+    word = min(state["word"], max(chapters[chapter]['word_count'] - 1, 0)) if chapters else 0
+    absolute_word = sum(c['word_count'] for c in chapters[:chapter]) + word
+    workspace.save_position(new_hash, state["path"], chapter, word, absolute_word,
+                            sum(c['word_count'] for c in chapters))
+
+    first_change = diff.first_change if diff.first_change is not None else len(chapters)
+    summary_position = state["summary_position"]
+    if summary_position is not None and (summary_position[0] < first_change
+                                         or summary_position == (first_change, 0)):
+        workspace.save_summary(new_hash, state["summary"], *summary_position)
+        report["summary_from"] = summary_position[0]
+    else:
+        checkpoint = workspace.load_summary_checkpoint(old_hash, first_change) or (0, "")
+        workspace.save_summary(new_hash, checkpoint[1], checkpoint[0], 0)
+        report["summary_from"] = checkpoint[0]
+    for checkpoint_chapter, summary in workspace.load_summary_checkpoints(old_hash):
+        if checkpoint_chapter <= first_change:
+            workspace.save_summary_checkpoint(new_hash, checkpoint_chapter, summary)
+
+    highlights, report["highlights_dropped"] = remap_highlights(state["highlights"], diff, chapters)
+    for highlight in highlights:
+        workspace.add_highlight(new_hash, highlight["chapter"], highlight["start_word"], highlight["end_word"],
+                                highlight["color"], highlight["text"])
+    workspace.move_character_sheets(old_hash, new_hash, first_change)
+    workspace.move_book_data(old_hash, new_hash)
+    workspace.forget_book(old_hash)
+    workspace.flush()
+    return report
@@ -0,0 +1,115 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Hashable, Optional
+
+# Priority classes, lowest value first
+INTERACTIVE = 0
+ANALYSIS = 1
+BACKGROUND = 2
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 50
+# Workers and rate-limit tokens that only interactive requests may use
+INTERACTIVE_RESERVE = 1
+
+
+class Superseded(Exception):
+    pass
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "key", "superseded")
+
+    def __init__(self, priority: int, seq: int, key: Optional[Hashable]):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.superseded = False
+
+
+class RequestScheduler:
+    # Admission control for model requests. At most max_concurrency requests run at
+    # once; waiting requests start in priority order (FIFO within a class), and a
+    # token bucket keeps the overall rate under requests_per_minute. Analysis and
+    # background work leave INTERACTIVE_RESERVE slots and tokens free, so a chat
+    # message never queues behind them. A request submitted with a supersede_key
+    # replaces one with the same key that is still waiting; the waiting one raises
+    # Superseded. Requests already running are left to finish.
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                 interactive_reserve: int = INTERACTIVE_RESERVE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.interactive_reserve = min(interactive_reserve, self.max_concurrency - 1)
+        self.rate = requests_per_minute / 60.0 if requests_per_minute else None
+        self.capacity = float(max(self.max_concurrency, 1 + self.interactive_reserve))
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+        self._running = 0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, priority: int, supersede_key: Optional[Hashable] = None):
+        self._acquire(priority, supersede_key)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+
+    def run(self, priority: int, func, supersede_key: Optional[Hashable] = None):
+        with self.slot(priority, supersede_key):
+            return func()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._waiting)
+
+    def running(self) -> int:
+        with self._cond:
+            return self._running
+
+    def _acquire(self, priority: int, key: Optional[Hashable]):
+        with self._cond:
+            ticket = _Ticket(priority, next(self._seq), key)
+            if key is not None:
+                for other in self._waiting:
+                    if other.key == key:
+                        other.superseded = True
+            self._waiting.append(ticket)
+            self._waiting.sort(key=lambda t: (t.priority, t.seq))
+            self._cond.notify_all()
+            while True:
+                if ticket.superseded:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+                    raise Superseded(f"request superseded: {key!r}")
+                wait_for = self._try_start(ticket)
+                if wait_for == 0:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+                    return
+                self._cond.wait(wait_for)
+
+    def _try_start(self, ticket: _Ticket) -> Optional[float]:
+        # Returns 0 once the ticket is admitted, otherwise how long to wait (None
+        # means until another request finishes or joins the queue)
+        head = next(t for t in self._waiting if not t.superseded)
+        if head is not ticket:
+            return None
+        reserve = 0 if ticket.priority == INTERACTIVE else self.interactive_reserve
+        if self._running >= self.max_concurrency - reserve:
+            return None
+        if self.rate is not None:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens < 1 + reserve:
+                return (1 + reserve - self._tokens) / self.rate
+            self._tokens -= 1
+        self._running += 1
+        return 0
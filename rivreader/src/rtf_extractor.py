@@ -0,0 +1,196 @@
+import codecs
+import re
+from typing import Iterator, List, Optional, Tuple
+
+PARAGRAPH_SEPARATOR = "\n\n"
+DEFAULT_CODEPAGE = 1252
+
+_TOKEN = re.compile(
+    rb"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?"   # control word with optional parameter
+    rb"|\\'([0-9a-fA-F]{2})"                 # hex-escaped byte in the document codepage
+    rb"|\\([^a-zA-Z])"                        # control symbol
+    rb"|([{}])"
+    rb"|[\r\n]+"                              # raw line breaks carry no meaning
+    rb"|[^\\{}\r\n]+"
+)
+_GROUP_SPECIAL = re.compile(rb"[{}\\]")
+_BIN = re.compile(rb"bin(\d{1,10}) ?")
+_SURROGATES = re.compile('[\ud800-\udfff]')
+
+# Groups whose content is never document text. Pictures, objects and font or
+# style tables are skipped wholesale without being tokenized.
+DESTINATIONS = {
+    b'annotation', b'atnauthor', b'atnid', b'author', b'background', b'bkmkend', b'bkmkstart',
+    b'blipuid', b'buptim', b'category', b'colorschememapping', b'colortbl', b'comment', b'company',
+    b'creatim', b'datafield', b'datastore', b'defchp', b'defpap', b'do', b'doccomm', b'docvar',
+    b'dptxbxtext', b'falt', b'ffdeftext', b'ffentrymcr', b'ffexitmcr', b'ffformat', b'ffhelptext',
+    b'ffl', b'ffname', b'ffstattext', b'file', b'filetbl', b'fldinst', b'fontemb', b'fontfile',
+    b'fonttbl', b'footer', b'footerf', b'footerl', b'footerr', b'footnote', b'formfield',
+    b'ftncn', b'ftnsep', b'ftnsepc', b'generator', b'header', b'headerf', b'headerl', b'headerr',
+    b'hl', b'hlfr', b'hlinkbase', b'hlloc', b'hlsrc', b'info', b'keywords', b'latentstyles',
+    b'levelnumbers', b'leveltext', b'lfolevel', b'linkval', b'list', b'listlevel', b'listname',
+    b'listoverride', b'listoverridetable', b'listpicture', b'liststylename', b'listtable',
+    b'listtext', b'lsdlockedexcept', b'manager', b'mmathPr', b'nesttableprops', b'nextfile',
+    b'nonesttables', b'nonshppict', b'objalias', b'objclass', b'objdata', b'object', b'objname',
+    b'objsect', b'objtime', b'oldcprops', b'oldpprops', b'oldsprops', b'oldtprops', b'oleclsid',
+    b'operator', b'panose', b'password', b'passwordhash', b'pgptbl', b'picprop', b'pict', b'pn',
+    b'pnseclvl', b'pntext', b'pntxta', b'pntxtb', b'printim', b'private', b'propname',
+    b'protusertbl', b'pxe', b'result', b'revtbl', b'revtim', b'rsidtbl', b'rxe', b'shp',
+    b'shpgrp', b'shpinst', b'shppict', b'shprslt', b'shptxt', b'sn', b'sp', b'stylesheet',
+    b'subject', b'sv', b'tc', b'template', b'themedata', b'title', b'txe', b'userprops',
+    b'wgrffmtfilter', b'windowcaption', b'writereservation', b'writereservhash', b'xe', b'xform',
+    b'xmlattrname', b'xmlattrvalue', b'xmlclose', b'xmlname', b'xmlnstbl', b'xmlopen',
+}
+PARAGRAPH_BREAKS = {b'par', b'sect', b'page', b'row'}
+SPECIAL_CHARACTERS = {
+    b'line': '\n', b'tab': '\t', b'cell': ' ', b'emdash': '\u2014', b'endash': '\u2013',
+    b'emspace': ' ', b'enspace': ' ', b'qmspace': ' ', b'bullet': '\u2022',
+    b'lquote': '\u2018', b'rquote': '\u2019', b'ldblquote': '\u201c', b'rdblquote': '\u201d',
+}
+SYMBOLS = {b'\\': '\\', b'{': '{', b'}': '}', b'~': '\u00a0', b'_': '\u2011'}
+CHARSET_CODEPAGES = {b'ansi': DEFAULT_CODEPAGE, b'mac': 10000, b'pc': 437, b'pca': 850}
+
+
+def _decoder(codepage: int):
+    try:
+        return codecs.getdecoder('mac_roman' if codepage == 10000 else f'cp{codepage}')
+    except LookupError:
+        return codecs.getdecoder(f'cp{DEFAULT_CODEPAGE}')
+
+
+def skip_group(data: bytes, pos: int) -> int:
+    # pos is just inside a group; returns the position after its closing brace.
+    # Runs of picture hex data contain no braces or backslashes, so each is one
+    # regex search; \binN payloads are jumped over by length.
+    depth = 1
+    while depth:
+        match = _GROUP_SPECIAL.search(data, pos)
+        if match is None:
+            return len(data)
+        pos = match.end()
+        char = data[match.start()]
+        if char == 0x7b:
+            depth += 1
+        elif char == 0x7d:
+            depth -= 1
+        else:
+            binary = _BIN.match(data, pos)
+            pos = binary.end() + int(binary.group(1)) if binary else pos + 1
+    return pos
+
+
+def iter_rtf_paragraphs(data: bytes) -> Iterator[Tuple[str, Optional[int]]]:
+    # Single pass over the raw bytes, yielding (text, heading level) per
+    # paragraph. Text bytes and \'hh escapes are decoded with the \ansicpg
+    # codepage (cp1252 when absent); runs of them are decoded together, since
+    # double-byte codepages (932, 936, 949, 950) split a character across two
+    # escapes. \uN escapes replace the next \ucN fallback characters. Heading
+    # levels come from \outlinelevelN.
+    decode = _decoder(DEFAULT_CODEPAGE)
+    uc = 1                 # fallback characters after \uN, group scoped
+    outline = None         # paragraph outline level, group scoped
+    stack: List[Tuple[int, Optional[int]]] = []
+    parts: List[str] = []
+    raw = bytearray()      # codepage bytes not decoded yet
+    fallback = 0           # fallback characters still to drop
+    group_start = False
+    pos = 0
+    length = len(data)
+
+    def decode_raw():
+        if raw:
+            parts.append(decode(bytes(raw), 'replace')[0])
+            raw.clear()
+
+    def flush():
+        decode_raw()
+        text = ''.join(parts)
+        parts.clear()
+        if _SURROGATES.search(text):
+            # Characters outside the BMP arrive as two \uN escapes
+            text = text.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+        return text, (outline + 1 if outline is not None else None)
+
+    while pos < length:
+        match = _TOKEN.match(data, pos)
+        if match is None:
+            # Only a lone backslash at the very end fails to tokenize
+            raw += data[pos:]
+            break
+        pos = match.end()
+        word, param, hex_byte, symbol, brace = match.groups()
+        if word is not None or symbol is not None or brace is not None:
+            decode_raw()
+        starting_group, group_start = group_start, False
+        if word is not None:
+            if starting_group and word in DESTINATIONS:
+                pos = skip_group(data, pos)
+                uc, outline = stack.pop()
+                continue
+            if word == b'u' and param is not None:
+                code = int(param)
+                parts.append(chr(code + 65536 if code < 0 else code))
+                fallback = uc
+            elif fallback:
+                fallback -= 1
+            elif word in PARAGRAPH_BREAKS:
+                yield flush()
+            elif word in SPECIAL_CHARACTERS:
+                parts.append(SPECIAL_CHARACTERS[word])
+            elif word == b'uc' and param is not None:
+                uc = int(param)
+            elif word == b'outlinelevel' and param is not None:
+                outline = int(param)
+            elif word == b'pard':
+                outline = None
+            elif word == b'ansicpg' and param is not None:
+                decode = _decoder(int(param))
+            elif word in CHARSET_CODEPAGES:
+                decode = _decoder(CHARSET_CODEPAGES[word])
+            elif word == b'bin' and param is not None:
+                pos += int(param)
+        elif hex_byte is not None:
+            if fallback:
+                fallback -= 1
+            else:
+                raw += bytes.fromhex(hex_byte.decode('ascii'))
+        elif symbol is not None:
+            if symbol == b'*' and starting_group:
+                pos = skip_group(data, pos)
+                uc, outline = stack.pop()
+            elif fallback:
+                fallback -= 1
+            elif symbol in b'\r\n':
+                # A backslash before a line break is \par; Cocoa/TextEdit writes these
+                yield flush()
+            elif symbol in SYMBOLS:
+                parts.append(SYMBOLS[symbol])
+        elif brace is not None:
+            fallback = 0
+            if brace == b'{':
+                stack.append((uc, outline))
+                group_start = True
+            elif stack:
+                uc, outline = stack.pop()
+        else:
+            text = match.group(0)
+            if text[0] in b'\r\n':
+                continue
+            if fallback:
+                dropped = min(fallback, len(text))
+                fallback -= dropped
+                text = text[dropped:]
+            raw += text
+    if parts or raw:
+        yield flush()
+
+
+def iter_rtf_file_paragraphs(path: str) -> Iterator[Tuple[str, Optional[int]]]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    return iter_rtf_paragraphs(data)
+
+
+def rtf_to_text(data: bytes) -> str:
+    paragraphs = (text.strip() for text, _ in iter_rtf_paragraphs(data))
+    return PARAGRAPH_SEPARATOR.join(text for text in paragraphs if text)
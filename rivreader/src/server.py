@@ -0,0 +1,548 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import struct
+import time
+import uuid
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from .reading_companion import ReadingCompanion
+from .book_store import BookStore
+from .memory_budget import MemoryAccountant, DEFAULT_MEMORY_CAP
+from .request_scheduler import RequestScheduler, DEFAULT_MAX_CONCURRENCY, DEFAULT_REQUESTS_PER_MINUTE
+from .usage_meter import UsageMeter
+from .fake_model import FakeAnthropic, DEFAULT_LATENCY
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Threads running streamed chats, each held for the whole response
+DEFAULT_WORKERS = 64
+# Threads for everything else (opening books, navigation, catch-up), kept apart
+# so progress updates do not queue behind long streams
+DEFAULT_NAVIGATION_WORKERS = 16
+DEFAULT_MAX_SESSIONS = 1000
+SESSION_IDLE_TIMEOUT = 30 * 60
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1 << 20
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_TEXT, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 502: "Bad Gateway", 503: "Service Unavailable",
+           500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Dict:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        return data
+
+
+class Session:
+    def __init__(self, session_id: str, book: str, companion: ReadingCompanion):
+        self.id = session_id
+        self.book = book
+        self.companion = companion
+        self.highlights: List[Dict] = []
+        # One chat at a time per session; the conversation is sequential
+        self.chat_lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+    def position(self) -> Dict:
+        companion = self.companion
+        position = companion.state.snapshot()
+        return {"session": self.id, "book": self.book, "chapter": position.chapter, "word": position.word,
+                "absolute_word": position.absolute_word, "total_words": companion.total_words,
+                "chapters": companion.get_total_chapters(), "pending_catch_up": len(companion.pending_catch_up)}
+
+    def close(self):
+        self.companion.close()
+
+
+def ws_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def _apply_mask(payload: bytes, mask: bytes) -> bytes:
+    repeated = (mask * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(len(payload), 'big')
+
+
+def ws_frame(opcode: int, payload: bytes, mask: Optional[bytes] = None) -> bytes:
+    # Clients must mask what they send (pass mask); servers must not
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, mask_bit | length)
+    elif length < 1 << 16:
+        header = struct.pack(">BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, mask_bit | 127, length)
+    if mask:
+        return header + mask + _apply_mask(payload, mask)
+    return header + payload
+
+
+async def read_ws_message(reader: asyncio.StreamReader):
+    # Returns (opcode, payload) of the next message, joining fragments
+    opcode, parts = None, []
+    while True:
+        head = await reader.readexactly(2)
+        fin, frame_opcode = head[0] & 0x80, head[0] & 0x0F
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", await reader.readexactly(8))[0]
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "message too large")
+        mask = await reader.readexactly(4) if head[1] & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = _apply_mask(payload, mask)
+        if frame_opcode >= 0x8:
+            # Control frames may arrive between the fragments of a message
+            return frame_opcode, payload
+        if opcode is None:
+            opcode = frame_opcode
+        parts.append(payload)
+        if fin:
+            return opcode, b''.join(parts)
+
+
+class CompanionServer:
+    # Serves ReadingCompanion sessions over HTTP/1.1 and WebSocket on one
+    # asyncio event loop. Socket I/O never blocks: companion calls (book
+    # parsing, navigation, model calls) run on a thread pool, and streamed chat
+    # text is handed back to the loop as it arrives and written out as HTTP
+    # chunks or WebSocket messages. All sessions share one usage meter and one
+    # request scheduler, so the model rate limit applies to the whole server.
+    def __init__(self, library: str, api_key: Optional[str] = None, model_client=None,
+                 workers: int = DEFAULT_WORKERS, max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 usage_meter: Optional[UsageMeter] = None, request_scheduler: Optional[RequestScheduler] = None,
+                 memory_cap: int = DEFAULT_MEMORY_CAP):
+        self.library = os.path.realpath(library)
+        self.api_key = api_key
+        self.model_client = model_client
+        self.max_sessions = max_sessions
+        self.usage_meter = usage_meter if usage_meter is not None else UsageMeter()
+        self.request_scheduler = request_scheduler if request_scheduler is not None else RequestScheduler()
+        # Sessions on the same book share one parsed copy of it; books nobody
+        # is reading stay cached until the memory cap needs the room
+        self.memory = MemoryAccountant(memory_cap)
+        self.book_store = BookStore(self.memory)
+        self.executor = ThreadPoolExecutor(max_workers=DEFAULT_NAVIGATION_WORKERS, thread_name_prefix="companion")
+        self.chat_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="companion-chat")
+        self.sessions: Dict[str, Session] = {}
+        self._server = None
+        self._reaper = None
+        self._routes = [
+            ("GET", re.compile(r"/health"), self.health),
+            ("GET", re.compile(r"/stats/memory"), self.memory_stats),
+            ("POST", re.compile(r"/sessions"), self.open_session),
+            ("GET", re.compile(r"/sessions/(?P<sid>[\w-]+)"), self.get_session),
+            ("DELETE", re.compile(r"/sessions/(?P<sid>[\w-]+)"), self.close_session),
+            ("POST", re.compile(r"/sessions/(?P<sid>[\w-]+)/progress"), self.update_progress),
+            ("POST", re.compile(r"/sessions/(?P<sid>[\w-]+)/catch-up"), self.catch_up),
+            ("GET", re.compile(r"/sessions/(?P<sid>[\w-]+)/summary"), self.get_summary),
+            ("GET", re.compile(r"/sessions/(?P<sid>[\w-]+)/highlights"), self.get_highlights),
+            ("POST", re.compile(r"/sessions/(?P<sid>[\w-]+)/highlights"), self.add_highlight),
+            ("GET", re.compile(r"/sessions/(?P<sid>[\w-]+)/characters"), self.get_cast),
+            ("POST", re.compile(r"/sessions/(?P<sid>[\w-]+)/characters"), self.update_character),
+        ]
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        self._reaper = asyncio.get_running_loop().create_task(self._reap_idle_sessions())
+        return self._server
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.chat_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _reap_idle_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.monotonic() - SESSION_IDLE_TIMEOUT
+            for session_id in [s.id for s in self.sessions.values() if s.last_seen < cutoff]:
+                self.sessions.pop(session_id).close()
+
+    def _session(self, sid: str) -> Session:
+        session = self.sessions.get(sid)
+        if session is None:
+            raise HTTPError(404, "no such session")
+        session.last_seen = time.monotonic()
+        return session
+
+    def _resolve_book(self, name) -> str:
+        if not isinstance(name, str) or not name:
+            raise HTTPError(400, "book is required")
+        path = os.path.realpath(os.path.join(self.library, name))
+        if os.path.commonpath([path, self.library]) != self.library or not os.path.isfile(path):
+            raise HTTPError(404, "book not found in library")
+        return path
+
+    # HTTP handlers return (status, JSON-able body)
+
+    async def health(self, request):
+        return 200, {"sessions": len(self.sessions), "books": len(self.book_store),
+                     "queued_requests": self.request_scheduler.pending()}
+
+    async def memory_stats(self, request):
+        return 200, self.memory.stats()
+
+    async def open_session(self, request):
+        data = request.json()
+        path = self._resolve_book(data.get("book"))
+        if len(self.sessions) >= self.max_sessions:
+            raise HTTPError(503, "session limit reached")
+        try:
+            companion = await self._run(ReadingCompanion, path, self.api_key, self.usage_meter,
+                                        self.request_scheduler, self.model_client, self.book_store)
+        except Exception as e:
+            raise HTTPError(400, f"could not open book: {str(e)}")
+        session = Session(uuid.uuid4().hex, data["book"], companion)
+        self.sessions[session.id] = session
+        return 201, session.position()
+
+    async def get_session(self, request, sid):
+        return 200, self._session(sid).position()
+
+    async def close_session(self, request, sid):
+        self._session(sid)
+        self.sessions.pop(sid).close()
+        return 204, None
+
+    async def update_progress(self, request, sid):
+        session = self._session(sid)
+        data = request.json()
+        if isinstance(data.get("word"), int):
+            moved = await self._run(session.companion.update_progress, data["word"])
+        elif isinstance(data.get("chapter"), int):
+            moved = await self._run(session.companion.move_to_chapter, data["chapter"])
+        else:
+            raise HTTPError(400, "word or chapter is required")
+        if not moved:
+            raise HTTPError(400, "position out of range")
+        return 200, session.position()
+
+    async def catch_up(self, request, sid):
+        session = self._session(sid)
+        updated = await self._run(session.companion.catch_up)
+        return 200, {"updated": updated, "summary": session.companion.get_context_summary()}
+
+    async def get_summary(self, request, sid):
+        cm = self._session(sid).companion.context_manager
+        with cm.state.lock:
+            summary = {"summary": cm.get_dynamic_summary(), "chapter": cm.context_chapter,
+                       "summarized_word": cm.summarized_word}
+        return 200, summary
+
+    async def get_highlights(self, request, sid):
+        return 200, {"highlights": self._session(sid).highlights}
+
+    async def add_highlight(self, request, sid):
+        session = self._session(sid)
+        data = request.json()
+        try:
+            highlight = session.companion.add_highlight(int(data["start_word"]), int(data["end_word"]),
+                                                        str(data.get("color", "yellow")), str(data.get("text", "")))
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(400, "start_word and end_word are required")
+        session.highlights.append(highlight)
+        return 201, highlight
+
+    async def get_cast(self, request, sid):
+        cast = await self._run(self._session(sid).companion.characters.cast)
+        return 200, {"characters": cast}
+
+    async def update_character(self, request, sid):
+        session = self._session(sid)
+        data = request.json()
+        name, aliases = data.get("name"), data.get("aliases", [])
+        if not isinstance(name, str) or not name or not isinstance(aliases, list):
+            raise HTTPError(400, "name is required")
+        try:
+            sheet = await asyncio.get_running_loop().run_in_executor(
+                self.chat_executor, session.companion.characters.update, name, [str(a) for a in aliases])
+        except Exception as e:
+            raise HTTPError(502, f"could not update character: {str(e)}")
+        if sheet is None:
+            raise HTTPError(404, f"{name} has not appeared in the text read so far")
+        return 200, {"name": name, "sheet": sheet}
+
+    async def stream_chat(self, session: Session, message: str):
+        # Yields the response as the model produces it. The companion streams on
+        # a worker thread; each piece is queued back onto the loop in order, and
+        # the worker's completion is queued after the last piece.
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def on_text(text):
+            loop.call_soon_threadsafe(queue.put_nowait, text)
+
+        async with session.chat_lock:
+            future = loop.run_in_executor(self.chat_executor, session.companion.stream_chat, message, on_text)
+            future.add_done_callback(lambda _: queue.put_nowait(None))
+            try:
+                while True:
+                    text = await queue.get()
+                    if text is None:
+                        break
+                    yield text
+            finally:
+                # The worker keeps streaming after a client disconnects; hold
+                # the lock until it is done so the next chat on this companion
+                # cannot run alongside it
+                await asyncio.wait([future])
+            future.result()
+
+    # Connection handling
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                keep_alive = await self._dispatch(request, reader, writer)
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HTTPError(400, "incomplete request")
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "headers too large")
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = headers.get("content-length", "") or "0"
+        if not length.isdigit():
+            raise HTTPError(400, "invalid Content-Length")
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "body too large")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), urlsplit(target).path.rstrip("/") or "/", headers, body)
+
+    async def _dispatch(self, request: Request, reader, writer) -> bool:
+        keep_alive = request.headers.get("connection", "").lower() != "close"
+        try:
+            chat = re.fullmatch(r"/sessions/([\w-]+)/(chat|ws)", request.path)
+            if chat and chat.group(2) == "ws" and request.method == "GET":
+                await self._websocket(self._session(chat.group(1)), request, reader, writer)
+                return False
+            if chat and chat.group(2) == "chat" and request.method == "POST":
+                await self._chunked_chat(self._session(chat.group(1)), request, writer, keep_alive)
+                return keep_alive
+            status, body = await self._route(request)
+        except HTTPError as e:
+            status, body = e.status, {"error": e.message}
+        except ConnectionError:
+            raise
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+        await self._send_json(writer, status, body, keep_alive)
+        return keep_alive
+
+    async def _route(self, request: Request):
+        allowed = False
+        for method, pattern, handler in self._routes:
+            match = pattern.fullmatch(request.path)
+            if match:
+                allowed = True
+                if method == request.method:
+                    return await handler(request, **match.groupdict())
+        raise HTTPError(405 if allowed else 404, "method not allowed" if allowed else "not found")
+
+    async def _send_json(self, writer, status: int, body, keep_alive: bool):
+        payload = b"" if body is None else json.dumps(body).encode()
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + payload)
+        await writer.drain()
+
+    async def _chunked_chat(self, session: Session, request: Request, writer, keep_alive: bool):
+        message = request.json().get("message")
+        if not isinstance(message, str) or not message:
+            raise HTTPError(400, "message is required")
+        writer.write((f"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                      f"Transfer-Encoding: chunked\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode())
+        async with aclosing(self.stream_chat(session, message)) as pieces:
+            async for text in pieces:
+                data = text.encode()
+                if data:
+                    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _websocket(self, session: Session, request: Request, reader, writer):
+        # Messages are JSON: {"type": "chat", "message": ...} streams back "text"
+        # messages and a final "done"; {"type": "progress", "word" | "chapter": n}
+        # answers with "position"
+        key = request.headers.get("sec-websocket-key")
+        if request.headers.get("upgrade", "").lower() != "websocket" or not key:
+            raise HTTPError(400, "expected a WebSocket upgrade")
+        writer.write((f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {ws_accept(key)}\r\n\r\n").encode())
+        await writer.drain()
+
+        async def send(message):
+            writer.write(ws_frame(WS_TEXT, json.dumps(message).encode()))
+            await writer.drain()
+
+        while True:
+            try:
+                opcode, payload = await read_ws_message(reader)
+            except HTTPError:
+                writer.write(ws_frame(WS_CLOSE, struct.pack(">H", 1009)))
+                await writer.drain()
+                return
+            if opcode == WS_CLOSE:
+                writer.write(ws_frame(WS_CLOSE, payload[:2]))
+                await writer.drain()
+                return
+            if opcode == WS_PING:
+                writer.write(ws_frame(WS_PONG, payload))
+                await writer.drain()
+                continue
+            if opcode != WS_TEXT:
+                continue
+            session.last_seen = time.monotonic()
+            try:
+                message = json.loads(payload)
+                kind = message["type"]
+            except (ValueError, KeyError, TypeError):
+                await send({"type": "error", "error": "expected a JSON object with a type"})
+                continue
+            if kind == "chat" and isinstance(message.get("message"), str):
+                async with aclosing(self.stream_chat(session, message["message"])) as pieces:
+                    async for text in pieces:
+                        await send({"type": "text", "text": text})
+                await send({"type": "done"})
+            elif kind == "progress":
+                try:
+                    _, body = await self.update_progress(Request("POST", "", {}, payload), session.id)
+                    await send({"type": "position", **body})
+                except HTTPError as e:
+                    await send({"type": "error", "error": e.message})
+            else:
+                await send({"type": "error", "error": f"unsupported message: {kind}"})
+
+
+def load_config(path: str = "config.json") -> Dict:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+async def serve(server: CompanionServer, host: str, port: int):
+    await server.start(host, port)
+    print(f"Serving {server.library} on http://{host}:{server.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve reading companion sessions over HTTP and WebSocket.")
+    parser.add_argument("library", help="directory of books that sessions may open")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-sessions", type=int, default=DEFAULT_MAX_SESSIONS)
+    parser.add_argument("--memory-cap-mb", type=int, default=DEFAULT_MEMORY_CAP // 2 ** 20,
+                        help="byte budget shared by the server's caches")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="model requests in flight across all sessions")
+    parser.add_argument("--requests-per-minute", type=float, default=DEFAULT_REQUESTS_PER_MINUTE)
+    parser.add_argument("--fake-model", action="store_true", help="answer with a local fake model instead of the API")
+    parser.add_argument("--fake-latency", type=float, default=DEFAULT_LATENCY)
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    model_client = FakeAnthropic(latency=args.fake_latency) if args.fake_model else None
+    api_key = "fake" if args.fake_model else (os.environ.get("ANTHROPIC_API_KEY") or config.get("api_key"))
+    server = CompanionServer(
+        args.library, api_key, model_client, workers=args.workers, max_sessions=args.max_sessions,
+        memory_cap=args.memory_cap_mb * 2 ** 20,
+        usage_meter=UsageMeter(config.get("session_token_budget"), config.get("daily_token_budget")),
+        request_scheduler=RequestScheduler(args.max_concurrency, args.requests_per_minute or None),
+    )
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
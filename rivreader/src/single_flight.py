@@ -0,0 +1,65 @@
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+def request_key(**payload) -> str:
+    # Canonical form of a request payload: key order and whitespace around the
+    # message text do not make two requests different
+    def normalize(value):
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        return value
+    return json.dumps(normalize(payload), sort_keys=True, default=str)
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution: the first caller
+    # runs func, later callers wait for its result (or exception). Nothing is
+    # cached once the call completes.
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        # Returns (result, shared); shared is True when another caller did the work
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self._waiting += 1
+        if not leader:
+            try:
+                return future.result(), True
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def waiting(self) -> int:
+        # Callers waiting on another caller's execution
+        with self._lock:
+            return self._waiting
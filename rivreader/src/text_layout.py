@@ -0,0 +1,51 @@
+import bisect
+import re
+from typing import Dict, Iterable, List, Tuple
+
+_WORD = re.compile(r'\S+')
+
+
+class TextLayout:
+    # Where each word and line of a chapter starts in the text inserted into
+    # the reader's Text widget, so word anchors convert to "line.column"
+    # indices in Python instead of one Tk index expression per conversion
+    def __init__(self, text: str):
+        self.word_starts: List[int] = []
+        self.word_ends: List[int] = []
+        for match in _WORD.finditer(text):
+            self.word_starts.append(match.start())
+            self.word_ends.append(match.end())
+        self.line_starts = [0]
+        self.line_starts.extend(match.end() for match in re.finditer('\n', text))
+
+    def __len__(self) -> int:
+        return len(self.word_starts)
+
+    def index(self, offset: int) -> str:
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        return f"{line + 1}.{offset - self.line_starts[line]}"
+
+    def word_index(self, word: int) -> str:
+        if not self.word_starts:
+            return "1.0"
+        return self.index(self.word_starts[min(max(word, 0), len(self.word_starts) - 1)])
+
+    def word_span(self, start_word: int, end_word: int) -> Tuple[int, int]:
+        # Character offsets from the start of start_word to the end of end_word
+        last = len(self.word_starts) - 1
+        start_word = min(max(start_word, 0), last)
+        end_word = min(max(end_word, start_word), last)
+        return self.word_starts[start_word], self.word_ends[end_word]
+
+    def highlight_ranges(self, highlights: Iterable[Dict], chapter: int) -> Dict[str, List[str]]:
+        # {color: [start, end, start, end, ...]} for the chapter's highlights,
+        # ready to pass to a single Text.tag_add per color
+        ranges: Dict[str, List[str]] = {}
+        if not self.word_starts:
+            return ranges
+        for highlight in highlights:
+            if highlight["chapter"] != chapter:
+                continue
+            start, end = self.word_span(highlight["start_word"], highlight["end_word"])
+            ranges.setdefault(highlight["color"], []).extend((self.index(start), self.index(end)))
+        return ranges
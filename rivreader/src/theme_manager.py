@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import json
 import os
 
@@ -228,6 +228,7 @@ class ThemeManager:
         }
         self.config_file = "theme_config.json"
         self.current_theme = self.load_theme()
+        self._resolved_styles: Dict[str, Dict[str, Dict]] = {}
 
     def get_theme(self, theme_name: str) -> Dict[str, Any]:
         return self.themes.get(theme_name, self.themes["modern_dark"])
@@ -246,15 +247,100 @@ class ThemeManager:
     def update_theme_property(self, theme_name: str, property_name: str, value: Any) -> None:
         if theme_name in self.themes and property_name in self.themes[theme_name]:
             self.themes[theme_name][property_name] = value
+            self._resolved_styles.pop(theme_name, None)
             if theme_name == self.current_theme:
                 self.save_theme()
 
     def add_new_theme(self, theme_name: str, theme_properties: Dict[str, Any]) -> None:
         if all(key in theme_properties for key in self.themes["modern_dark"].keys()):
             self.themes[theme_name] = theme_properties
+            self._resolved_styles.pop(theme_name, None)
         else:
             raise ValueError("New theme must contain all properties present in the default theme.")
 
+    def get_resolved_styles(self, theme_name: Optional[str] = None) -> Dict[str, Dict]:
+        theme_name = theme_name or self.current_theme
+        if theme_name not in self._resolved_styles:
+            self._resolved_styles[theme_name] = self._resolve_styles(self.get_theme(theme_name))
+        return self._resolved_styles[theme_name]
+
+    @staticmethod
+    def _resolve_styles(theme: Dict[str, Any]) -> Dict[str, Dict]:
+        # Every option the GUI sets, keyed by section then target. Sections:
+        # ttk style configure/map options, option database entries, widget
+        # options, and text tag options keyed by (widget, tag).
+        main_font = (theme["font_main"], theme["font_size_main"])
+        button = {"padding": theme["button_padding"], "font": main_font, "borderwidth": theme["button_borderwidth"],
+                  "relief": theme["button_relief"], "background": theme["button_bg"], "foreground": theme["button_fg"]}
+        panel = {"bg": theme["bg"], "fg": theme["fg"], "font": main_font}
+        return {
+            "styles": {
+                "TFrame": {"background": theme["bg"]},
+                "TButton": button,
+                "TLabel": {"background": theme["label_bg"], "foreground": theme["label_fg"], "font": main_font},
+                "TEntry": {"fieldbackground": theme["entry_bg"], "foreground": theme["entry_fg"], "font": main_font},
+                "Horizontal.TProgressbar": {"background": theme["progress_bar_fg"], "troughcolor": theme["progress_bar_bg"]},
+                "Custom.TButton": dict(button),
+                "TNotebook": {"background": theme["bg"], "borderwidth": 0},
+                "TNotebook.Tab": {"background": theme["notebook_tab_bg"], "foreground": theme["notebook_tab_fg"],
+                                  "padding": [10, 5], "font": main_font},
+                "TCombobox": {"fieldbackground": theme["dropdown_bg"], "background": theme["dropdown_bg"],
+                              "foreground": theme["dropdown_fg"], "selectbackground": theme["dropdown_highlight_bg"],
+                              "selectforeground": theme["dropdown_fg"]},
+                "Custom.Vertical.TScrollbar": {"background": theme["scrollbar_bg"], "troughcolor": theme["bg"],
+                                               "bordercolor": theme["bg"], "arrowcolor": theme["scrollbar_fg"]},
+                "Custom.TMenubutton": {"background": theme["menu_bg"], "foreground": theme["menu_fg"],
+                                       "padding": theme["button_padding"]},
+            },
+            "maps": {
+                "TButton": {"background": [("active", theme["button_active_bg"])]},
+                "Custom.TButton": {"background": [("active", theme["button_active_bg"])]},
+                "TNotebook.Tab": {"background": [("selected", theme["notebook_tab_selected_bg"])]},
+                "TCombobox": {"fieldbackground": [("readonly", theme["dropdown_bg"])],
+                              "selectbackground": [("readonly", theme["dropdown_highlight_bg"])]},
+                "Custom.Vertical.TScrollbar": {"background": [("active", theme["scrollbar_fg"])]},
+                "Custom.TMenubutton": {"background": [("active", theme["menu_active_bg"])],
+                                       "foreground": [("active", theme["menu_active_fg"])]},
+            },
+            "options": {
+                "*Menu": {"background": theme["menu_bg"], "foreground": theme["menu_fg"],
+                          "selectColor": theme["menu_active_bg"], "activeBackground": theme["menu_active_bg"],
+                          "activeForeground": theme["menu_active_fg"]},
+            },
+            "widgets": {
+                "master": {"bg": theme["bg"]},
+                "book_content": {"bg": theme["reader_bg"], "fg": theme["reader_fg"],
+                                 "font": (theme["font_reader"], theme["font_size_reader"])},
+                "chat_history": {"bg": theme["chat_bg"], "fg": theme["chat_fg"], "font": main_font},
+                "chat_entry": {"font": main_font},
+                "chapter_info": {"font": main_font},
+                "text_panels": panel,
+            },
+            "tags": {
+                ("chat_history", "system"): {"foreground": theme["system_msg"]},
+                ("chat_history", "assistant"): {"foreground": theme["assistant_msg"]},
+                ("chat_history", "user"): {"foreground": theme["user_msg"]},
+            },
+        }
+
+    @staticmethod
+    def diff_styles(old: Optional[Dict[str, Dict]], new: Dict[str, Dict]) -> Dict[str, Dict]:
+        # Only the options whose values differ; everything when nothing was applied yet
+        if old is None:
+            return new
+        changes = {}
+        for section, targets in new.items():
+            old_targets = old.get(section, {})
+            section_changes = {}
+            for target, options in targets.items():
+                old_options = old_targets.get(target, {})
+                changed = {name: value for name, value in options.items() if old_options.get(name) != value}
+                if changed:
+                    section_changes[target] = changed
+            if section_changes:
+                changes[section] = section_changes
+        return changes
+
     def save_theme(self) -> None:
         with open(self.config_file, 'w') as f:
             json.dump({"current_theme": self.current_theme}, f)
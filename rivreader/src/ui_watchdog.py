@@ -0,0 +1,177 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Callable, Dict, List, Optional
+
+HEARTBEAT_MS = 50
+# A heartbeat this much later than scheduled counts as a stall
+STALL_THRESHOLD = 0.1
+SAMPLE_INTERVAL = 0.02
+# Upper bounds (seconds) of the stall histogram buckets; the last one is open
+HISTOGRAM_BOUNDS = (0.25, 0.5, 1.0, 2.0, 5.0)
+RECENT_STALLS = 50
+WORST_STALLS = 10
+STACK_DEPTH = 12
+# Frames from files under this directory are the application's own code
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def histogram_labels(threshold: float = STALL_THRESHOLD) -> List[str]:
+    labels, lower = [], threshold
+    for bound in HISTOGRAM_BOUNDS:
+        labels.append(f"{lower * 1000:g}-{bound * 1000:g}ms")
+        lower = bound
+    labels.append(f">{lower * 1000:g}ms")
+    return labels
+
+
+class StallWatchdog:
+    # Measures how long the Tk main thread goes without servicing its event
+    # loop. A heartbeat rescheduled with after() every interval_ms notes when
+    # it ran; a sampler thread that sees it overdue by more than threshold
+    # takes the main thread's stack from sys._current_frames(). When the
+    # heartbeat finally runs, the gap is recorded as a stall together with the
+    # call site seen most often while it lasted: the innermost frame in the
+    # application's own code. The sampler sleeps until the last heartbeat
+    # would be overdue and only samples every SAMPLE_INTERVAL while it is, so
+    # an idle UI costs one after() callback per interval and one sampler
+    # wakeup per interval plus threshold.
+    def __init__(self, master, interval_ms: int = HEARTBEAT_MS, threshold: float = STALL_THRESHOLD,
+                 in_flight: Optional[Callable[[], int]] = None):
+        self.master = master
+        self.interval = interval_ms / 1000.0
+        self.interval_ms = interval_ms
+        self.threshold = threshold
+        self.in_flight = in_flight
+        self.main_thread_id = threading.main_thread().ident
+        self.started_at = time.monotonic()
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.recent = deque(maxlen=RECENT_STALLS)
+        self.worst: List[Dict] = []
+        self.last_render = None
+        self._last_beat = None
+        self._samples: List[tuple] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._job = None
+
+    def start(self):
+        self.main_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._job = self.master.after(self.interval_ms, self._beat)
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="ui-watchdog", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._job is not None:
+            try:
+                self.master.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+
+    def _beat(self):
+        self._record_beat(time.monotonic())
+        if not self._stop.is_set():
+            self._job = self.master.after(self.interval_ms, self._beat)
+
+    def _record_beat(self, now: float):
+        with self._lock:
+            previous, self._last_beat = self._last_beat, now
+            samples, self._samples = self._samples, []
+        if previous is None:
+            return
+        stall = now - previous - self.interval
+        if stall > self.threshold:
+            self._record_stall(stall, samples)
+
+    def _sample_loop(self):
+        while not self._stop.wait(self._until_overdue()):
+            self._sample()
+
+    def _until_overdue(self) -> float:
+        # Seconds until the heartbeat would be a stall, or the sample interval
+        # once it already is
+        with self._lock:
+            last_beat = self._last_beat
+        if last_beat is None:
+            return SAMPLE_INTERVAL
+        return max(last_beat + self.interval + self.threshold - time.monotonic(), SAMPLE_INTERVAL)
+
+    def _sample(self):
+        with self._lock:
+            last_beat = self._last_beat
+        if last_beat is None or time.monotonic() - last_beat - self.interval <= self.threshold:
+            return
+        frame = sys._current_frames().get(self.main_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+        del frame
+        entry = (self._call_site(stack), tuple(f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in stack))
+        with self._lock:
+            self._samples.append(entry)
+
+    @staticmethod
+    def _call_site(stack) -> str:
+        own = [f for f in stack if f.filename.startswith(APP_ROOT)]
+        frame = (own or list(stack))[-1]
+        return f"{os.path.relpath(frame.filename, APP_ROOT) if own else frame.filename}:{frame.lineno} {frame.name}"
+
+    def _record_stall(self, seconds: float, samples: List[tuple]):
+        sites = Counter(site for site, _ in samples)
+        site = sites.most_common(1)[0][0] if sites else None
+        stack = next((s for call_site, s in samples if call_site == site), ())
+        stall = {"at": round(time.time(), 3), "ms": round(seconds * 1000, 1), "call_site": site,
+                 "samples": len(samples), "stack": list(stack)}
+        with self._lock:
+            self.histogram[bisect.bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+            self.recent.append(stall)
+            self.worst.append(stall)
+            self.worst.sort(key=lambda s: s["ms"], reverse=True)
+            del self.worst[WORST_STALLS:]
+
+    def record_render(self, seconds: float):
+        self.last_render = seconds
+
+    def report(self) -> Dict:
+        with self._lock:
+            histogram = dict(zip(histogram_labels(self.threshold), self.histogram))
+            recent = list(self.recent)
+            worst = list(self.worst)
+        return {
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+            "heartbeat_ms": self.interval_ms,
+            "threshold_ms": self.threshold * 1000,
+            "stalls": sum(histogram.values()),
+            "histogram": histogram,
+            "last_render_ms": round(self.last_render * 1000, 1) if self.last_render is not None else None,
+            "in_flight_requests": self.in_flight() if self.in_flight is not None else None,
+            "worst": worst,
+            "recent": recent
+        }
+
+    def summary_lines(self) -> List[str]:
+        report = self.report()
+        render = report["last_render_ms"]
+        lines = [f"Stalls: {report['stalls']}",
+                 f"Last render: {render:g} ms" if render is not None else "Last render: -",
+                 f"AI requests in flight: {report['in_flight_requests'] or 0}"]
+        lines += [f"  {label}: {count}" for label, count in report["histogram"].items()]
+        if report["worst"]:
+            worst = report["worst"][0]
+            lines.append(f"Worst: {worst['ms']:g} ms at {worst['call_site'] or 'unknown'}")
+        return lines
+
+    def dump(self, path: str) -> str:
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
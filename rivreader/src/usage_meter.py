@@ -0,0 +1,137 @@
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+# Degradation levels, applied in order as a budget is used up
+BUDGET_OK = 0
+BUDGET_STRETCH = 1   # summarize less often
+BUDGET_TRIM = 2      # send smaller contexts
+BUDGET_REFUSE = 3    # refuse new calls
+
+STRETCH_AT = 0.7
+TRIM_AT = 0.85
+
+# Call sites, used as the "feature" in reports
+SITE_CHAT = "chat"
+SITE_SUMMARY = "summary"
+SITE_DIGEST = "digest"
+SITE_CHARACTER = "character_analysis"
+SITE_LITERARY = "literary_analysis"
+SITE_CATCH_UP = "catch_up"
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d")
+
+
+class UsageMeter:
+    # Records input/output tokens per call site, book and session, and turns the
+    # fraction of the session and daily budgets used into a degradation level.
+    # Budgets are in tokens (input + output); None means unlimited. With a
+    # workspace attached, usage is persisted so the daily budget spans sessions.
+    def __init__(self, session_budget: Optional[int] = None, daily_budget: Optional[int] = None,
+                 workspace=None):
+        self.session_budget = session_budget
+        self.daily_budget = daily_budget
+        self.workspace = workspace
+        self.session_id = uuid.uuid4().hex
+        self.session_tokens = 0
+        self._day = today()
+        self._day_tokens = self._load_day_tokens(self._day)
+        self._records: Dict[tuple, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _load_day_tokens(self, day: str) -> int:
+        if self.workspace is None:
+            return 0
+        return sum(row["input_tokens"] + row["output_tokens"] for row in self.workspace.load_usage(day))
+
+    def record(self, site: str, book: Optional[str], input_tokens: int, output_tokens: int):
+        day = today()
+        with self._lock:
+            if day != self._day:
+                self._day = day
+                self._day_tokens = 0
+            entry = self._entry(site, book)
+            entry["calls"] += 1
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            self.session_tokens += input_tokens + output_tokens
+            self._day_tokens += input_tokens + output_tokens
+        if self.workspace is not None:
+            self.workspace.record_usage(day, self.session_id, site, book or "", input_tokens, output_tokens)
+
+    def record_shared(self, site: str, book: Optional[str]):
+        # A call answered by an identical request already in flight: no tokens spent
+        with self._lock:
+            self._entry(site, book)["shared_calls"] += 1
+
+    def _entry(self, site: str, book: Optional[str]) -> Dict[str, int]:
+        return self._records.setdefault((site, book or ""), {"calls": 0, "shared_calls": 0,
+                                                            "input_tokens": 0, "output_tokens": 0})
+
+    def record_response(self, site: str, book: Optional[str], response):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.record(site, book, usage.input_tokens or 0, usage.output_tokens or 0)
+
+    @property
+    def day_tokens(self) -> int:
+        with self._lock:
+            return self._day_tokens if self._day == today() else 0
+
+    def used_fraction(self) -> float:
+        fractions = [0.0]
+        if self.session_budget:
+            fractions.append(self.session_tokens / self.session_budget)
+        if self.daily_budget:
+            fractions.append(self.day_tokens / self.daily_budget)
+        return max(fractions)
+
+    def level(self) -> int:
+        used = self.used_fraction()
+        if used >= 1.0:
+            return BUDGET_REFUSE
+        if used >= TRIM_AT:
+            return BUDGET_TRIM
+        if used >= STRETCH_AT:
+            return BUDGET_STRETCH
+        return BUDGET_OK
+
+    def check(self, site: str):
+        if self.level() >= BUDGET_REFUSE:
+            raise BudgetExceeded(f"Token budget used up; {site} request refused")
+
+    def report(self, by: str = "site") -> List[Dict]:
+        # by: "site", "book" or "site_book". Sorted by total tokens, largest first.
+        grouped: Dict[tuple, Dict[str, int]] = {}
+        with self._lock:
+            records = list(self._records.items())
+        for (site, book), entry in records:
+            key = {"site": (site,), "book": (book,), "site_book": (site, book)}[by]
+            total = grouped.setdefault(key, {"calls": 0, "shared_calls": 0, "input_tokens": 0, "output_tokens": 0})
+            for field in total:
+                total[field] += entry[field]
+        rows = []
+        for key, total in grouped.items():
+            row = dict(zip(("site", "book") if by == "site_book" else (by,), key))
+            row.update(total)
+            row["total_tokens"] = total["input_tokens"] + total["output_tokens"]
+            rows.append(row)
+        rows.sort(key=lambda row: row["total_tokens"], reverse=True)
+        return rows
+
+    def format_report(self) -> str:
+        lines = [f"Session: {self.session_tokens} tokens"
+                 + (f" of {self.session_budget}" if self.session_budget else ""),
+                 f"Today: {self.day_tokens} tokens"
+                 + (f" of {self.daily_budget}" if self.daily_budget else ""), ""]
+        for row in self.report("site"):
+            lines.append(f"{row['site']}: {row['calls']} calls, {row['input_tokens']} in / "
+                         f"{row['output_tokens']} out, {row['shared_calls']} shared")
+        return "\n".join(lines)
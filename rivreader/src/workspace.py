@@ -0,0 +1,465 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from .conversation_log import ConversationLog, CONVERSATION_PAGE_SIZE
+
+WORKSPACE_FILE = "workspace.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    book_hash TEXT PRIMARY KEY,
+    path TEXT,
+    chapter INTEGER NOT NULL DEFAULT 0,
+    word INTEGER NOT NULL DEFAULT 0,
+    absolute_word INTEGER NOT NULL DEFAULT 0,
+    total_words INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    file_size INTEGER,
+    file_mtime REAL,
+    total_chapters INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_books_path ON books (path);
+CREATE TABLE IF NOT EXISTS resume_chapters (
+    book_hash TEXT NOT NULL,
+    chapter INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (book_hash, chapter)
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    book_hash TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    chapter INTEGER NOT NULL,
+    word INTEGER NOT NULL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS summary_checkpoints (
+    book_hash TEXT NOT NULL,
+    chapter INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (book_hash, chapter)
+);
+CREATE TABLE IF NOT EXISTS chapter_fingerprints (
+    book_hash TEXT NOT NULL,
+    chapter INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (book_hash, chapter)
+);
+CREATE TABLE IF NOT EXISTS character_sheets (
+    book_hash TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    chapter INTEGER NOT NULL,
+    word INTEGER NOT NULL,
+    mentions INTEGER NOT NULL,
+    updated_at REAL,
+    PRIMARY KEY (book_hash, name)
+);
+CREATE TABLE IF NOT EXISTS notes (
+    book_hash TEXT PRIMARY KEY,
+    notepad TEXT NOT NULL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS highlights (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_hash TEXT NOT NULL,
+    chapter INTEGER NOT NULL,
+    start_word INTEGER NOT NULL,
+    end_word INTEGER NOT NULL,
+    color TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_highlights_book_chapter ON highlights (book_hash, chapter);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_hash TEXT NOT NULL,
+    user TEXT NOT NULL,
+    ai TEXT NOT NULL,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_book ON messages (book_hash, id);
+CREATE TABLE IF NOT EXISTS conversation_settings (
+    book_hash TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    site TEXT NOT NULL,
+    book TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, session_id, site, book)
+);
+"""
+
+# Columns added after a table was first shipped: (table, column, declaration)
+COLUMN_MIGRATIONS = [
+    ("books", "file_size", "INTEGER"),
+    ("books", "file_mtime", "REAL"),
+    ("books", "total_chapters", "INTEGER"),
+]
+
+
+class Workspace:
+    # One SQLite database per library. Writes are queued and committed together by
+    # flush(), so frequent position/notepad updates cost one transaction per batch.
+    def __init__(self, db_path: str = WORKSPACE_FILE):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._pending: List[Tuple[str, tuple]] = []
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate_columns()
+
+    def _migrate_columns(self):
+        for table, column, declaration in COLUMN_MIGRATIONS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def close(self):
+        # The connection is closed even if the last writes cannot be flushed
+        with self._lock:
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+
+    def _queue(self, sql: str, params: tuple):
+        with self._lock:
+            self._pending.append((sql, params))
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                self._conn.execute("BEGIN")
+                for sql, params in pending:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                # Keep the batch, ahead of anything queued since, for the next flush
+                self._pending[:0] = pending
+                print(f"Error writing workspace: {str(e)}")
+                raise
+
+    def save_position(self, book_hash: str, path: str, chapter: int, word: int, absolute_word: int, total_words: int):
+        self._queue(
+            "INSERT INTO books (book_hash, path, chapter, word, absolute_word, total_words, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(book_hash) DO UPDATE SET path=excluded.path, "
+            "chapter=excluded.chapter, word=excluded.word, absolute_word=excluded.absolute_word, "
+            "total_words=excluded.total_words, updated_at=excluded.updated_at",
+            (book_hash, os.path.abspath(path), chapter, word, absolute_word, total_words, time.time())
+        )
+
+    def save_resume_snapshot(self, book_hash: str, path: str, total_chapters: int, chapters: Dict[int, str]):
+        # Enough to put the reader back on screen before the book is parsed again
+        stat = os.stat(path)
+        self._queue(
+            "UPDATE books SET file_size = ?, file_mtime = ?, total_chapters = ? WHERE book_hash = ?",
+            (stat.st_size, stat.st_mtime, total_chapters, book_hash)
+        )
+        self._queue("DELETE FROM resume_chapters WHERE book_hash = ?", (book_hash,))
+        for chapter, text in chapters.items():
+            self._queue(
+                "INSERT INTO resume_chapters (book_hash, chapter, text) VALUES (?, ?, ?)",
+                (book_hash, chapter, text)
+            )
+
+    def load_resume_snapshot(self, path: str) -> Optional[Dict]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        self.flush()
+        with self._lock:
+            book = self._conn.execute(
+                "SELECT book_hash, chapter, word, absolute_word, total_words, total_chapters, file_size, file_mtime "
+                "FROM books WHERE path = ? ORDER BY updated_at DESC LIMIT 1", (os.path.abspath(path),)
+            ).fetchone()
+            if book is None or book[6] != stat.st_size or book[7] != stat.st_mtime:
+                return None
+            rows = self._conn.execute(
+                "SELECT chapter, text FROM resume_chapters WHERE book_hash = ?", (book[0],)
+            ).fetchall()
+        chapters = dict(rows)
+        if book[1] not in chapters:
+            return None
+        return {
+            "book_hash": book[0],
+            "chapter": book[1],
+            "word": book[2],
+            "absolute_word": book[3],
+            "total_words": book[4],
+            "total_chapters": book[5],
+            "chapters": chapters
+        }
+
+    def save_summary(self, book_hash: str, summary: str, chapter: int, word: int):
+        self._queue(
+            "INSERT OR REPLACE INTO summaries (book_hash, summary, chapter, word, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (book_hash, summary, chapter, word, time.time())
+        )
+
+    def save_summary_checkpoint(self, book_hash: str, chapter: int, summary: str):
+        # The running summary as it stood at the start of chapter
+        self._queue(
+            "INSERT OR REPLACE INTO summary_checkpoints (book_hash, chapter, summary) VALUES (?, ?, ?)",
+            (book_hash, chapter, summary)
+        )
+
+    def load_summary_checkpoints(self, book_hash: str) -> List[Tuple[int, str]]:
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chapter, summary FROM summary_checkpoints WHERE book_hash = ? ORDER BY chapter", (book_hash,)
+            ).fetchall()
+
+    def load_summary_checkpoint(self, book_hash: str, at_or_before: int) -> Optional[Tuple[int, str]]:
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chapter, summary FROM summary_checkpoints WHERE book_hash = ? AND chapter <= ? "
+                "ORDER BY chapter DESC LIMIT 1", (book_hash, at_or_before)
+            ).fetchone()
+
+    def save_fingerprints(self, book_hash: str, fingerprints: List[str]):
+        self._queue("DELETE FROM chapter_fingerprints WHERE book_hash = ?", (book_hash,))
+        for chapter, fingerprint in enumerate(fingerprints):
+            self._queue(
+                "INSERT INTO chapter_fingerprints (book_hash, chapter, fingerprint) VALUES (?, ?, ?)",
+                (book_hash, chapter, fingerprint)
+            )
+
+    def load_fingerprints(self, book_hash: str) -> List[str]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT fingerprint FROM chapter_fingerprints WHERE book_hash = ? ORDER BY chapter", (book_hash,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def save_character_sheet(self, book_hash: str, name: str, sheet: str, chapter: int, word: int, mentions: int):
+        # The sheet as written from the text before (chapter, word), which held mentions of name
+        self._queue(
+            "INSERT OR REPLACE INTO character_sheets (book_hash, name, sheet, chapter, word, mentions, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (book_hash, name, sheet, chapter, word, mentions, time.time())
+        )
+
+    def load_character_sheets(self, book_hash: str) -> List[Dict]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, sheet, chapter, word, mentions FROM character_sheets WHERE book_hash = ? "
+                "ORDER BY mentions DESC", (book_hash,)
+            ).fetchall()
+        return [{"name": r[0], "sheet": r[1], "chapter": r[2], "word": r[3], "mentions": r[4]} for r in rows]
+
+    def move_character_sheets(self, old_hash: str, new_hash: str, before_chapter: int):
+        # Sheets written entirely from chapters that an edit left unchanged
+        self._queue("UPDATE OR REPLACE character_sheets SET book_hash = ? WHERE book_hash = ? "
+                    "AND (chapter < ? OR (chapter = ? AND word = 0))",
+                    (new_hash, old_hash, before_chapter, before_chapter))
+
+    def find_previous_version(self, path: str, book_hash: str) -> Optional[str]:
+        # The most recent other version of the book last opened from path
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT book_hash FROM books WHERE path = ? AND book_hash != ? ORDER BY updated_at DESC LIMIT 1",
+                (os.path.abspath(path), book_hash)
+            ).fetchone()
+        return row[0] if row else None
+
+    def move_book_data(self, old_hash: str, new_hash: str):
+        # Book-level data that does not depend on the text: notes and the conversation
+        self._queue("UPDATE OR REPLACE notes SET book_hash = ? WHERE book_hash = ?", (new_hash, old_hash))
+        self._queue("UPDATE messages SET book_hash = ? WHERE book_hash = ?", (new_hash, old_hash))
+        self._queue("UPDATE OR REPLACE conversation_settings SET book_hash = ? WHERE book_hash = ?",
+                    (new_hash, old_hash))
+
+    def forget_book(self, book_hash: str):
+        for table in ("books", "resume_chapters", "summaries", "summary_checkpoints", "chapter_fingerprints",
+                      "highlights", "character_sheets"):
+            self._queue(f"DELETE FROM {table} WHERE book_hash = ?", (book_hash,))
+
+    def save_notes(self, book_hash: str, notepad: str):
+        self._queue(
+            "INSERT OR REPLACE INTO notes (book_hash, notepad, updated_at) VALUES (?, ?, ?)",
+            (book_hash, notepad, time.time())
+        )
+
+    def add_highlight(self, book_hash: str, chapter: int, start_word: int, end_word: int, color: str, text: str):
+        self._queue(
+            "INSERT INTO highlights (book_hash, chapter, start_word, end_word, color, text, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (book_hash, chapter, start_word, end_word, color, text, time.time())
+        )
+
+    def get_highlights(self, book_hash: str, chapter: Optional[int] = None) -> List[Dict]:
+        self.flush()
+        sql = "SELECT chapter, start_word, end_word, color, text FROM highlights WHERE book_hash = ?"
+        params: tuple = (book_hash,)
+        if chapter is not None:
+            sql += " AND chapter = ?"
+            params += (chapter,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY chapter, start_word", params).fetchall()
+        return [{"chapter": r[0], "start_word": r[1], "end_word": r[2], "color": r[3], "text": r[4]} for r in rows]
+
+    def load_book_state(self, book_hash: str) -> Optional[Dict]:
+        self.flush()
+        with self._lock:
+            book = self._conn.execute(
+                "SELECT path, chapter, word, absolute_word, total_words FROM books WHERE book_hash = ?", (book_hash,)
+            ).fetchone()
+            if book is None:
+                return None
+            summary = self._conn.execute(
+                "SELECT summary, chapter, word FROM summaries WHERE book_hash = ?", (book_hash,)
+            ).fetchone()
+            notes = self._conn.execute("SELECT notepad FROM notes WHERE book_hash = ?", (book_hash,)).fetchone()
+        return {
+            "path": book[0],
+            "chapter": book[1],
+            "word": book[2],
+            "absolute_word": book[3],
+            "total_words": book[4],
+            "summary": summary[0] if summary else "",
+            "summary_position": (summary[1], summary[2]) if summary else None,
+            "notepad": notes[0] if notes else "",
+            "highlights": self.get_highlights(book_hash)
+        }
+
+    def append_exchanges(self, book_hash: str, exchanges: List[Dict[str, str]]):
+        now = time.time()
+        for e in exchanges:
+            self._queue(
+                "INSERT INTO messages (book_hash, user, ai, created_at) VALUES (?, ?, ?, ?)",
+                (book_hash, e["user"], e["ai"], e.get("time", now))
+            )
+        self.flush()
+
+    def read_messages_before(self, book_hash: str, before_id: Optional[int], limit: int) -> Tuple[List[Dict[str, str]], int]:
+        self.flush()
+        with self._lock:
+            if before_id is None:
+                rows = self._conn.execute(
+                    "SELECT id, user, ai, created_at FROM messages WHERE book_hash = ? ORDER BY id DESC LIMIT ?",
+                    (book_hash, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, user, ai, created_at FROM messages WHERE book_hash = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                    (book_hash, before_id, limit)
+                ).fetchall()
+            rows.reverse()
+            cursor = rows[0][0] if rows else 0
+            if rows and not self._conn.execute(
+                "SELECT 1 FROM messages WHERE book_hash = ? AND id < ? LIMIT 1", (book_hash, cursor)
+            ).fetchone():
+                cursor = 0
+        return [{"user": r[1], "ai": r[2], "time": r[3]} for r in rows], cursor
+
+    def has_messages(self, book_hash: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM messages WHERE book_hash = ? LIMIT 1", (book_hash,)).fetchone() is not None
+
+    def save_conversation_settings(self, book_hash: str, settings: Dict):
+        self._queue(
+            "INSERT OR REPLACE INTO conversation_settings (book_hash, data) VALUES (?, ?)",
+            (book_hash, json.dumps(settings))
+        )
+        self.flush()
+
+    def load_conversation_settings(self, book_hash: str) -> Optional[Dict]:
+        self.flush()
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM conversation_settings WHERE book_hash = ?", (book_hash,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record_usage(self, day: str, session_id: str, site: str, book: str, input_tokens: int, output_tokens: int):
+        self._queue(
+            "INSERT INTO usage (day, session_id, site, book, calls, input_tokens, output_tokens) "
+            "VALUES (?, ?, ?, ?, 1, ?, ?) ON CONFLICT (day, session_id, site, book) DO UPDATE SET "
+            "calls = calls + 1, input_tokens = input_tokens + excluded.input_tokens, "
+            "output_tokens = output_tokens + excluded.output_tokens",
+            (day, session_id, site, book, input_tokens, output_tokens)
+        )
+
+    def load_usage(self, day: str) -> List[Dict]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT site, book, SUM(calls), SUM(input_tokens), SUM(output_tokens) FROM usage "
+                "WHERE day = ? GROUP BY site, book", (day,)
+            ).fetchall()
+        return [{"site": r[0], "book": r[1], "calls": r[2], "input_tokens": r[3], "output_tokens": r[4]} for r in rows]
+
+
+class WorkspaceConversationLog:
+    # Same interface as ConversationLog, backed by the workspace messages table.
+    # Cursors are message ids rather than byte offsets.
+    def __init__(self, workspace: Workspace, book_hash: str, directory: str, book_name: str):
+        self.workspace = workspace
+        self.book_hash = book_hash
+        self.directory = directory
+        self.book_name = book_name
+
+    def open(self):
+        legacy = ConversationLog(self.directory, self.book_name)
+        if legacy.exists() and not self.workspace.has_messages(self.book_hash):
+            self._migrate(legacy)
+
+    def close(self):
+        pass
+
+    def exists(self) -> bool:
+        return (self.workspace.has_messages(self.book_hash)
+                or self.workspace.load_conversation_settings(self.book_hash) is not None
+                or ConversationLog(self.directory, self.book_name).exists())
+
+    def append_exchange(self, user: str, ai: str):
+        self.append_exchanges([{"user": user, "ai": ai}])
+
+    def append_exchanges(self, exchanges: List[Dict[str, str]]):
+        self.workspace.append_exchanges(self.book_hash, exchanges)
+
+    def write_settings(self, settings: Dict):
+        self.workspace.save_conversation_settings(self.book_hash, settings)
+
+    def read_settings(self) -> Optional[Dict]:
+        return self.workspace.load_conversation_settings(self.book_hash)
+
+    def read_recent(self, limit: int = CONVERSATION_PAGE_SIZE) -> Tuple[List[Dict[str, str]], int]:
+        return self.workspace.read_messages_before(self.book_hash, None, limit)
+
+    def read_before(self, cursor: int, limit: int = CONVERSATION_PAGE_SIZE) -> Tuple[List[Dict[str, str]], int]:
+        if cursor <= 0:
+            return [], 0
+        return self.workspace.read_messages_before(self.book_hash, cursor, limit)
+
+    def _migrate(self, legacy: ConversationLog):
+        legacy.open()
+        exchanges = legacy.read_all()
+        settings = legacy.read_settings()
+        legacy.close()
+        if exchanges:
+            self.workspace.append_exchanges(self.book_hash, exchanges)
+        if settings:
+            self.workspace.save_conversation_settings(self.book_hash, settings)
+        for path in (legacy.path, legacy.settings_path):
+            if os.path.exists(path):
+                os.replace(path, path + ".migrated")
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from src.book_store import BookStore
+from src.fake_model import FakeAnthropic
+from src.reading_companion import ReadingCompanion
+
+
+class BrokenCompanion(ReadingCompanion):
+    # Fails part way through __init__, after the book was acquired
+    @property
+    def _autosave_settings(self):
+        raise RuntimeError("broken")
+
+
+class TestBookStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "book.txt")
+        with open(self.path, 'w') as f:
+            f.write("Chapter 1\n\n" + ' '.join(f"a{i}" for i in range(50)) + "\n\nChapter 2\n\n"
+                    + ' '.join(f"b{i}" for i in range(50)))
+        self.store = BookStore()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_copies_of_a_book_share_one_parse(self):
+        copy = os.path.join(self.temp_dir, "renamed.txt")
+        shutil.copy(self.path, copy)
+        first = self.store.acquire(self.path)
+        second = self.store.acquire(copy)
+        self.assertIs(first, second)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.refcount(first.book_hash), 2)
+
+        self.store.release(first)
+        self.assertEqual(len(self.store), 1)
+        self.store.release(second)
+        self.assertEqual(len(self.store), 0)
+        self.assertIsNot(self.store.acquire(self.path), first)
+
+    def test_readers_share_chapters_but_not_positions(self):
+        book = self.store.acquire(self.path)
+        one, two = book.reader(self.path), book.reader(self.path)
+        self.assertIs(one.chapters, two.chapters)
+        one.move_to_next_chapter()
+        one.update_current_word(5)
+        self.assertEqual((two.current_chapter, two.current_word), (0, 0))
+        with self.assertRaises(TypeError):
+            one.chapters[0]['words'] = []
+        with self.assertRaises(AttributeError):
+            one.chapters[0]['words'].append("x")
+
+    def test_failed_companion_releases_its_book(self):
+        with self.assertRaises(RuntimeError):
+            BrokenCompanion(self.path, "test-key", model_client=FakeAnthropic(latency=0), book_store=self.store)
+        self.assertEqual(len(self.store), 0)
+        companion = ReadingCompanion(self.path, "test-key", model_client=FakeAnthropic(latency=0),
+                                     book_store=self.store)
+        self.assertEqual(self.store.refcount(companion.parsed_book.book_hash), 1)
+        companion.close()
+
+    def test_concurrent_first_opens_get_the_same_book(self):
+        books = []
+        lock = threading.Lock()
+
+        def open_book():
+            book = self.store.acquire(self.path)
+            with lock:
+                books.append(book)
+        threads = [threading.Thread(target=open_book) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(book) for book in books}), 1)
+        self.assertEqual(self.store.refcount(books[0].book_hash), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
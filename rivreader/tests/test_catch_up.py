@@ -0,0 +1,169 @@
+import re
+import unittest
+import threading
+from src.catch_up import map_reduce_summaries, merge_calls
+from src.context_manager import ContextManager
+
+
+class FakeReader:
+    def __init__(self, chapter_count, words_per_chapter):
+        self.chapters = [{'words': [f"c{c}w{i}" for i in range(words_per_chapter)], 'word_count': words_per_chapter}
+                         for c in range(chapter_count)]
+        self.current_chapter = 0
+        self.current_word = 0
+
+    def get_current_chapter_number(self):
+        return self.current_chapter + 1
+
+    def get_current_word_index(self):
+        return self.current_word
+
+    def get_current_chapter_content_up_to_word(self):
+        return ' '.join(self.chapters[self.current_chapter]['words'][:self.current_word])
+
+
+class TestCatchUp(unittest.TestCase):
+
+    def test_merge_calls(self):
+        self.assertEqual([merge_calls(n) for n in range(1, 8)], [0, 1, 2, 3, 4, 5, 6])
+
+    def test_map_reduce_keeps_order_and_reports_progress(self):
+        progress = []
+        lock = threading.Lock()
+        merges = []
+
+        def merge(parts):
+            with lock:
+                merges.append(len(parts))
+            return "(" + "+".join(parts) + ")"
+
+        result = map_reduce_summaries([f"s{i}" for i in range(5)], lambda text: text.upper(), merge,
+                                      prefix="P", on_progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual(result, "(((P+S0)+(S1+S2))+(S3+S4))")
+        self.assertEqual(progress[-1], (10, 10))
+        self.assertEqual([done for done, _ in progress], list(range(1, 11)))
+        self.assertEqual(len(merges), 5)
+
+    def test_failed_call_raises(self):
+        def summarize(text):
+            if text == "bad":
+                raise ValueError("model error")
+            return text
+        with self.assertRaises(ValueError):
+            map_reduce_summaries(["good", "bad"], summarize, "".join)
+
+    def test_jump_summarizes_skipped_chapters_into_running_summary(self):
+        reader = FakeReader(6, 10)
+        manager = ContextManager(reader, "test-key")
+        manager.read_ahead.cancel()
+        manager.replace_summary("so far", 4)
+        manager.state.transition(4, 0, 40)
+        sections = manager.catch_up_sections(4)
+        self.assertEqual(sections, [(0, 4), (1, 0), (2, 0), (3, 0)])
+        self.assertEqual(manager.catch_up_sections(0), [])
+
+        calls = []
+        def fake_call(prompt, timeout=None):
+            calls.append(prompt)
+            return "merged" if "Part 1:" in prompt else "section"
+        manager._catch_up_call = fake_call
+        self.assertTrue(manager.catch_up(sections))
+        self.assertEqual(manager.get_dynamic_summary(), "merged")
+        section_prompts = [p for p in calls if "Part 1:" not in p]
+        self.assertEqual(len(section_prompts), 4)
+        self.assertTrue(any("c0w4" in p and "c0w3" not in p for p in section_prompts))
+        self.assertFalse(any("c4w0" in p for p in calls))
+        manager.read_ahead.cancel()
+
+    def test_catch_up_is_discarded_when_reader_goes_back(self):
+        reader = FakeReader(6, 10)
+        manager = ContextManager(reader, "test-key")
+        manager.read_ahead.cancel()
+        manager.state.transition(4, 0, 40)
+        sections = manager.catch_up_sections(4)
+
+        def fake_call(prompt, timeout=None):
+            # The reader jumps back to chapter 2 while the catch-up is running
+            manager.state.transition(1, 0, 10)
+            return "spoiler"
+        manager._catch_up_call = fake_call
+        self.assertFalse(manager.catch_up(sections))
+        self.assertEqual(manager.get_dynamic_summary(), "")
+        # Only the chapter the reader is still past waits for the next catch-up
+        self.assertEqual(manager.pending_catch_up, [(0, 0)])
+        manager.read_ahead.cancel()
+
+    def test_moving_on_during_catch_up_keeps_the_result(self):
+        reader = FakeReader(6, 10)
+        manager = ContextManager(reader, "test-key")
+        manager.read_ahead.cancel()
+        manager.replace_summary("so far", 0)
+        reader.current_chapter = 3
+        manager.update_context(0)
+        manager.state.transition(3, 0, 30)
+        sections, manager.pending_catch_up = manager.pending_catch_up, []
+        self.assertEqual(sections, [(0, 0), (1, 0), (2, 0)])
+
+        def fake_call(prompt, timeout=None):
+            # The reader presses Next while the catch-up is running
+            if reader.current_chapter == 3:
+                reader.current_chapter = 4
+                manager.update_context(0)
+                manager.state.transition(4, 0, 40)
+            return "merged" if "Part 1:" in prompt else "section"
+        manager._catch_up_call = fake_call
+        self.assertTrue(manager.catch_up(sections))
+        self.assertEqual(manager.get_dynamic_summary(), "merged")
+        self.assertEqual(manager.pending_catch_up, [(3, 0)])
+        manager.read_ahead.cancel()
+
+    def test_going_back_then_forward_summarizes_nothing_twice(self):
+        reader = FakeReader(6, 10)
+        manager = ContextManager(reader, "test-key")
+        manager.read_ahead.cancel()
+        calls = []
+
+        def fake_call(prompt, timeout=None):
+            calls.append(prompt)
+            if "Part 1:" in prompt:
+                return "+".join(re.findall(r"Part \d+:\n(\S+)", prompt))
+            return re.search(r"\b(c\d)w\d", prompt).group(1)
+        manager._catch_up_call = fake_call
+
+        def move_to(chapter):
+            reader.current_chapter = chapter
+            manager.update_context(0)
+            manager.state.transition(chapter, 0, chapter * 10)
+
+        def catch_up():
+            sections, manager.pending_catch_up = manager.pending_catch_up, []
+            self.assertTrue(manager.catch_up(sections))
+            manager.read_ahead.cancel()
+
+        move_to(1)
+        catch_up()
+        move_to(4)
+        catch_up()
+        self.assertEqual(manager.get_dynamic_summary(), "c0+c1+c2+c3")
+        self.assertEqual(manager.summary_position, (4, 0))
+
+        # Back to chapter 2: the summary falls back to the start of chapter 1
+        move_to(2)
+        self.assertEqual(manager.get_dynamic_summary(), "c0")
+        self.assertEqual(manager.pending_catch_up, [(1, 0)])
+        move_to(3)
+        self.assertEqual(manager.pending_catch_up, [(1, 0), (2, 0)])
+        calls.clear()
+        catch_up()
+        self.assertEqual(manager.get_dynamic_summary(), "c0+c1+c2")
+        self.assertEqual(len([prompt for prompt in calls if "Part 1:" not in prompt]), 2)
+
+        # Forward past where the summary reached before: nothing is summarized again
+        move_to(5)
+        self.assertEqual(manager.get_dynamic_summary(), "c0+c1+c2+c3")
+        self.assertEqual(manager.pending_catch_up, [(4, 0)])
+        manager.read_ahead.cancel()
+
+
+if __name__ == '__main__':
+    unittest.main()
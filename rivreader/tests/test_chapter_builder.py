@@ -0,0 +1,66 @@
+import unittest
+import tempfile
+import os
+from src.chapter_builder import ChapterBuilder, is_chapter_heading, split_text_paragraphs
+from src.document_reader import DocumentReader
+
+
+class TestChapterBuilder(unittest.TestCase):
+
+    def test_heading_patterns(self):
+        for heading in ["Chapter 1", "CHAPTER XII. The Storm", "Part Two", "IV.", "XLIX", "Prologue", "12",
+                        "chapter iv"]:
+            self.assertTrue(is_chapter_heading(heading), heading)
+        for text in ["Chapter one was the hardest part of the book to write, she said to him quietly that night.",
+                     "It was the best of times.", "Invented", "Did.", "Mild.", "Vivid.", "iv.", "DID.", "MILD"]:
+            self.assertFalse(is_chapter_heading(text), text)
+
+    def test_splits_on_detected_headings(self):
+        builder = ChapterBuilder()
+        builder.add_text("Title Page\n\nChapter 1\nThe Start\n\nFirst words here.\n\nCHAPTER II\n\nSecond words.")
+        chapters = builder.finish()
+        self.assertEqual([c['title'] for c in chapters], [None, "Chapter 1", "CHAPTER II"])
+        self.assertEqual(chapters[1]['text'], "Chapter 1\n\nThe Start\n\nFirst words here.")
+        self.assertEqual(chapters[2]['word_count'], 4)
+
+    def test_explicit_heading_levels(self):
+        builder = ChapterBuilder(heading_levels=2)
+        builder.add_paragraph("Opening", 1)
+        builder.add_paragraph("Body one.")
+        builder.add_paragraph("Minor", 3)
+        builder.add_paragraph("Body two.")
+        builder.add_paragraph("Next", 2)
+        builder.add_paragraph("Body three.")
+        chapters = builder.finish()
+        self.assertEqual([c['title'] for c in chapters], ["Opening", "Next"])
+        self.assertEqual([b['heading'] for b in chapters[0]['blocks']], [1, None, None, None])
+
+    def test_oversized_sections_are_sub_chunked(self):
+        builder = ChapterBuilder(max_words=10)
+        builder.add_paragraph("Chapter 1")
+        for _ in range(5):
+            builder.add_paragraph("one two three four")
+        builder.add_paragraph(" ".join(["word"] * 25))
+        chapters = builder.finish()
+        self.assertTrue(all(c['word_count'] <= 10 for c in chapters))
+        self.assertEqual(sum(c['word_count'] for c in chapters), 2 + 20 + 25)
+        self.assertEqual(chapters[1]['title'], "Chapter 1 (2)")
+        for chapter in chapters:
+            for block in chapter['blocks']:
+                self.assertEqual(chapter['text'][block['start']:block['end']], block['text'])
+
+    def test_line_per_paragraph_text(self):
+        self.assertEqual(split_text_paragraphs("One.\nTwo.\nThree."), ["One.", "Two.", "Three."])
+
+    def test_document_reader_txt(self):
+        with tempfile.NamedTemporaryFile('w', delete=False, suffix='.txt', encoding='utf-8') as f:
+            f.write("Chapter 1\n\nA short opening.\n\nChapter 2\n\nAnd the ending.\n")
+        try:
+            reader = DocumentReader(f.name)
+            self.assertEqual(reader.get_total_chapters(), 2)
+            self.assertEqual(reader.chapters[1]['title'], "Chapter 2")
+        finally:
+            os.unlink(f.name)
+
+if __name__ == '__main__':
+    unittest.main()
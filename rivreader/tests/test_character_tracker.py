@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.reading_companion import ReadingCompanion
+from src.fake_model import FakeAnthropic
+from src.workspace import Workspace
+
+
+class FakeTimer:
+    # Stands in for threading.Timer; fire() runs the callback
+    started = []
+
+    def __init__(self, interval, function):
+        self.interval = interval
+        self.function = function
+        self.cancelled = False
+        self.daemon = False
+
+    def start(self):
+        FakeTimer.started.append(self)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def fire(self):
+        self.function()
+
+
+class RecordingModel(FakeAnthropic):
+
+    def __init__(self):
+        super().__init__(latency=0)
+        self.prompts = []
+
+    def with_options(self, timeout=None):
+        return self
+
+    def respond(self, request):
+        self.prompts.append(request["messages"][-1]["content"])
+        return super().respond(request)
+
+
+def book_text():
+    chapters = [
+        "Anna met Boris at the station. Anna smiled. Boris waved at Anna.",
+        "Later Anna wrote to Boris. Anna waited. The letter from Anna reached Boris.",
+        "Anna left the city. Anna never wrote again, and Anna forgot the station.",
+    ]
+    return "\n\n".join(f"Chapter {i + 1}\n\n{text}" for i, text in enumerate(chapters))
+
+
+class TestCharacterTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "book.txt")
+        with open(self.path, 'w') as f:
+            f.write(book_text())
+        self.workspace = Workspace(os.path.join(self.temp_dir, "workspace.db"))
+        self.companions = []
+
+    def tearDown(self):
+        for companion in self.companions:
+            companion.close()
+        self.workspace.close()
+        shutil.rmtree(self.temp_dir)
+
+    def open(self):
+        model = RecordingModel()
+        companion = ReadingCompanion(self.path, "test-key", model_client=model)
+        companion.characters.idle_delay = 3600
+        companion.attach_workspace(self.workspace)
+        self.companions.append(companion)
+        return companion, model
+
+    def end_of_chapter(self, companion, chapter):
+        return companion.chapter_offsets[chapter] + companion.document_reader.chapters[chapter]['word_count'] - 1
+
+    def test_updates_send_only_the_new_passages(self):
+        companion, model = self.open()
+        companion.update_progress(self.end_of_chapter(companion, 0))
+        first = companion.analyze_character("Anna")
+        self.assertIn("Context:", model.prompts[-1])
+        # Nothing new read: the stored sheet comes back without a call
+        self.assertEqual(companion.analyze_character("Anna"), first)
+        self.assertEqual(len(model.prompts), 1)
+
+        companion.update_progress(self.end_of_chapter(companion, 1))
+        companion.analyze_character("Anna")
+        prompt = model.prompts[-1]
+        self.assertIn(first, prompt)
+        self.assertIn("[Chapter 2]", prompt)
+        self.assertNotIn("[Chapter 1]", prompt)
+
+    def test_cast_is_read_from_the_workspace_without_model_calls(self):
+        companion, _ = self.open()
+        companion.update_progress(self.end_of_chapter(companion, 1))
+        sheet = companion.characters.update("Anna")
+        self.workspace.flush()
+
+        reopened, model = self.open()
+        reopened.restore_state()
+        cast = {entry["name"]: entry for entry in reopened.characters.cast()}
+        self.assertEqual(cast["Anna"]["sheet"], sheet)
+        self.assertEqual(cast["Anna"]["new_mentions"], 0)
+        self.assertIsNone(cast["Boris"]["sheet"])
+        self.assertEqual(model.prompts, [])
+
+        # Going back hides the sheet written from chapters not reached now
+        reopened.move_to_chapter(0)
+        self.assertIsNone(reopened.characters.sheet("Anna"))
+
+    def test_refresh_updates_characters_with_enough_new_mentions(self):
+        companion, model = self.open()
+        companion.update_progress(self.end_of_chapter(companion, 0))
+        self.assertEqual(companion.characters.due(), ["Anna"])
+        self.assertEqual(companion.characters.refresh(), 1)
+        companion.update_progress(self.end_of_chapter(companion, 2))
+        self.assertEqual(companion.characters.due(), ["Anna", "Boris"])
+        self.assertEqual(companion.characters.refresh(), 2)
+        self.assertEqual(companion.characters.due(), [])
+        self.assertEqual(len(model.prompts), 3)
+
+    def test_sheets_updated_with_aliases_are_not_counted_ahead(self):
+        companion, _ = self.open()
+        companion.update_progress(self.end_of_chapter(companion, 0))
+        companion.analyze_character("Anna", aliases=["Boris"])
+        cast = {entry["name"]: entry for entry in companion.characters.cast()}
+        self.assertEqual(cast["Anna"]["new_mentions"], 0)
+        companion.update_progress(self.end_of_chapter(companion, 1))
+        self.assertEqual(companion.characters.due(), ["Anna", "Boris"])
+
+    def test_background_refresh_waits_for_the_reader_to_be_idle(self):
+        companion, _ = self.open()
+        refreshes = []
+        companion.characters.refresh = lambda: refreshes.append(True)
+        companion.characters.timer_factory = FakeTimer
+        FakeTimer.started.clear()
+        companion.move_to_chapter(1)
+        for word in range(1, 4):
+            companion.update_progress(companion.chapter_offsets[1] + word)
+        # Every position update restarted the idle timer
+        self.assertEqual(len(FakeTimer.started), 4)
+        self.assertEqual([timer.cancelled for timer in FakeTimer.started], [True, True, True, False])
+        self.assertEqual(refreshes, [])
+        FakeTimer.started[-1].fire()
+        self.assertEqual(refreshes, [True])
+        # Moving within the chapter afterwards does not schedule another refresh
+        companion.update_progress(companion.chapter_offsets[1] + 5)
+        self.assertEqual(len(FakeTimer.started), 4)
+
+if __name__ == '__main__':
+    unittest.main()
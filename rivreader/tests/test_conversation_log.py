@@ -0,0 +1,53 @@
+import unittest
+import tempfile
+import shutil
+import json
+import os
+from src.conversation_log import ConversationLog
+
+
+class TestConversationLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = ConversationLog(self.directory, "book.txt")
+        self.log.open()
+
+    def tearDown(self):
+        self.log.close()
+        shutil.rmtree(self.directory)
+
+    def test_paging_backwards(self):
+        for i in range(120):
+            self.log.append_exchange(f"question {i}", f"answer {i}" + " padding" * i)
+        recent, cursor = self.log.read_recent(50)
+        self.assertEqual([e["user"] for e in recent], [f"question {i}" for i in range(70, 120)])
+        older, cursor = self.log.read_before(cursor, 50)
+        self.assertEqual(older[0]["user"], "question 20")
+        oldest, cursor = self.log.read_before(cursor, 50)
+        self.assertEqual([e["user"] for e in oldest], [f"question {i}" for i in range(20)])
+        self.assertEqual(cursor, 0)
+        self.assertEqual(self.log.read_before(cursor, 50), ([], 0))
+
+    def test_torn_last_line_is_ignored(self):
+        self.log.append_exchange("first", "one")
+        self.log.close()
+        with open(self.log.path, 'ab') as f:
+            f.write(b'{"user": "half')
+        self.log.open()
+        self.log.append_exchange("second", "two")
+        self.assertEqual([e["user"] for e in self.log.read_all()], ["first", "second"])
+
+    def test_migrates_legacy_json(self):
+        legacy = ConversationLog(self.directory, "old.epub")
+        with open(legacy.legacy_path, 'w') as f:
+            json.dump({"conversation_history": [{"user": "hi", "ai": "Assistant: hello"}],
+                       "system_prompt": "Be brief.", "additional_context": ["a", "", ""], "ai_name": "Sage"}, f)
+        legacy.open()
+        self.assertEqual(legacy.read_recent()[0], [{"user": "hi", "ai": "Assistant: hello", "time": 0}])
+        self.assertEqual(legacy.read_settings()["ai_name"], "Sage")
+        self.assertFalse(os.path.exists(legacy.legacy_path))
+        legacy.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import threading
+from src.conversation_memory import ConversationMemory, estimate_tokens
+
+
+class TestConversationMemory(unittest.TestCase):
+
+    def test_recent_turns_stay_under_cap_and_overflow_is_folded(self):
+        prompts = []
+        def fold(prompt):
+            prompts.append(prompt)
+            return f"digest {len(prompts)}"
+        memory = ConversationMemory(fold, recent_token_cap=100)
+        for i in range(20):
+            memory.add_exchange({"user": f"question {i} " + "x" * 40, "ai": f"Sage: answer {i} " + "y" * 80, "time": i})
+            memory.wait_idle()
+        context = memory.build_context("Sage")
+        recent = context.split("Recent conversation:\n")[1]
+        self.assertLessEqual(estimate_tokens(recent), 130)
+        self.assertIn("question 19", recent)
+        self.assertNotIn("question 0 ", recent)
+        self.assertNotIn("Sage: Sage:", context)
+        self.assertTrue(context.startswith("Earlier conversation (digest):\ndigest"))
+        self.assertIn("question 0 ", prompts[0])
+        self.assertEqual(memory.digest_through, 20 - len(memory._recent) - 1)
+
+    def test_build_context_does_not_wait_for_fold(self):
+        release = threading.Event()
+        def slow_fold(prompt):
+            release.wait(5)
+            return "late digest"
+        memory = ConversationMemory(slow_fold, recent_token_cap=20)
+        for i in range(5):
+            memory.add_exchange({"user": "q" * 40, "ai": "a" * 40, "time": i})
+        self.assertNotIn("late digest", memory.build_context("Assistant"))
+        release.set()
+        memory.wait_idle(5)
+        memory.wait_idle(5)
+        self.assertIn("late digest", memory.build_context("Assistant"))
+
+    def test_load_skips_already_digested(self):
+        memory = ConversationMemory(lambda prompt: "")
+        memory.load([{"user": "old", "ai": "a", "time": 1}, {"user": "new", "ai": "b", "time": 3}], "digest", 2)
+        context = memory.build_context("Assistant")
+        self.assertNotIn("old", context)
+        self.assertIn("new", context)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from src.docx_extractor import iter_docx_paragraphs, style_heading_level
+from src.document_reader import DocumentReader
+
+NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+STYLES = f"""<?xml version="1.0" encoding="UTF-8"?>
+<w:styles {NS}>
+  <w:style w:type="paragraph" w:styleId="Normal"><w:name w:val="Normal"/></w:style>
+  <w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>
+  <w:style w:type="paragraph" w:styleId="berschrift2"><w:name w:val="Überschrift 2"/>
+    <w:pPr><w:outlineLvl w:val="1"/></w:pPr></w:style>
+  <w:style w:type="character" w:styleId="Title"><w:name w:val="Title"/></w:style>
+</w:styles>"""
+
+DOCUMENT = f"""<?xml version="1.0" encoding="UTF-8"?>
+<w:document {NS}>
+  <w:body>
+    <w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>Chapter One</w:t></w:r></w:p>
+    <w:p><w:pPr><w:tabs><w:tab w:val="left" w:pos="720"/></w:tabs></w:pPr>
+      <w:r><w:t xml:space="preserve">Call me </w:t></w:r>
+      <w:hyperlink><w:r><w:t>Ishmael</w:t></w:r></w:hyperlink>
+      <w:r><w:tab/><w:t>.</w:t><w:br/></w:r>
+      <w:r><w:drawing><w:txbxContent><w:p><w:r><w:t>sidebar</w:t></w:r></w:p></w:txbxContent></w:drawing></w:r>
+    </w:p>
+    <w:tbl><w:tr><w:tc><w:p><w:r><w:t>table cell</w:t></w:r></w:p></w:tc></w:tr></w:tbl>
+    <w:p><w:pPr><w:pStyle w:val="berschrift2"/></w:pPr><w:r><w:t>Teil</w:t></w:r></w:p>
+    <w:p/>
+    <w:sectPr/>
+  </w:body>
+</w:document>"""
+
+
+class TestDocxExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "book.docx")
+        with zipfile.ZipFile(self.path, 'w') as archive:
+            archive.writestr("word/document.xml", DOCUMENT)
+            archive.writestr("word/styles.xml", STYLES)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_style_heading_level(self):
+        self.assertEqual(style_heading_level("Title"), 1)
+        self.assertEqual(style_heading_level("heading 3"), 3)
+        self.assertEqual(style_heading_level("Heading"), 1)
+        self.assertIsNone(style_heading_level("Normal"))
+
+    def test_streams_body_paragraphs_with_heading_levels(self):
+        self.assertEqual(list(iter_docx_paragraphs(self.path)), [
+            ("Chapter One", 1),
+            ("Call me Ishmael\t.\n", None),
+            ("Teil", 2),
+            ("", None),
+        ])
+
+    def test_document_reader_builds_chapters_from_stream(self):
+        reader = DocumentReader(self.path)
+        self.assertEqual(reader.chapters[0]['title'], "Chapter One")
+        self.assertIn("Call me Ishmael", reader.chapters[0]['text'])
+        self.assertNotIn("sidebar", reader.chapters[0]['text'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.entity_index import EntityIndex, name_token
+from src.reading_companion import ReadingCompanion
+from src.fake_model import FakeAnthropic
+
+
+def chapter(text):
+    words = text.split()
+    return {'text': text, 'words': words, 'word_count': len(words)}
+
+
+CHAPTERS = [
+    chapter("It was cold. Mr. Darcy arrived at Netherfield with Bingley. The ball began and "
+            "Elizabeth watched Darcy refuse to dance. The evening ended."),
+    chapter("Elizabeth Bennet walked to Netherfield. " + "filler " * 200 + "Darcy admired her eyes."),
+    chapter("Darcy proposed to Elizabeth at Hunsford and was refused."),
+]
+
+
+class TestEntityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = EntityIndex(CHAPTERS)
+
+    def test_name_token_strips_punctuation_and_possessives(self):
+        self.assertEqual(name_token("“Darcy’s"), "Darcy")
+        self.assertEqual(name_token("Bingley,"), "Bingley")
+
+    def test_names_skip_sentence_starts_and_titles(self):
+        names = dict(self.index.names((2, 0)))
+        self.assertIn("Darcy", names)
+        self.assertIn("Elizabeth", names)
+        self.assertNotIn("The", names)
+        self.assertNotIn("Mr", names)
+
+    def test_mentions_stop_at_the_reader_position(self):
+        self.assertEqual([c for c, _ in self.index.mentions("Mr. Darcy", (1, 0))], [0, 0])
+        self.assertEqual([c for c, _ in self.index.mentions("Mr. Darcy", (1, 205))], [0, 0])
+        self.assertEqual([c for c, _ in self.index.mentions("Mr. Darcy", (1, 206))], [0, 0, 1])
+        self.assertEqual(self.index.mentions("Hunsford", (1, 999)), [])
+        # Chapters past the position are never indexed
+        self.assertNotIn(2, self.index._chapters)
+        self.assertEqual(len(self.index.mentions("Darcy", (2, 1))), 4)
+
+    def test_context_respects_budget_and_reading_order(self):
+        context = self.index.context_for("Darcy", (2, 99), window=5)
+        self.assertLess(context.index("[Chapter 1]"), context.index("[Chapter 3]"))
+        self.assertIn("Hunsford", context)
+        small = self.index.context_for("Darcy", (2, 99), window=5, token_budget=20)
+        self.assertEqual(small.count("[Chapter"), 1)
+        # The first appearance wins when only one passage fits
+        self.assertIn("[Chapter 1]", small)
+        self.assertEqual(self.index.context_for("Nobody", (2, 99)), "")
+
+
+class TestCompanionCharacterContext(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        path = os.path.join(self.temp_dir, "book.txt")
+        with open(path, 'w') as f:
+            f.write("\n\n".join(f"Chapter {i + 1}\n\n{c['text']}" for i, c in enumerate(CHAPTERS)))
+        self.companion = ReadingCompanion(path, "test-key", model_client=FakeAnthropic(latency=0))
+
+    def tearDown(self):
+        self.companion.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_context_is_assembled_from_what_has_been_read(self):
+        self.assertEqual(self.companion.analyze_character("Darcy"), "Darcy has not appeared in the text read so far.")
+        self.companion.move_to_chapter(1)
+        self.assertEqual(self.companion.analyze_character("Hunsford"),
+                         "Hunsford has not appeared in the text read so far.")
+        self.assertFalse(self.companion.analyze_character("Darcy").endswith("so far."))
+        self.companion.update_progress(self.companion.total_words - 1)
+        self.assertFalse(self.companion.analyze_character("Hunsford").endswith("so far."))
+
+
+if __name__ == '__main__':
+    unittest.main()
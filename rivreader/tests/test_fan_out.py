@@ -0,0 +1,47 @@
+import unittest
+import threading
+import time
+from src.fan_out import fan_out
+
+
+class TestFanOut(unittest.TestCase):
+
+    def test_runs_concurrently_and_yields_in_completion_order(self):
+        start = time.monotonic()
+        results = list(fan_out(lambda delay: time.sleep(delay) or delay, [0.3, 0.1, 0.2], max_concurrency=3))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual([item for item, _, _ in results], [0.1, 0.2, 0.3])
+        self.assertTrue(all(error is None for _, _, error in results))
+
+    def test_concurrency_is_bounded(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+        def work(item):
+            with lock:
+                active.append(item)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.remove(item)
+            return item * 2
+        results = list(fan_out(work, range(12), max_concurrency=3))
+        self.assertLessEqual(max(peak), 3)
+        self.assertEqual(sorted(result for _, result, _ in results), [i * 2 for i in range(12)])
+
+    def test_per_item_timeout_and_errors(self):
+        def work(item):
+            if item == "boom":
+                raise ValueError("bad item")
+            time.sleep(item)
+            return "ok"
+        seen = []
+        results = {item: (result, error) for item, result, error in
+                   fan_out(work, [0.01, 1.0, "boom"], timeout=0.2, on_result=lambda *r: seen.append(r[0]))}
+        self.assertEqual(results[0.01], ("ok", None))
+        self.assertIsInstance(results[1.0][1], TimeoutError)
+        self.assertIsInstance(results["boom"][1], ValueError)
+        self.assertEqual(len(seen), 3)
+
+if __name__ == '__main__':
+    unittest.main()
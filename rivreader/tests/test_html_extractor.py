@@ -0,0 +1,46 @@
+import unittest
+import tempfile
+import os
+from src.html_extractor import extract_blocks, extract_file_blocks, extract_text
+
+
+class TestHTMLExtractor(unittest.TestCase):
+
+    def test_paragraphs_and_offsets(self):
+        text, blocks = extract_text("<html><body><h1>Chapter One</h1><p>It was a  dark\nnight.</p><p>The end.</p></body></html>")
+        self.assertEqual(text, "Chapter One\n\nIt was a dark night.\n\nThe end.")
+        self.assertEqual([b['heading'] for b in blocks], [1, None, None])
+        for block in blocks:
+            self.assertEqual(text[block['start']:block['end']], block['text'])
+
+    def test_skips_script_style_and_nav(self):
+        markup = """<head><title>T</title><style>p {color: red}</style></head>
+        <body><nav><a href="#">Contents</a></nav><script>var x = '<p>';</script><p>Kept</p></body>"""
+        text, _ = extract_text(markup)
+        self.assertEqual(text, "Kept")
+
+    def test_unclosed_head_ends_where_the_body_starts(self):
+        text, _ = extract_text("<html><head><title>T</title><meta charset='utf-8'><body><p>Kept</p></body>")
+        self.assertEqual(text, "Kept")
+        text, _ = extract_text("<head><title>T</title><link rel='stylesheet'><h1>One</h1><p>Kept</p>")
+        self.assertEqual(text, "One\n\nKept")
+
+    def test_line_breaks_and_entities(self):
+        text, _ = extract_text("<p>Roses are red,<br/>violets &amp; blue</p>")
+        self.assertEqual(text, "Roses are red,\nviolets & blue")
+
+    def test_bytes_with_declared_encoding(self):
+        markup = '<?xml version="1.0" encoding="iso-8859-1"?><p>caf\xe9</p>'.encode('latin-1')
+        self.assertEqual(extract_blocks(markup)[0]['text'], "café")
+
+    def test_file_matches_in_memory(self):
+        markup = "<p>" + "</p><p>".join(f"Paragraph {i} text" for i in range(500)) + "</p>"
+        with tempfile.NamedTemporaryFile('w', delete=False, suffix='.html', encoding='utf-8') as f:
+            f.write(markup)
+        try:
+            self.assertEqual(extract_file_blocks(f.name, chunk_size=97), extract_blocks(markup))
+        finally:
+            os.unlink(f.name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.memory_budget import MemoryAccountant
+from src.book_store import BookStore, BOOK_CACHE
+
+
+class TestMemoryAccountant(unittest.TestCase):
+
+    def setUp(self):
+        self.evicted = []
+        self.accountant = MemoryAccountant(cap_bytes=1000)
+        self.accountant.register("a", lambda key: self.evicted.append(("a", key)))
+        self.accountant.register("b", lambda key: self.evicted.append(("b", key)), weight=10.0)
+
+    def test_least_recently_used_goes_first_at_equal_cost(self):
+        for key in range(4):
+            self.accountant.charge("a", key, 300)
+        self.assertEqual(self.evicted, [("a", 0)])
+        self.accountant.touch("a", 1)
+        self.accountant.charge("a", 4, 300)
+        self.assertEqual(self.evicted, [("a", 0), ("a", 2)])
+        self.assertLessEqual(self.accountant.stats()["used_bytes"], 1000)
+
+    def test_expensive_and_weighted_entries_are_kept(self):
+        self.accountant.charge("a", "costly", 400, cost=50.0)
+        self.accountant.charge("b", "weighted", 400)
+        self.accountant.charge("a", "cheap", 400)
+        self.accountant.charge("a", "new", 100)
+        self.assertEqual(self.evicted, [("a", "cheap")])
+
+    def test_pinned_entries_are_not_evicted_until_unpinned(self):
+        self.accountant.charge("a", "open", 800, pins=1)
+        self.accountant.charge("a", "other", 400)
+        self.assertEqual(self.evicted, [("a", "other")])
+        self.accountant.charge("a", "small", 100)
+        self.accountant.pin("a", "small")
+        self.accountant.charge("a", "extra", 500)
+        self.assertEqual(self.evicted, [("a", "other"), ("a", "extra")])
+        stats = self.accountant.stats()
+        self.assertEqual(stats["pinned_bytes"], 900)
+        self.accountant.unpin("a", "open")
+        self.assertEqual(len(self.evicted), 2)
+        self.accountant.charge("a", "late", 300)
+        self.assertEqual(self.evicted[-1], ("a", "open"))
+        self.assertEqual(self.accountant.stats()["caches"]["a"]["entries"], 2)
+
+
+class TestBookStoreBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for name in ("one", "two"):
+            path = os.path.join(self.temp_dir, f"{name}.txt")
+            with open(path, 'w') as f:
+                f.write(' '.join(f"{name}{i}" for i in range(2000)))
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_released_books_stay_cached_until_memory_is_needed(self):
+        accountant = MemoryAccountant()
+        store = BookStore(accountant)
+        one = store.acquire(self.paths[0])
+        store.release(one)
+        self.assertEqual(len(store), 1)
+        self.assertIs(store.acquire(self.paths[0]), one)
+        self.assertEqual(accountant.stats()["caches"][BOOK_CACHE]["bytes"], one.size)
+
+        accountant.cap_bytes = one.size + 1
+        two = store.acquire(self.paths[1])
+        self.assertEqual(len(store), 2)
+        store.release(one)
+        self.assertEqual(len(store), 1)
+        self.assertIs(store.acquire(self.paths[1]), two)
+        self.assertEqual(accountant.stats()["caches"][BOOK_CACHE]["evictions"], 1)
+
+    def test_entity_index_is_charged_as_it_grows(self):
+        accountant = MemoryAccountant()
+        store = BookStore(accountant)
+        book = store.acquire(self.paths[0])
+        self.assertEqual(book.size, book.chapters_size)
+        book.entity_index.names((0, 100))
+        self.assertGreater(book.size, book.chapters_size)
+        stats = accountant.stats()
+        self.assertEqual(stats["caches"][BOOK_CACHE]["bytes"], book.size)
+        self.assertEqual(stats["pinned_bytes"], book.size)
+        store.release(book)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import threading
+import time
+from src.context_manager import ContextManager
+from src.readahead import ReadAheadScheduler
+
+
+class FakeReader:
+    def __init__(self, words):
+        self.chapters = [{'words': words, 'word_count': len(words)}]
+        self.current_chapter = 0
+        self.current_word = 0
+
+    def get_current_chapter_number(self):
+        return self.current_chapter + 1
+
+    def get_current_word_index(self):
+        return self.current_word
+
+    def get_current_chapter_content_up_to_word(self):
+        return ' '.join(self.chapters[self.current_chapter]['words'][:self.current_word])
+
+
+class TestReadAhead(unittest.TestCase):
+
+    def setUp(self):
+        self.reader = FakeReader([f"w{i}" for i in range(1000)])
+        self.manager = ContextManager(self.reader, "test-key")
+        self.manager.read_ahead.cancel()
+        self.manager.read_ahead = ReadAheadScheduler(self.manager, idle_delay=0.01)
+        self.sections = []
+        self.done = threading.Event()
+
+        def summarize(previous, content, supersede_key=None):
+            self.sections.append(content)
+            self.done.set()
+            return f"{previous}|{content.split()[0]}..{content.split()[-1]}"
+        self.manager.summarize_section = summarize
+
+    def tearDown(self):
+        self.manager.read_ahead.cancel()
+
+    def move_to(self, word):
+        self.reader.current_word = word
+        self.manager.update_context(word)
+
+    def wait_for_sealed(self):
+        self.assertTrue(self.done.wait(5))
+        deadline = time.monotonic() + 5
+        while self.manager.read_ahead._in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.done.clear()
+
+    def test_sealed_summary_is_held_until_reader_passes_it(self):
+        self.move_to(100)
+        self.wait_for_sealed()
+        self.assertEqual(self.sections[0].split()[0], "w0")
+        end = len(self.sections[0].split())
+        self.assertGreater(end, 100)
+        # Still short of the section end: nothing of it is visible
+        self.assertEqual(self.manager.get_dynamic_summary(), "")
+        self.assertNotIn(f"w{end - 1}", self.manager.get_full_context())
+
+        self.move_to(end)
+        self.assertEqual(self.manager.get_dynamic_summary(), f"|w0..w{end - 1}")
+        self.assertEqual(self.manager.summarized_word, end)
+        self.assertIn(f"w{end - 1}", self.manager.get_full_context())
+
+    def test_unsummarized_tail_is_queued_when_reader_moves_on(self):
+        self.reader.chapters.append({'words': ["next"] * 10, 'word_count': 10})
+        release = threading.Event()
+        summarize = self.manager.summarize_section
+
+        def slow_summarize(previous, content, supersede_key=None):
+            release.wait(5)
+            return summarize(previous, content, supersede_key)
+        self.manager.summarize_section = slow_summarize
+        self.move_to(300)
+        deadline = time.monotonic() + 5
+        while not self.manager.read_ahead._in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # The reader moves to the next chapter before the prefetch comes back
+        self.reader.current_chapter, self.reader.current_word = 1, 0
+        self.manager.update_context(0)
+        release.set()
+        self.wait_for_sealed()
+        self.assertEqual(self.manager.pending_catch_up, [(0, 0)])
+        self.assertEqual(self.manager.get_dynamic_summary(), "")
+        self.assertEqual((self.manager.context_chapter, self.manager.summarized_word), (1, 0))
+
+    def test_stale_section_is_discarded_after_summary_changes(self):
+        self.move_to(100)
+        self.wait_for_sealed()
+        self.manager.replace_summary("replaced", 0)
+        self.move_to(999)
+        self.assertEqual(self.manager.get_dynamic_summary(), "replaced")
+        self.assertEqual(self.manager.summarized_word, 0)
+
+    def test_section_length_follows_reading_speed(self):
+        scheduler = self.manager.read_ahead
+        self.assertEqual(scheduler.section_words(), 500)
+        now = time.monotonic()
+        scheduler._samples.extend([(now - 10, 0, 0), (now, 0, 50)])
+        self.assertEqual(scheduler.section_words(), 450)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import threading
+import unittest
+from src.reader_state import ReaderState
+
+
+class TestReaderState(unittest.TestCase):
+
+    def test_transition_bumps_version_and_keeps_old_snapshots(self):
+        state = ReaderState()
+        before = state.snapshot()
+        after = state.transition(2, 5, 105)
+        self.assertEqual((after.chapter, after.word, after.absolute_word), (2, 5, 105))
+        self.assertEqual(after.version, before.version + 1)
+        self.assertEqual(before.chapter, 0)
+        self.assertFalse(state.is_current(before))
+        self.assertTrue(state.is_current(after))
+
+    def test_concurrent_transitions_get_distinct_versions(self):
+        state = ReaderState()
+        versions = []
+        lock = threading.Lock()
+
+        def move(chapter):
+            for word in range(200):
+                position = state.transition(chapter, word, word)
+                with lock:
+                    versions.append(position.version)
+        threads = [threading.Thread(target=move, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(versions), list(range(1, 801)))
+        self.assertEqual(state.snapshot().version, 800)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.reading_companion import ReadingCompanion
+from src.fake_model import FakeAnthropic
+
+
+class FailingModel(FakeAnthropic):
+
+    def __init__(self):
+        super().__init__(latency=0)
+
+    def with_options(self, timeout=None):
+        return self
+
+    def respond(self, request):
+        raise ConnectionError("model unavailable")
+
+
+class TestStreamChatFailures(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "book.txt")
+        with open(self.path, 'w') as f:
+            f.write(' '.join(f"word{i}" for i in range(100)))
+        self.companion = None
+
+    def tearDown(self):
+        self.companion.close()
+        shutil.rmtree(self.temp_dir)
+
+    def stream(self, model):
+        self.companion = ReadingCompanion(self.path, "test-key", model_client=model)
+        pieces = []
+        response = self.companion.stream_chat("hello", pieces.append)
+        return response, ''.join(pieces)
+
+    def test_context_failure_reaches_on_text(self):
+        self.companion = ReadingCompanion(self.path, "test-key", model_client=FakeAnthropic(latency=0))
+
+        def broken_context():
+            raise RuntimeError("no context")
+        self.companion._get_context = broken_context
+        pieces = []
+        response = self.companion.stream_chat("hello", pieces.append)
+        self.assertIn("no context", response)
+        self.assertEqual(''.join(pieces), response)
+
+    def test_model_failure_reaches_on_text(self):
+        response, streamed = self.stream(FailingModel())
+        self.assertIn("model unavailable", response)
+        self.assertEqual(streamed, response)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.reingest import ChapterDiff, find_anchor, chapter_fingerprints
+from src.reading_companion import ReadingCompanion
+from src.fake_model import FakeAnthropic
+from src.workspace import Workspace
+
+
+def write_book(path, chapters):
+    with open(path, 'w') as f:
+        f.write("\n\n".join(f"Chapter {i + 1}\n\n{text}" for i, text in enumerate(chapters)))
+
+
+class TestChapterDiff(unittest.TestCase):
+
+    def test_edit_and_append(self):
+        diff = ChapterDiff(["a", "b", "c", "d"], ["a", "b", "X", "d", "e"])
+        self.assertEqual(diff.first_change, 2)
+        self.assertEqual(diff.changed_chapters, [2, 4])
+        self.assertEqual(diff.map_chapter(3), (3, True))
+        self.assertEqual(diff.map_chapter(2), (2, False))
+
+    def test_inserted_chapter_shifts_the_rest(self):
+        diff = ChapterDiff(["a", "b", "c"], ["a", "new", "b", "c"])
+        self.assertEqual(diff.first_change, 1)
+        self.assertEqual(diff.map_chapter(2), (3, True))
+        self.assertIsNone(ChapterDiff(["a"], ["a"]).first_change)
+
+    def test_find_anchor_prefers_the_nearest_match(self):
+        words = "x a b y a b z".split()
+        self.assertEqual(find_anchor(words, ["a", "b"], 5), 4)
+        self.assertEqual(find_anchor(words, ["a", "b"], 0), 1)
+        self.assertIsNone(find_anchor(words, ["b", "a"], 0))
+
+
+class TestReingest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "manuscript.txt")
+        self.chapters = [' '.join(f"c{c}w{i}" for i in range(100)) for c in range(5)]
+        self.workspace = Workspace(os.path.join(self.temp_dir, "workspace.db"))
+        self.companions = []
+
+    def tearDown(self):
+        for companion in self.companions:
+            companion.close()
+        self.workspace.close()
+        shutil.rmtree(self.temp_dir)
+
+    def open(self):
+        companion = ReadingCompanion(self.path, "test-key", model_client=FakeAnthropic(latency=0))
+        self.companions.append(companion)
+        companion.attach_workspace(self.workspace)
+        return companion
+
+    def test_save_state_checkpoints_the_summary_at_chapter_starts(self):
+        write_book(self.path, self.chapters)
+        companion = self.open()
+        companion.move_to_chapter(2)
+        # As if caught up on the chapters moved past
+        companion.pending_catch_up = []
+        companion.context_manager.replace_summary("before two", 0)
+        companion.save_state()
+        self.assertEqual(self.workspace.load_summary_checkpoint(companion.book_hash, 4), (2, "before two"))
+
+    def test_edit_keeps_data_before_the_change_and_rolls_summary_back(self):
+        write_book(self.path, self.chapters)
+        old = self.open()
+        old_hash = old.book_hash
+        old.update_progress(350)
+        position = (old.document_reader.current_chapter, old.document_reader.current_word)
+        self.assertEqual(position[0], 3)
+        self.workspace.save_summary_checkpoint(old_hash, 1, "chapter zero")
+        self.workspace.save_summary_checkpoint(old_hash, 3, "chapters zero to two")
+        self.workspace.save_summary(old_hash, "through chapter three", 3, 50)
+        self.workspace.add_highlight(old_hash, 0, 5, 7, "yellow", "c0w5 c0w6 c0w7")
+        self.workspace.add_highlight(old_hash, 2, 10, 11, "green", "c2w10 c2w11")
+        self.workspace.add_highlight(old_hash, 2, 20, 21, "blue", "c2w20 c2w21")
+        self.workspace.save_notes(old_hash, "my notes")
+        self.workspace.save_character_sheet(old_hash, "Early", "sheet", 2, 0, 3)
+        self.workspace.save_character_sheet(old_hash, "Late", "sheet", 3, 50, 9)
+        self.workspace.flush()
+
+        edited = list(self.chapters)
+        edited[2] = "inserted words " + edited[2].replace("c2w20", "rewritten")
+        write_book(self.path, edited)
+        new = self.open()
+        report = new.reingest_report
+        self.assertEqual(report["first_change"], 2)
+        self.assertEqual(report["changed_chapters"], [2])
+        self.assertEqual(report["summary_from"], 1)
+        self.assertEqual(report["highlights_dropped"], 1)
+
+        state = new.restore_state()
+        self.assertEqual((state["chapter"], state["word"]), position)
+        self.assertEqual(state["notepad"], "my notes")
+        self.assertEqual(state["summary"], "chapter zero")
+        self.assertEqual([(h["chapter"], h["start_word"]) for h in state["highlights"]], [(0, 5), (2, 14)])
+        # Only the chapters from the checkpoint up to the reader are summarized again
+        self.assertEqual(new.pending_catch_up, [(1, 0), (2, 0)])
+        self.assertEqual([entry["name"] for entry in self.workspace.load_character_sheets(new.book_hash)], ["Early"])
+        self.assertIsNone(self.workspace.load_book_state(old_hash))
+        self.assertEqual(self.workspace.load_fingerprints(new.book_hash), chapter_fingerprints(new.document_reader.chapters))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import threading
+import time
+from src.request_scheduler import RequestScheduler, Superseded, INTERACTIVE, ANALYSIS, BACKGROUND
+
+
+class TestRequestScheduler(unittest.TestCase):
+
+    def start(self, scheduler, priority, order, name, key=None, release=None):
+        def work():
+            try:
+                with scheduler.slot(priority, key):
+                    order.append(name)
+                    if release is not None:
+                        release.wait(5)
+            except Superseded:
+                order.append(f"{name} superseded")
+        thread = threading.Thread(target=work, daemon=True)
+        thread.start()
+        return thread
+
+    def wait_pending(self, scheduler, count):
+        deadline = time.monotonic() + 5
+        while scheduler.pending() != count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertEqual(scheduler.pending(), count)
+
+    def test_waiting_requests_start_in_priority_order(self):
+        scheduler = RequestScheduler(max_concurrency=1, requests_per_minute=None)
+        order, release = [], threading.Event()
+        holder = self.start(scheduler, BACKGROUND, order, "holder", release=release)
+        self.wait_pending(scheduler, 0)
+        threads = [self.start(scheduler, BACKGROUND, order, "summary")]
+        self.wait_pending(scheduler, 1)
+        threads.append(self.start(scheduler, ANALYSIS, order, "analysis"))
+        self.wait_pending(scheduler, 2)
+        threads.append(self.start(scheduler, INTERACTIVE, order, "chat"))
+        self.wait_pending(scheduler, 3)
+        release.set()
+        for thread in [holder] + threads:
+            thread.join(5)
+        self.assertEqual(order, ["holder", "chat", "analysis", "summary"])
+
+    def test_interactive_gets_reserved_worker(self):
+        scheduler = RequestScheduler(max_concurrency=2, requests_per_minute=None)
+        order, release = [], threading.Event()
+        threads = [self.start(scheduler, BACKGROUND, order, "summary 1", release=release)]
+        self.wait_pending(scheduler, 0)
+        threads.append(self.start(scheduler, BACKGROUND, order, "summary 2"))
+        self.wait_pending(scheduler, 1)
+        threads.append(self.start(scheduler, INTERACTIVE, order, "chat"))
+        threads[-1].join(5)
+        self.assertEqual(order, ["summary 1", "chat"])
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order[-1], "summary 2")
+
+    def test_queued_request_is_superseded_by_same_key(self):
+        scheduler = RequestScheduler(max_concurrency=1, requests_per_minute=None)
+        order, release = [], threading.Event()
+        holder = self.start(scheduler, BACKGROUND, order, "holder", release=release)
+        self.wait_pending(scheduler, 0)
+        old = self.start(scheduler, BACKGROUND, order, "old", key="read_ahead")
+        self.wait_pending(scheduler, 1)
+        new = self.start(scheduler, BACKGROUND, order, "new", key="read_ahead")
+        old.join(5)
+        self.assertEqual(order, ["holder", "old superseded"])
+        release.set()
+        for thread in (holder, new):
+            thread.join(5)
+        self.assertEqual(order[-1], "new")
+
+    def test_rate_limit_tokens_are_reserved_for_interactive(self):
+        scheduler = RequestScheduler(max_concurrency=4, requests_per_minute=0.01)
+        scheduler._tokens = 1.5
+        order = []
+        background = self.start(scheduler, BACKGROUND, order, "summary")
+        self.wait_pending(scheduler, 1)
+        self.start(scheduler, INTERACTIVE, order, "chat").join(5)
+        self.assertEqual(order, ["chat"])
+        self.assertEqual(scheduler.pending(), 1)
+        self.assertTrue(background.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.rtf_extractor import iter_rtf_paragraphs, rtf_to_text, skip_group
+from src.document_reader import DocumentReader
+
+SAMPLE = (
+    rb"{\rtf1\ansi\ansicpg1252\deff0{\fonttbl{\f0\froman Times;}}{\colortbl;\red0\green0\blue0;}"
+    rb"{\*\generator Msftedit;}\uc1\pard\outlinelevel0\b Chapter One\b0\par" b"\r\n"
+    rb"\pard Caf\'e9 \ldblquote quoted\rdblquote  na\u239\'efve \u-10179?\u-8704? "
+    rb"{\field{\*\fldinst HYPERLINK \"x\"}{\fldrslt link}}\par" b"\r\n"
+    rb"{\pict\pngblip 89504e470d0a1a0a0000}{\*\shppict{\pict 0000}}tail\line next\tab x \{braces\}\par"
+    rb"{\object{\*\objdata \bin4 {{{{}}text}"
+    b"}"
+)
+
+
+class TestRtfExtractor(unittest.TestCase):
+
+    def test_paragraphs_with_headings_escapes_and_skipped_groups(self):
+        self.assertEqual(list(iter_rtf_paragraphs(SAMPLE)), [
+            ("Chapter One", 1),
+            ("Café “quoted” naïve \U0001F600 link", None),
+            ("tail\nnext\tx {braces}", None),
+            ("text", None),
+        ])
+
+    def test_backslash_line_break_is_a_paragraph_break(self):
+        # As written by macOS TextEdit
+        data = (b"{\\rtf1\\ansi\\cocoartf2639\n\\f0\\fs24 \\cf0 First paragraph here.\\\n"
+                b"Second paragraph here.\\\r\nThird.}")
+        self.assertEqual(rtf_to_text(data), "First paragraph here.\n\nSecond paragraph here.\n\nThird.")
+
+    def test_trailing_lone_backslash_does_not_crash(self):
+        self.assertEqual(rtf_to_text(b"{\\rtf1 text}\\"), "text\\")
+
+    def test_codepage_is_honored(self):
+        data = rb"{\rtf1\ansi\ansicpg1251 \'cf\'f0\'e8\'e2\'e5\'f2\par}"
+        self.assertEqual(rtf_to_text(data), "Привет")
+
+    def test_double_byte_codepage_pairs_escapes(self):
+        data = rb"{\rtf1\ansi\ansicpg932 \'82\'a0\'82\'a2 \'83A{\b \'82\'a4}\par}"
+        self.assertEqual(rtf_to_text(data), "あい アう")
+
+    def test_skip_group_jumps_binary_payloads(self):
+        data = b"\\bin3 }}}more}after"
+        self.assertEqual(data[skip_group(data, 0):], b"after")
+
+    def test_document_reader_reads_cp1252_rtf(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "book.rtf")
+            with open(path, 'wb') as f:
+                f.write(SAMPLE)
+            reader = DocumentReader(path)
+            self.assertEqual(reader.chapters[0]['title'], "Chapter One")
+            self.assertIn("Café", reader.chapters[0]['text'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import asyncio
+import contextlib
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from src.fake_model import FakeAnthropic
+from src.request_scheduler import RequestScheduler
+from src.server import CompanionServer, ws_frame, read_ws_message, WS_TEXT, WS_CLOSE
+
+
+class TestCompanionServer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.temp_dir, "book.txt"), 'w') as f:
+            f.write(' '.join(f"word{i}" for i in range(300)))
+        self.loop = asyncio.new_event_loop()
+        self.server = CompanionServer(self.temp_dir, "test-key", FakeAnthropic(latency=0), workers=8,
+                                      request_scheduler=RequestScheduler(8, None))
+        self.loop.run_until_complete(self.server.start("127.0.0.1", 0))
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        shutil.rmtree(self.temp_dir)
+
+    def request(self, method, path, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.server.port, timeout=5)
+        try:
+            conn.request(method, path, json.dumps(body) if body is not None else None)
+            response = conn.getresponse()
+            data = response.read()
+            return response.status, response.getheader("Content-Type"), data
+        finally:
+            conn.close()
+
+    def open_session(self):
+        status, _, data = self.request("POST", "/sessions", {"book": "book.txt"})
+        self.assertEqual(status, 201)
+        return json.loads(data)
+
+    def test_session_progress_summary_and_highlights(self):
+        session = self.open_session()
+        self.assertEqual(session["total_words"], 300)
+        sid = session["session"]
+
+        status, _, data = self.request("POST", f"/sessions/{sid}/progress", {"word": 120})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(data)["absolute_word"], 120)
+        self.assertEqual(self.request("POST", f"/sessions/{sid}/progress", {"word": 5000})[0], 400)
+
+        status, _, data = self.request("GET", f"/sessions/{sid}/summary")
+        self.assertEqual(status, 200)
+        self.assertIn("summary", json.loads(data))
+
+        self.assertEqual(self.request("POST", f"/sessions/{sid}/highlights", {"start_word": 3, "end_word": 6})[0], 201)
+        highlights = json.loads(self.request("GET", f"/sessions/{sid}/highlights")[2])["highlights"]
+        self.assertEqual([(h["start_word"], h["end_word"]) for h in highlights], [(3, 6)])
+
+        self.assertEqual(self.request("DELETE", f"/sessions/{sid}")[0], 204)
+        self.assertEqual(self.request("GET", f"/sessions/{sid}")[0], 404)
+
+    def test_character_sheets(self):
+        sid = self.open_session()["session"]
+        self.request("POST", f"/sessions/{sid}/progress", {"word": 299})
+        status, _, data = self.request("POST", f"/sessions/{sid}/characters", {"name": "Nobody"})
+        self.assertEqual(status, 404)
+        status, _, data = self.request("GET", f"/sessions/{sid}/characters")
+        self.assertEqual((status, json.loads(data)), (200, {"characters": []}))
+        self.assertEqual(self.request("POST", f"/sessions/{sid}/characters", {})[0], 400)
+
+    def test_books_outside_the_library_are_refused(self):
+        self.assertEqual(self.request("POST", "/sessions", {"book": "../etc/passwd"})[0], 404)
+        self.assertEqual(self.request("POST", "/sessions", {})[0], 400)
+
+    def test_chat_streams_as_chunks(self):
+        sid = self.open_session()["session"]
+        status, content_type, data = self.request("POST", f"/sessions/{sid}/chat", {"message": "Who is here?"})
+        self.assertEqual(status, 200)
+        self.assertTrue(content_type.startswith("text/plain"))
+        self.assertTrue(data.decode().startswith("Assistant: "))
+        self.assertGreater(len(data.split()), 10)
+
+    def test_chat_failure_is_streamed_to_the_client(self):
+        sid = self.open_session()["session"]
+
+        def broken_context():
+            raise RuntimeError("context unavailable")
+        self.server.sessions[sid].companion._get_context = broken_context
+        status, _, data = self.request("POST", f"/sessions/{sid}/chat", {"message": "Who is here?"})
+        self.assertEqual(status, 200)
+        self.assertIn("context unavailable", data.decode())
+
+    def test_invalid_content_length_is_refused(self):
+        async def send(length):
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+            writer.write(f"POST /sessions HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+            await writer.drain()
+            status = await reader.readline()
+            writer.close()
+            return status
+
+        for length in ("abc", "-5"):
+            self.assertTrue(asyncio.run(send(length)).startswith(b"HTTP/1.1 400"), length)
+
+    def test_chat_lock_is_held_until_the_worker_finishes(self):
+        session = self.server.sessions.get(self.open_session()["session"])
+        release = threading.Event()
+
+        def stream_chat(message, on_text):
+            on_text("first")
+            release.wait(5)
+            on_text("second")
+            return "first second"
+        session.companion.stream_chat = stream_chat
+
+        async def disconnect_after_first_piece():
+            async with contextlib.aclosing(self.server.stream_chat(session, "hi")) as stream:
+                async for _ in stream:
+                    break
+            return session.chat_lock.locked()
+
+        async def scenario():
+            task = asyncio.ensure_future(disconnect_after_first_piece())
+            await asyncio.sleep(0.1)
+            # The client has gone, but the worker is still streaming
+            self.assertFalse(task.done())
+            self.assertTrue(session.chat_lock.locked())
+            release.set()
+            return await task
+
+        self.assertFalse(asyncio.run_coroutine_threadsafe(scenario(), self.loop).result(5))
+
+    def test_websocket_chat_and_progress(self):
+        sid = self.open_session()["session"]
+
+        async def client():
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+            writer.write((f"GET /sessions/{sid}/ws HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\n"
+                          "Connection: Upgrade\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+                          "Sec-WebSocket-Version: 13\r\n\r\n").encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            self.assertIn(b"s3pPLMBiTxaQ9kYGzzhZRbK+xOo=", head)
+
+            async def send(message):
+                writer.write(ws_frame(WS_TEXT, json.dumps(message).encode(), mask=os.urandom(4)))
+                await writer.drain()
+
+            async def receive():
+                _, payload = await read_ws_message(reader)
+                return json.loads(payload)
+
+            await send({"type": "progress", "word": 42})
+            self.assertEqual((await receive())["absolute_word"], 42)
+            await send({"type": "chat", "message": "hello"})
+            texts = []
+            while True:
+                message = await receive()
+                if message["type"] == "done":
+                    break
+                texts.append(message["text"])
+            writer.write(ws_frame(WS_CLOSE, b"\x03\xe8", mask=os.urandom(4)))
+            await writer.drain()
+            opcode, _ = await read_ws_message(reader)
+            writer.close()
+            return ''.join(texts), opcode
+
+        text, opcode = asyncio.run(client())
+        self.assertTrue(text.startswith("Assistant: "))
+        self.assertEqual(opcode, WS_CLOSE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import threading
+import time
+from types import SimpleNamespace
+from src.ai_client import AIClient
+from src.single_flight import SingleFlight, request_key
+from src.usage_meter import UsageMeter, SITE_CHARACTER
+
+
+class BlockingMessages:
+    def __init__(self, release):
+        self.release = release
+        self.calls = 0
+        self.called = threading.Event()
+        self.lock = threading.Lock()
+
+    def create(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+        self.called.set()
+        self.release.wait(5)
+        return SimpleNamespace(content=[SimpleNamespace(text="sheet")],
+                               usage=SimpleNamespace(input_tokens=20, output_tokens=5))
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_request_key_ignores_key_order_and_padding(self):
+        a = request_key(model="m", messages=[{"role": "user", "content": "Who is Ahab? "}])
+        b = request_key(messages=[{"content": "Who is Ahab?", "role": "user"}], model="m")
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, request_key(model="m", messages=[{"role": "user", "content": "Who is Ishmael?"}]))
+
+    def test_errors_reach_every_waiter_and_nothing_is_cached(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+        self.assertEqual(flight.do("k", lambda: 1), (1, False))
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_concurrent_identical_calls_share_one_request(self):
+        release = threading.Event()
+        meter = UsageMeter()
+        ai = AIClient("test-key", meter)
+        ai.client = SimpleNamespace(messages=BlockingMessages(release))
+        results = []
+
+        def analyze():
+            response = ai.create(SITE_CHARACTER, "a.epub", model="m", max_tokens=10,
+                                 messages=[{"role": "user", "content": "Ahab"}])
+            results.append(response.content[0].text)
+
+        threads = [threading.Thread(target=analyze) for _ in range(4)]
+        threads[0].start()
+        # The leader is in flight once its request reaches the client
+        self.assertTrue(ai.client.messages.called.wait(5))
+        self.assertEqual(ai.single_flight.in_flight(), 1)
+        for thread in threads[1:]:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while ai.single_flight.waiting() < 3:
+            self.assertLess(time.monotonic(), deadline, "followers never joined the in-flight call")
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, ["sheet"] * 4)
+        self.assertEqual(ai.client.messages.calls, 1)
+        self.assertEqual(ai.single_flight.waiting(), 0)
+        row = meter.report("site")[0]
+        self.assertEqual((row["calls"], row["shared_calls"], row["total_tokens"]), (1, 3, 25))
+
+
+if __name__ == '__main__':
+    unittest.main()
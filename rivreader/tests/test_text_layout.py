@@ -0,0 +1,45 @@
+import time
+import unittest
+from src.text_layout import TextLayout
+
+
+class TestTextLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = TextLayout("Call me Ishmael.\n\nSome years ago,\nnever mind")
+
+    def test_words_map_to_line_and_column(self):
+        self.assertEqual(len(self.layout), 8)
+        self.assertEqual(self.layout.word_index(0), "1.0")
+        self.assertEqual(self.layout.word_index(2), "1.8")
+        self.assertEqual(self.layout.word_index(3), "3.0")
+        self.assertEqual(self.layout.word_index(6), "4.0")
+        self.assertEqual(self.layout.word_index(99), "4.6")
+        self.assertEqual(TextLayout("").word_index(3), "1.0")
+
+    def test_highlights_are_grouped_by_color_for_the_chapter(self):
+        highlights = [
+            {"chapter": 0, "start_word": 1, "end_word": 2, "color": "yellow"},
+            {"chapter": 1, "start_word": 0, "end_word": 0, "color": "yellow"},
+            {"chapter": 0, "start_word": 3, "end_word": 5, "color": "pink"},
+            {"chapter": 0, "start_word": 7, "end_word": 40, "color": "yellow"},
+        ]
+        self.assertEqual(self.layout.highlight_ranges(highlights, 0), {
+            "yellow": ["1.5", "1.16", "4.6", "4.10"],
+            "pink": ["3.0", "3.15"],
+        })
+
+    def test_hundreds_of_highlights_fit_in_a_frame(self):
+        text = "\n\n".join(' '.join(f"w{p}_{i}" for i in range(120)) for p in range(100))
+        layout = TextLayout(text)
+        highlights = [{"chapter": 0, "start_word": i * 20, "end_word": i * 20 + 6,
+                       "color": ("yellow", "pink", "green")[i % 3]} for i in range(500)]
+        started = time.perf_counter()
+        ranges = layout.highlight_ranges(highlights, 0)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(sum(len(indices) for indices in ranges.values()), 1000)
+        self.assertLess(elapsed, 0.016)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import tempfile
+import shutil
+import os
+from src.theme_manager import ThemeManager
+
+
+class TestThemeManager(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        self.manager = ThemeManager()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_resolved_styles_are_cached(self):
+        self.assertIs(self.manager.get_resolved_styles("modern_light"), self.manager.get_resolved_styles("modern_light"))
+
+    def test_diff_between_themes_only_has_changed_options(self):
+        dark = self.manager.get_resolved_styles("modern_dark")
+        light = self.manager.get_resolved_styles("modern_light")
+        changes = ThemeManager.diff_styles(dark, light)
+        self.assertEqual(changes["styles"]["TFrame"], {"background": "#FFFFFF"})
+        # Both themes share fonts, padding and relief
+        self.assertNotIn("font", changes["styles"]["TButton"])
+        self.assertNotIn("chat_entry", changes["widgets"])
+        self.assertEqual(ThemeManager.diff_styles(dark, dark), {})
+        self.assertIs(ThemeManager.diff_styles(None, dark), dark)
+
+    def test_sections_missing_from_the_applied_table_are_applied_in_full(self):
+        # What the GUI records before its widgets exist
+        resolved = self.manager.get_resolved_styles()
+        applied = {section: resolved[section] for section in ("styles", "maps", "options")}
+        changes = ThemeManager.diff_styles(applied, resolved)
+        self.assertEqual(changes, {"widgets": resolved["widgets"], "tags": resolved["tags"]})
+
+    def test_font_size_change_touches_only_the_reader(self):
+        before = self.manager.get_resolved_styles()
+        self.manager.update_theme_property(self.manager.current_theme, "font_size_reader", 22)
+        after = self.manager.get_resolved_styles()
+        self.assertIsNot(before, after)
+        self.assertEqual(ThemeManager.diff_styles(before, after),
+                         {"widgets": {"book_content": {"font": ("Verdana", 22)}}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from src.ui_watchdog import SAMPLE_INTERVAL, StallWatchdog
+
+
+class FakeMaster:
+    # Records after() callbacks instead of running an event loop
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, func):
+        self.scheduled.append((ms, func))
+        return len(self.scheduled)
+
+    def after_cancel(self, job):
+        pass
+
+
+def slow_handler(started, release):
+    started.set()
+    release.wait(5)
+
+
+class TestStallWatchdog(unittest.TestCase):
+
+    def setUp(self):
+        self.watchdog = StallWatchdog(FakeMaster(), interval_ms=50, threshold=0.1, in_flight=lambda: 2)
+
+    def test_short_gaps_are_not_stalls(self):
+        self.watchdog._record_beat(100.0)
+        self.watchdog._record_beat(100.12)
+        self.assertEqual(self.watchdog.report()["stalls"], 0)
+
+    def test_sampler_sleeps_until_a_beat_is_overdue(self):
+        self.watchdog._last_beat = time.monotonic()
+        self.assertGreater(self.watchdog._until_overdue(), 0.1)
+        self.watchdog._last_beat = time.monotonic() - 1.0
+        self.assertEqual(self.watchdog._until_overdue(), SAMPLE_INTERVAL)
+
+    def test_stall_is_attributed_to_the_sampled_call_site(self):
+        started, release = threading.Event(), threading.Event()
+        busy = threading.Thread(target=slow_handler, args=(started, release))
+        busy.start()
+        started.wait(5)
+        self.watchdog.main_thread_id = busy.ident
+        self.watchdog._record_beat(time.monotonic() - 0.5)
+        self.watchdog._sample()
+        self.watchdog._sample()
+        release.set()
+        busy.join(5)
+        self.watchdog._record_beat(time.monotonic())
+
+        report = self.watchdog.report()
+        self.assertEqual(report["stalls"], 1)
+        self.assertEqual(report["histogram"]["250-500ms"] + report["histogram"]["500-1000ms"], 1)
+        stall = report["worst"][0]
+        self.assertEqual(stall["samples"], 2)
+        self.assertTrue(stall["call_site"].endswith("slow_handler"))
+        self.assertEqual(report["in_flight_requests"], 2)
+
+    def test_dump_writes_the_report_as_json(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            self.watchdog.record_render(0.0123)
+            path = self.watchdog.dump(os.path.join(temp_dir, "report.json"))
+            with open(path) as f:
+                self.assertEqual(json.load(f)["last_render_ms"], 12.3)
+            self.assertIn("Last render: 12.3 ms", self.watchdog.summary_lines())
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
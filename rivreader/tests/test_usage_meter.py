@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from src.ai_client import AIClient
+from src.usage_meter import (UsageMeter, BudgetExceeded, BUDGET_OK, BUDGET_STRETCH, BUDGET_TRIM,
+                             BUDGET_REFUSE, SITE_CHAT, SITE_SUMMARY)
+from src.workspace import Workspace
+
+
+class FakeMessages:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text="ok")],
+                               usage=SimpleNamespace(input_tokens=30, output_tokens=10))
+
+
+class TestUsageMeter(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_report_breaks_down_by_site_and_book(self):
+        meter = UsageMeter()
+        meter.record(SITE_CHAT, "a.epub", 100, 50)
+        meter.record(SITE_CHAT, "b.epub", 10, 5)
+        meter.record(SITE_SUMMARY, "a.epub", 400, 100)
+        by_site = meter.report("site")
+        self.assertEqual([row["site"] for row in by_site], [SITE_SUMMARY, SITE_CHAT])
+        self.assertEqual(by_site[1], {"site": SITE_CHAT, "calls": 2, "shared_calls": 0, "input_tokens": 110,
+                                      "output_tokens": 55, "total_tokens": 165})
+        by_book = {row["book"]: row["total_tokens"] for row in meter.report("book")}
+        self.assertEqual(by_book, {"a.epub": 650, "b.epub": 15})
+        self.assertEqual(len(meter.report("site_book")), 3)
+        self.assertEqual(meter.session_tokens, 665)
+
+    def test_levels_degrade_in_order_then_refuse(self):
+        meter = UsageMeter(session_budget=1000)
+        self.assertEqual(meter.level(), BUDGET_OK)
+        meter.record(SITE_SUMMARY, None, 700, 0)
+        self.assertEqual(meter.level(), BUDGET_STRETCH)
+        meter.record(SITE_SUMMARY, None, 150, 0)
+        self.assertEqual(meter.level(), BUDGET_TRIM)
+        meter.check(SITE_CHAT)
+        meter.record(SITE_CHAT, None, 100, 50)
+        self.assertEqual(meter.level(), BUDGET_REFUSE)
+        with self.assertRaises(BudgetExceeded):
+            meter.check(SITE_CHAT)
+
+    def test_daily_budget_spans_sessions(self):
+        workspace = Workspace(os.path.join(self.temp_dir, "workspace.db"))
+        UsageMeter(workspace=workspace).record(SITE_CHAT, "a.epub", 600, 0)
+        meter = UsageMeter(daily_budget=1000, workspace=workspace)
+        self.assertEqual(meter.session_tokens, 0)
+        self.assertEqual(meter.day_tokens, 600)
+        meter.record(SITE_CHAT, "a.epub", 300, 0)
+        self.assertEqual(meter.level(), BUDGET_TRIM)
+        self.assertEqual(workspace.load_usage(meter._day)[0]["calls"], 2)
+        workspace.close()
+
+    def test_client_meters_calls_and_refuses_over_budget(self):
+        ai = AIClient("test-key", UsageMeter(session_budget=60))
+        ai.client = SimpleNamespace(messages=FakeMessages())
+        ai.create(SITE_CHAT, "a.epub", model="m", max_tokens=10, messages=[])
+        self.assertEqual(ai.meter.report("site_book")[0]["total_tokens"], 40)
+        ai.create(SITE_CHAT, "a.epub", model="m", max_tokens=10, messages=[])
+        with self.assertRaises(BudgetExceeded):
+            ai.create(SITE_CHAT, "a.epub", model="m", max_tokens=10, messages=[])
+        self.assertEqual(len(ai.client.messages.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
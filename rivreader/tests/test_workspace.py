@@ -0,0 +1,110 @@
+import unittest
+import tempfile
+import shutil
+import os
+import io
+import sqlite3
+from contextlib import redirect_stdout
+from src.conversation_log import ConversationLog
+from src.workspace import Workspace, WorkspaceConversationLog
+
+
+class TestWorkspace(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.workspace = Workspace(os.path.join(self.directory, "workspace.db"))
+
+    def tearDown(self):
+        self.workspace.close()
+        shutil.rmtree(self.directory)
+
+    def test_wal_mode(self):
+        mode = self.workspace._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_batched_state_round_trip(self):
+        self.assertIsNone(self.workspace.load_book_state("abc"))
+        for word in range(100):
+            self.workspace.save_position("abc", "/books/a.txt", 3, word, 5000 + word, 90000)
+        self.workspace.save_summary("abc", "So far...", 3, 99)
+        self.workspace.save_notes("abc", "remember the lighthouse")
+        self.workspace.add_highlight("abc", 3, 10, 14, "#FFFF00", "a bright line")
+        self.workspace.add_highlight("abc", 1, 2, 3, "#FF69B4", "earlier")
+        self.assertEqual(len(self.workspace._pending), 104)
+        self.workspace.flush()
+        self.assertEqual(self.workspace._pending, [])
+
+        reopened = Workspace(self.workspace.db_path)
+        state = reopened.load_book_state("abc")
+        reopened.close()
+        self.assertEqual((state["chapter"], state["word"], state["absolute_word"]), (3, 99, 5099))
+        self.assertEqual(state["summary"], "So far...")
+        self.assertEqual(state["notepad"], "remember the lighthouse")
+        self.assertEqual([h["chapter"] for h in state["highlights"]], [1, 3])
+        self.assertEqual(len(self.workspace.get_highlights("abc", chapter=3)), 1)
+
+    def test_failed_flush_keeps_pending_writes(self):
+        self.workspace.save_position("abc", "/books/a.txt", 0, 0, 0, 100)
+        self.workspace._conn.execute("PRAGMA busy_timeout = 0")
+        other = sqlite3.connect(self.workspace.db_path, isolation_level=None)
+        other.execute("BEGIN EXCLUSIVE")
+        with redirect_stdout(io.StringIO()), self.assertRaises(sqlite3.Error):
+            self.workspace.flush()
+        self.workspace.save_notes("abc", "remember the lighthouse")
+        self.assertEqual(len(self.workspace._pending), 2)
+        other.execute("ROLLBACK")
+        other.close()
+        self.workspace.flush()
+        self.assertEqual(self.workspace._pending, [])
+        self.assertEqual(self.workspace.load_book_state("abc")["notepad"], "remember the lighthouse")
+
+    def test_close_releases_the_connection_when_the_flush_fails(self):
+        workspace = self.workspace
+        workspace.save_position("abc", "/books/a.txt", 0, 0, 0, 100)
+        workspace._conn.execute("PRAGMA busy_timeout = 0")
+        other = sqlite3.connect(workspace.db_path, isolation_level=None)
+        other.execute("BEGIN EXCLUSIVE")
+        with redirect_stdout(io.StringIO()), self.assertRaises(sqlite3.Error):
+            workspace.close()
+        other.execute("ROLLBACK")
+        other.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            workspace._conn.execute("SELECT 1")
+        self.workspace = Workspace(workspace.db_path)
+
+    def test_resume_snapshot(self):
+        book_path = os.path.join(self.directory, "a.txt")
+        with open(book_path, 'w') as f:
+            f.write("text")
+        self.workspace.save_position("abc", book_path, 4, 12, 4012, 9000)
+        self.workspace.save_resume_snapshot("abc", book_path, 9, {3: "three", 4: "four", 5: "five"})
+        snapshot = self.workspace.load_resume_snapshot(book_path)
+        self.assertEqual((snapshot["chapter"], snapshot["word"], snapshot["total_chapters"]), (4, 12, 9))
+        self.assertEqual(snapshot["chapters"][4], "four")
+
+        with open(book_path, 'a') as f:
+            f.write(" edited")
+        self.assertIsNone(self.workspace.load_resume_snapshot(book_path))
+
+    def test_conversation_log_migrates_jsonl(self):
+        conversations = os.path.join(self.directory, "conversations")
+        legacy = ConversationLog(conversations, "a.txt")
+        legacy.open()
+        for i in range(7):
+            legacy.append_exchange(f"q{i}", f"a{i}")
+        legacy.write_settings({"ai_name": "Sage"})
+        legacy.close()
+
+        log = WorkspaceConversationLog(self.workspace, "abc", conversations, "a.txt")
+        log.open()
+        self.assertFalse(os.path.exists(legacy.path))
+        recent, cursor = log.read_recent(5)
+        self.assertEqual([e["user"] for e in recent], ["q2", "q3", "q4", "q5", "q6"])
+        older, cursor = log.read_before(cursor, 5)
+        self.assertEqual([e["user"] for e in older], ["q0", "q1"])
+        self.assertEqual(cursor, 0)
+        self.assertEqual(log.read_settings(), {"ai_name": "Sage"})
+
+if __name__ == '__main__':
+    unittest.main()